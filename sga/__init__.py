@@ -0,0 +1,4 @@
+"""
+Staff Graded Assignment LTI app
+"""
+default_app_config = "sga.apps.SGAConfig"  # pylint: disable=invalid-name
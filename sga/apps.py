@@ -0,0 +1,17 @@
+"""
+App configuration
+"""
+from django.apps import AppConfig
+
+
+class SGAConfig(AppConfig):
+    """
+    App configuration for sga
+    """
+    name = "sga"
+
+    def ready(self):
+        """
+        Connects signal handlers
+        """
+        import sga.signals  # pylint: disable=unused-variable
@@ -0,0 +1,180 @@
+"""
+Backend logic for cached submission archives
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from tempfile import TemporaryFile
+
+import pytz
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Q
+from django.http import FileResponse
+from django.shortcuts import redirect
+
+from sga.backend.files import (
+    convert_illegal_S3_chars,
+    get_archive_storage,
+    get_assignment_submissions,
+    submissions_zip_generator
+)
+from sga.models import SubmissionArchive
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_ZIPNAMES = {
+    SubmissionArchive.ALL: "All Submissions",
+    SubmissionArchive.NOT_GRADED: "Not Graded Submissions",
+}
+
+
+def get_submissions_fingerprint(submissions):
+    """
+    Returns a hash of the ids and update times of submissions (a QuerySet)
+    """
+    digest = hashlib.sha256()
+    for submission_id, updated_on in submissions.order_by("id").values_list("id", "updated_on"):
+        digest.update("{id}:{updated_on};".format(id=submission_id, updated_on=updated_on.isoformat()).encode())
+    return digest.hexdigest()
+
+
+def get_archive(assignment, submissions, grader=None, not_graded_only=False, compression=None):
+    """
+    Returns the ready SubmissionArchive of submissions, or None if there is none yet, in which case one is queued
+    to be built
+
+    @param assignment: (Assignment) assignment of the submissions
+    @param submissions: (QuerySet) submissions from get_assignment_submissions()
+    @param grader: (optional[Grader]) grader that submissions were limited to
+    @param not_graded_only: (optional[bool]) whether submissions were limited to not graded submissions
+    @param compression: (optional[str]) one of ZipCompression.modes (defaults to settings.ZIP_COMPRESSION)
+    """
+    key = {
+        "assignment": assignment,
+        "scope": SubmissionArchive.NOT_GRADED if not_graded_only else SubmissionArchive.ALL,
+        "grader": grader,
+        "compression": compression or settings.ZIP_COMPRESSION,
+        "fingerprint": get_submissions_fingerprint(submissions),
+    }
+    archive = SubmissionArchive.objects.filter(**key).first()
+    if archive is None:
+        try:
+            with transaction.atomic():
+                SubmissionArchive.objects.create(**key)
+        except IntegrityError:
+            # Queued by a concurrent request
+            pass
+        return None
+    return archive if archive.status == SubmissionArchive.READY else None
+
+
+def serve_archive(archive, zipname):
+    """
+    Returns a response with the zip file of a ready archive: a redirect to the file's URL, or the file itself
+    if the storage is on the local filesystem
+    """
+    SubmissionArchive.objects.filter(pk=archive.pk).update(last_accessed=datetime.utcnow().replace(tzinfo=pytz.UTC))
+    storage = get_archive_storage()
+    try:
+        path = storage.path(archive.file_name)
+    except NotImplementedError:
+        return redirect(storage.url(archive.file_name))
+    resp = FileResponse(open(path, "rb"), content_type="application/zip")
+    resp["Content-Disposition"] = "attachment; filename={zipname}.zip".format(zipname=zipname)
+    return resp
+
+
+def claim_archive():
+    """
+    Marks the oldest pending archive (or an archive whose build timed out) as building and returns it, or returns
+    None if there is nothing to build
+    """
+    now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    timed_out = now - timedelta(seconds=settings.SUBMISSION_ARCHIVE_BUILD_TIMEOUT)
+    archives = SubmissionArchive.objects.filter(
+        Q(status=SubmissionArchive.PENDING) | Q(status=SubmissionArchive.BUILDING, updated_on__lt=timed_out)
+    ).order_by("created_on")
+    for archive in archives[:10]:
+        # Only one worker can claim an archive, since the others' updates won't match any rows
+        claimed = SubmissionArchive.objects.filter(
+            pk=archive.pk,
+            status=archive.status,
+            updated_on=archive.updated_on
+        ).update(status=SubmissionArchive.BUILDING, updated_on=now)
+        if claimed:
+            archive.status = SubmissionArchive.BUILDING
+            archive.updated_on = now
+            return archive
+    return None
+
+
+def get_archive_file_path(archive):
+    """
+    Returns the storage path (including filename) for an archive's zip file
+    """
+    path = "archives/{course_id}/{assignment_id}/{archive_id}/{course_id} - {zipname}.zip".format(
+        course_id=archive.assignment.course.edx_id,
+        assignment_id=archive.assignment.edx_id,
+        archive_id=archive.id,
+        zipname=ARCHIVE_ZIPNAMES[archive.scope]
+    )
+    return convert_illegal_S3_chars(path)
+
+
+def build_archive(archive):
+    """
+    Builds the zip file of a claimed archive and marks the archive ready, deleting older versions of it. Returns
+    False (and deletes the archive) if its submissions changed since it was queued.
+    """
+    submissions = get_assignment_submissions(
+        archive.assignment,
+        grader=archive.grader,
+        not_graded_only=archive.scope == SubmissionArchive.NOT_GRADED
+    )
+    if get_submissions_fingerprint(submissions) != archive.fingerprint:
+        archive.delete()
+        return False
+    storage = get_archive_storage()
+    with TemporaryFile() as temp_file:
+        for chunk in submissions_zip_generator(submissions.iterator(), compression=archive.compression):
+            temp_file.write(chunk)
+        size = temp_file.tell()
+        temp_file.seek(0)
+        file_name = storage.save(get_archive_file_path(archive), File(temp_file))
+    try:
+        archive.update(status=SubmissionArchive.READY, file_name=file_name, size=size)
+    except DatabaseError:
+        # The archive was deleted while it was being built
+        storage.delete(file_name)
+        return False
+    SubmissionArchive.objects.filter(
+        assignment=archive.assignment_id,
+        scope=archive.scope,
+        grader=archive.grader_id,
+        compression=archive.compression,
+        status=SubmissionArchive.READY
+    ).exclude(pk=archive.pk).delete()
+    SubmissionArchive.objects.evict()
+    return True
+
+
+def build_pending_archives(limit=None):
+    """
+    Builds pending archives until there are none left (or limit archives were built). Returns the number of
+    archives built.
+    """
+    built = 0
+    while limit is None or built < limit:
+        archive = claim_archive()
+        if archive is None:
+            break
+        try:
+            if build_archive(archive):
+                built += 1
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Unable to build submission archive %s", archive.pk)
+            # Deleting the archive lets the next download queue it again
+            SubmissionArchive.objects.filter(pk=archive.pk).delete()
+    return built
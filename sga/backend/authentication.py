@@ -3,10 +3,18 @@ Authentication decorators
 """
 
 from functools import wraps
+from django.conf import settings
+from django.db import connection
 from django.http import HttpResponseForbidden
 
+from sga.backend.cache import LRUCache
 from sga.backend.constants import Roles
-from sga.models import Course
+from sga.models import Course, Grader, Student
+
+# Roles from highest to lowest priority
+ROLE_PRIORITY = [Roles.admin, Roles.grader, Roles.student]
+
+course_cache = LRUCache(settings.COURSE_CACHE_MAX_SIZE, settings.COURSE_CACHE_TTL_SECONDS)
 
 
 def allowed_roles(allowed_roles_list):
@@ -24,22 +32,74 @@ def allowed_roles(allowed_roles_list):
             role = request.session.get("course_roles", {}).get(course_id)
             if role in allowed_roles_list:
                 request.role = role
-                request.course = Course.objects.get(id=course_id)
+                request.course = get_course(course_id)
                 return view_func(request, course_id, *args, **kwargs)
             return HttpResponseForbidden()
         return _wrapped_view
     return decorator
 
 
+def get_course(course_id):
+    """
+    Returns the Course with the given id, memoized in a process-local LRU cache (entries expire after
+    settings.COURSE_CACHE_TTL_SECONDS and are invalidated by invalidate_course())
+    """
+    course_id = int(course_id)
+    course = course_cache.get(course_id)
+    if course is None:
+        course = Course.objects.get(id=course_id)
+        course_cache.set(course_id, course)
+    return course
+
+
+def invalidate_course(course_id):
+    """
+    Removes a course from the course cache
+    """
+    course_cache.delete(int(course_id))
+
+
+def get_course_memberships(user, course_id=None):
+    """
+    Returns a list of (course_id (str), role) pairs for every administrator, grader and student membership of the
+    user (or only its memberships of the course with the given id), fetched with a single query
+    """
+    memberships = [
+        (Roles.admin, Course.administrators.through._meta.db_table),
+        (Roles.grader, Grader._meta.db_table),
+        (Roles.student, Student._meta.db_table),
+    ]
+    course_filter = " AND course_id = %s" if course_id is not None else ""
+    sql = " UNION ALL ".join(
+        "SELECT course_id, %s FROM {table} WHERE user_id = %s{course_filter}".format(
+            table=table,
+            course_filter=course_filter
+        )
+        for _, table in memberships
+    )
+    params = []
+    for role, _ in memberships:
+        params.extend([role, user.pk] + ([int(course_id)] if course_id is not None else []))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(str(row_course_id), role) for row_course_id, role in cursor.fetchall()]
+
+
+def get_course_roles(user, course_id=None):
+    """
+    Returns a dict of {course_id (str): role} for every course the user has a role in (or only the course with
+    the given id), resolved with a single query over the administrator, grader and student tables
+    """
+    course_roles = {}
+    for key, role in get_course_memberships(user, course_id=course_id):
+        current_role = course_roles.get(key)
+        if current_role is None or ROLE_PRIORITY.index(role) < ROLE_PRIORITY.index(current_role):
+            course_roles[key] = role
+    return course_roles
+
+
 def get_role(user, course_id):
     """
     Returns the role a user has in a course given the course id
     """
-    if user.administrator_courses.filter(id=course_id).count():
-        return Roles.admin
-    elif user.grader_courses.filter(id=course_id).count():
-        return Roles.grader
-    elif user.student_courses.filter(id=course_id).count():
-        return Roles.student
-    else:
-        return Roles.none
+    return get_course_roles(user, course_id=course_id).get(str(course_id), Roles.none)
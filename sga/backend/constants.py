@@ -31,3 +31,13 @@ class Roles():
     grader = "grader"
     admin = "admin"
     none = "none"
+
+
+class ZipCompression():
+    """
+    Compression modes for bulk submission downloads
+    """
+    auto = "auto"  # Store already-compressed files, deflate everything else
+    store = "store"
+    deflate = "deflate"
+    modes = [auto, store, deflate]
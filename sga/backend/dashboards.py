@@ -0,0 +1,277 @@
+"""
+Read-through cache of the course-wide numbers shown on dashboard pages, and the pages of their server-side lists
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.urlresolvers import reverse
+from django.db.models import Q
+
+from sga.backend.datatables import Column
+from sga.models import Grader, Student
+
+KEY_PREFIX = "sga.dashboards"
+
+# Columns and filters of the server-side lists (see sga.backend.datatables)
+STUDENT_LIST_COLUMNS = [
+    Column("username", "user__username", True),
+    Column("grader", "grader__user__username", False),
+    Column("email", "user__email", False),
+    Column("not_graded", "not_graded_count", False),
+]
+STUDENT_LIST_SEARCH_FIELDS = ["user__username", "user__email", "grader__user__username"]
+STUDENT_LIST_FILTERS = {
+    "has_grader": Q(grader__isnull=False),
+    "no_grader": Q(grader=None),
+    "not_graded": Q(not_graded_count__gt=0),
+}
+GRADER_LIST_COLUMNS = [
+    Column("username", "username", False),
+    Column("number_of_students", "number_of_students", False),
+    Column("max_students", "max_students", False),
+    Column("graded", "graded", False),
+    Column("not_graded", "not_graded", False),
+    Column("available_student_slots", "available_student_slots", False),
+]
+GRADER_LIST_FILTERS = {
+    "accepting_students": lambda row: row["available_student_slots"] > 0,
+    "has_students": lambda row: row["number_of_students"] > 0,
+    "no_students": lambda row: row["number_of_students"] == 0,
+    "not_graded": lambda row: row["not_graded"] > 0,
+}
+ASSIGNMENT_LIST_COLUMNS = [
+    Column("name", "name", False),
+    Column("not_submitted", "not_submitted", False),
+    Column("not_graded", "not_graded", False),
+    Column("graded", "graded", False),
+]
+ASSIGNMENT_LIST_FILTERS = {
+    "not_submitted": lambda row: row["not_submitted"] > 0,
+    "not_graded": lambda row: row["not_graded"] > 0,
+    "graded": lambda row: row["graded"] > 0,
+}
+SUBMISSION_LIST_COLUMNS = [
+    Column("username", "user__username", True),
+    Column("submitted", "submitted", False),
+    Column("graded", "graded", False),
+]
+SUBMISSION_LIST_FILTERS = {
+    "not_submitted": Q(submitted=False),
+    "not_graded": Q(submitted=True, graded=False),
+    "graded": Q(graded=True),
+}
+
+
+def get_dashboard_cache():
+    """
+    Returns the cache dashboard payloads are kept in (settings.DASHBOARD_CACHE_ALIAS)
+    """
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def get_course_version_key(course_id):
+    """
+    Returns the cache key holding the current version of a course's dashboard payloads
+    """
+    return "{prefix}.{course_id}.version".format(prefix=KEY_PREFIX, course_id=course_id)
+
+
+def get_course_version(course_id):
+    """
+    Returns the current version of a course's dashboard payloads, starting a new version if there is none
+    """
+    cache = get_dashboard_cache()
+    key = get_course_version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        # add() keeps a version set concurrently by another request
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_course_dashboards(course_id):
+    """
+    Invalidates every dashboard payload of a course in O(1) by starting a new version. Payloads of older versions
+    are never read again and expire after settings.DASHBOARD_CACHE_TTL_SECONDS. Versions are random rather than
+    incremented, so a version key that was evicted can't bring back payloads of an old version.
+    """
+    get_dashboard_cache().set(get_course_version_key(course_id), uuid.uuid4().hex, None)
+
+
+def get_dashboard_payload(course_id, name, compute, *key_parts):
+    """
+    Returns the dashboard payload called name for a course (and key_parts, e.g. a grader), calling compute() to
+    build it if the current version of the course's payloads doesn't have it cached
+    """
+    cache = get_dashboard_cache()
+    key = ".".join(
+        [KEY_PREFIX, str(course_id), get_course_version(course_id), name] + [str(part) for part in key_parts]
+    )
+    payload = cache.get(key)
+    if payload is None:
+        payload = compute()
+        cache.set(key, payload, settings.DASHBOARD_CACHE_TTL_SECONDS)
+    return payload
+
+
+def get_grader_list(course):
+    """
+    Returns the graders of a course annotated with their stats (see GraderQuerySet.with_stats())
+    """
+    return get_dashboard_payload(
+        course.id,
+        "graders",
+        lambda: list(Grader.objects.filter(course=course).with_stats().select_related("user"))
+    )
+
+
+def get_assignment_list(course, grader=None):
+    """
+    Returns the assignments of a course with their not_submitted_count, not_graded_count and graded_count (limited
+    to a grader if one is given, see Course.get_submission_counts_by_assignment())
+    """
+    def compute():
+        """ Loads the assignments and their counts """
+        submission_counts = course.get_submission_counts_by_assignment(grader=grader)
+        assignments = list(course.assignments.all())
+        for assignment in assignments:
+            counts = submission_counts[assignment.id]
+            assignment.not_submitted_count = counts["not_submitted"]
+            assignment.not_graded_count = counts["not_graded"]
+            assignment.graded_count = counts["graded"]
+        return assignments
+    return get_dashboard_payload(
+        course.id,
+        "assignments",
+        compute,
+        grader.id if grader is not None else "all"
+    )
+
+
+def get_student_list_page(course, query, grader=None):
+    """
+    Returns a page of the current students of a course (or of one of its graders) for a DataTablesQuery
+    """
+    def serialize(student):
+        """ Returns the row of a student """
+        row = {
+            "username": student.user.username,
+            "url": reverse("view_student", kwargs={"course_id": course.id, "student_user_id": student.user_id}),
+            "grader": None,
+            "grader_url": None,
+            "email": student.user.email,
+            "not_graded": student.not_graded_count,
+        }
+        if student.grader is not None:
+            row["grader"] = student.grader.user.username
+            row["grader_url"] = reverse(
+                "view_grader",
+                kwargs={"course_id": course.id, "grader_user_id": student.grader.user_id}
+            )
+        if grader is not None:
+            row["unassign_url"] = reverse("unassign_student", kwargs={
+                "course_id": course.id,
+                "grader_user_id": grader.user_id,
+                "student_user_id": student.user_id
+            })
+        return row
+
+    def compute():
+        """ Loads the page """
+        students = Student.objects.filter(course=course, deleted=False).with_stats()
+        if grader is not None:
+            students = students.filter(grader=grader)
+        return query.page_queryset(
+            students.select_related("user", "grader__user"),
+            serialize,
+            search_fields=STUDENT_LIST_SEARCH_FIELDS,
+            filters=STUDENT_LIST_FILTERS
+        )
+    return get_dashboard_payload(
+        course.id,
+        "student_list",
+        compute,
+        grader.id if grader is not None else "all",
+        query.get_cache_key()
+    )
+
+
+def get_grader_list_page(course, query):
+    """
+    Returns a page of the graders of a course for a DataTablesQuery
+    """
+    rows = [
+        {
+            "username": grader.user.username,
+            "url": reverse("view_grader", kwargs={"course_id": course.id, "grader_user_id": grader.user_id}),
+            "number_of_students": grader.number_of_students,
+            "max_students": grader.max_students,
+            "graded": grader.graded_count,
+            "not_graded": grader.not_graded_count,
+            "available_student_slots": grader.available_student_slots,
+        }
+        for grader in get_grader_list(course)
+    ]
+    return query.page_rows(rows, search_keys=["username"], filters=GRADER_LIST_FILTERS)
+
+
+def get_assignment_list_page(course, query, grader=None):
+    """
+    Returns a page of the assignments of a course (with counts limited to a grader if one is given) for a
+    DataTablesQuery
+    """
+    rows = [
+        {
+            "name": assignment.name,
+            "url": reverse("view_assignment", kwargs={"course_id": course.id, "assignment_id": assignment.id}),
+            "not_submitted": assignment.not_submitted_count,
+            "not_graded": assignment.not_graded_count,
+            "graded": assignment.graded_count,
+        }
+        for assignment in get_assignment_list(course, grader=grader)
+    ]
+    return query.page_rows(rows, search_keys=["name"], filters=ASSIGNMENT_LIST_FILTERS)
+
+
+def get_submission_list_page(assignment, query, grader=None):
+    """
+    Returns a page of the current students of an assignment's course (or of one of its graders) with the status of
+    their submission for the assignment, for a DataTablesQuery
+    """
+    course_id = assignment.course_id
+
+    def serialize(student):
+        """ Returns the row of a student's submission """
+        return {
+            "username": student.user.username,
+            "url": reverse("view_student", kwargs={"course_id": course_id, "student_user_id": student.user_id}),
+            "submitted": bool(student.submitted),
+            "graded": bool(student.graded),
+            "submission_url": reverse("view_submission_as_staff", kwargs={
+                "course_id": course_id,
+                "assignment_id": assignment.id,
+                "student_user_id": student.user_id
+            }),
+        }
+
+    def compute():
+        """ Loads the page """
+        students = Student.objects.filter(course_id=course_id, deleted=False).with_submission_status(assignment)
+        if grader is not None:
+            students = students.filter(grader=grader)
+        return query.page_queryset(
+            students.select_related("user"),
+            serialize,
+            search_fields=["user__username"],
+            filters=SUBMISSION_LIST_FILTERS
+        )
+    return get_dashboard_payload(
+        course_id,
+        "submission_list",
+        compute,
+        assignment.id,
+        grader.id if grader is not None else "all",
+        query.get_cache_key()
+    )
@@ -0,0 +1,207 @@
+"""
+Server-side processing of list requests from DataTables (see https://datatables.net/manual/server-side)
+"""
+import hashlib
+import json
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
+
+# A column of a server-side list. name is the key of its value in each row (the column's data in DataTables);
+# order_field is the model field (or row key) rows are sorted by when sorting by the column (None if it can't be
+# sorted); keyset is True if pages sorted by the column can be fetched with keyset pagination (order_field must be
+# non-null, and should be indexed).
+Column = namedtuple("Column", ["name", "order_field", "keyset"])
+# The sort order of a list: the Column rows are sorted by, and whether they are sorted in descending order
+Order = namedtuple("Order", ["column", "descending"])
+
+
+def get_int(params, key, default):
+    """
+    Returns an integer parameter, or default if it is missing or not an integer
+    """
+    try:
+        return int(params.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_field_value(obj, field):
+    """
+    Returns the value of a field path like "user__username" on a model instance
+    """
+    for attribute in field.split("__"):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+class DataTablesQuery(object):
+    """
+    Paging, sorting, searching and filtering parameters of a DataTables server-side request. Besides the
+    DataTables parameters (draw, start, length, search[value], order[0][column] and order[0][dir]) it reads:
+    - filter: the name of one of the list's filters
+    - after: the cursor of the last row of the previous page (see DataTablesQuery.get_cursor()), to fetch the next
+      page with keyset pagination instead of an offset
+    """
+    def __init__(self, params, columns, filters=(), max_length=None):
+        """
+        @param params: (QueryDict) the request parameters
+        @param columns: (list) the Columns of the list (rows are sorted by the first one by default)
+        @param filters: (iterable) the names of the list's filters
+        @param max_length: (optional[int]) the maximum rows per page (settings.DATATABLES_MAX_PAGE_LENGTH)
+        """
+        max_length = max_length or settings.DATATABLES_MAX_PAGE_LENGTH
+        self.draw = get_int(params, "draw", 0)
+        self.start = max(get_int(params, "start", 0), 0)
+        length = get_int(params, "length", max_length)
+        # DataTables requests every row with a length of -1
+        self.length = length if 0 < length <= max_length else max_length
+        self.search = params.get("search[value]", "").strip()
+        # The column is looked up by the name of its data (columns[i][data]), so tables can show any of the columns
+        order_name = params.get("columns[{index}][data]".format(index=get_int(params, "order[0][column]", 0)))
+        order_column = columns[0]
+        for column in columns:
+            if column.name == order_name and column.order_field is not None:
+                order_column = column
+        self.order = Order(order_column, params.get("order[0][dir]") == "desc")
+        self.filter = params.get("filter", "")
+        if self.filter not in filters:
+            self.filter = ""
+        self.after = self.parse_cursor(params.get("after"))
+
+    @property
+    def order_column(self):
+        """
+        The Column rows are sorted by
+        """
+        return self.order.column
+
+    @property
+    def descending(self):
+        """
+        Whether rows are sorted in descending order
+        """
+        return self.order.descending
+
+    def parse_cursor(self, cursor):
+        """
+        Returns the (value, pk) of a cursor, or None if it is missing, invalid or for a different sort order
+        """
+        if not cursor or not self.order_column.keyset:
+            return None
+        try:
+            column, descending, value, pk = json.loads(cursor)
+        except (TypeError, ValueError):
+            return None
+        if column != self.order_column.name or descending != self.descending or not isinstance(pk, int):
+            return None
+        return value, pk
+
+    def get_cursor(self, obj):
+        """
+        Returns the cursor of a model instance, for fetching the rows after it in the current sort order
+        """
+        return json.dumps([
+            self.order_column.name,
+            self.descending,
+            get_field_value(obj, self.order_column.order_field),
+            obj.pk
+        ])
+
+    def get_cache_key(self):
+        """
+        Returns a key identifying the page the query requests (everything but draw)
+        """
+        key = json.dumps([
+            self.start,
+            self.length,
+            self.search,
+            self.order_column.name,
+            self.descending,
+            self.filter,
+            self.after
+        ])
+        return hashlib.sha1(key.encode("utf8")).hexdigest()
+
+    def page_queryset(self, queryset, serialize, search_fields=(), filters=None):
+        """
+        Returns the response for a page of a queryset (without draw, so that it can be cached)
+
+        @param queryset: (QuerySet) every row of the list
+        @param serialize: (function) returns the row (dict) of a model instance
+        @param search_fields: (iterable) the fields searched (case-insensitively) for the search value
+        @param filters: (optional[dict]) the Q object of each filter
+        """
+        records_total = queryset.count()
+        queryset = self.filter_queryset(queryset, search_fields, filters)
+        records_filtered = queryset.count() if self.filter or self.search else records_total
+        rows = []
+        for obj in self.get_page(queryset):
+            row = serialize(obj)
+            if self.order_column.keyset:
+                row["cursor"] = self.get_cursor(obj)
+            rows.append(row)
+        return {"recordsTotal": records_total, "recordsFiltered": records_filtered, "data": rows}
+
+    def filter_queryset(self, queryset, search_fields=(), filters=None):
+        """
+        Returns the rows of a queryset that pass the filter and match the search value
+        """
+        if self.filter:
+            queryset = queryset.filter(filters[self.filter])
+        if self.search and search_fields:
+            queryset = queryset.filter(reduce(or_, [
+                Q(**{"{field}__icontains".format(field=field): self.search}) for field in search_fields
+            ]))
+        return queryset
+
+    def get_page(self, queryset):
+        """
+        Returns the requested page of a queryset in the sort order, after the cursor if there is one and otherwise
+        from the start offset
+        """
+        prefix = "-" if self.descending else ""
+        order_field = self.order_column.order_field
+        queryset = queryset.order_by(prefix + order_field, prefix + "pk")
+        if self.after is not None:
+            value, pk = self.after
+            lookup = "lt" if self.descending else "gt"
+            try:
+                return queryset.filter(
+                    Q(**{"{field}__{lookup}".format(field=order_field, lookup=lookup): value}) |
+                    Q(**{order_field: value, "pk__{lookup}".format(lookup=lookup): pk})
+                )[:self.length]
+            except (TypeError, ValueError):
+                # The cursor value doesn't fit the field
+                pass
+        return queryset[self.start:self.start + self.length]
+
+    def page_rows(self, rows, search_keys=(), filters=None):
+        """
+        Returns the response for a page of a list of rows held in memory (without draw, so that it can be cached)
+
+        @param rows: (list) every row (dict) of the list
+        @param search_keys: (iterable) the keys of the row values searched (case-insensitively) for the search value
+        @param filters: (optional[dict]) the function of each filter, which returns whether a row passes it
+        """
+        records_total = len(rows)
+        if self.filter:
+            rows = [row for row in rows if filters[self.filter](row)]
+        if self.search and search_keys:
+            search = self.search.lower()
+            rows = [row for row in rows if any(search in str(row[key]).lower() for key in search_keys)]
+        order_key = self.order_column.order_field
+        # Rows without a value are sorted first
+        rows = sorted(
+            rows,
+            key=lambda row: (row[order_key] is not None, row[order_key]),
+            reverse=self.descending
+        )
+        return {
+            "recordsTotal": records_total,
+            "recordsFiltered": len(rows),
+            "data": rows[self.start:self.start + self.length]
+        }
@@ -4,12 +4,20 @@ Backend logic for file uploads and downloads
 
 import os
 import re
-from io import BytesIO
-from zipfile import ZipFile, ZIP_DEFLATED
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO, UnsupportedOperation
+from tempfile import SpooledTemporaryFile
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
 
+from django.conf import settings
+from django.core.files.storage import default_storage, get_storage_class
 from django.http.response import StreamingHttpResponse
 
-from sga.backend.constants import INVALID_S3_CHARACTERS_REGEX, Roles
+from sga.backend.constants import INVALID_S3_CHARACTERS_REGEX, Roles, ZipCompression
 
 
 class StreamingBytesIO(BytesIO):
@@ -24,8 +32,8 @@ class StreamingBytesIO(BytesIO):
         Clears the BytesIO object while retaining the current virtual position
         """
         self._position = self.tell()
-        self.truncate(0)
-        self.seek(0)
+        super().truncate(0)
+        super().seek(0)
 
     def tell(self):
         """
@@ -34,6 +42,25 @@ class StreamingBytesIO(BytesIO):
         """
         return self._position + super().tell()
 
+    def seekable(self):
+        """
+        Reports the stream as not seekable, since emptied data can't be seeked back to. This makes ZipFile
+        write data descriptors after each file instead of seeking back to rewrite its local header.
+        """
+        return False
+
+    def seek(self, *args):  # pylint: disable=unused-argument
+        """
+        Raises UnsupportedOperation (see seekable())
+        """
+        raise UnsupportedOperation("seek")
+
+    def truncate(self, *args):  # pylint: disable=unused-argument
+        """
+        Raises UnsupportedOperation (see seekable())
+        """
+        raise UnsupportedOperation("truncate")
+
 
 def convert_illegal_S3_chars(path, replace_with="_"):
     """
@@ -42,27 +69,140 @@ def convert_illegal_S3_chars(path, replace_with="_"):
     return re.sub(INVALID_S3_CHARACTERS_REGEX, replace_with, path)
 
 
-def serve_zip_file(submissions, zipname="zipfile"):
+def serve_zip_file(submissions, zipname="zipfile", compression=None):
     """
     Takes a list of submissions and generates a streaming response from them
     """
-    resp = StreamingHttpResponse(submissions_zip_generator(submissions), content_type="application/zip")
+    resp = StreamingHttpResponse(
+        submissions_zip_generator(submissions, compression=compression),
+        content_type="application/zip"
+    )
     resp["Content-Disposition"] = "attachment; filename={zipname}.zip".format(zipname=zipname)
     return resp
 
 
-def submissions_zip_generator(submissions):
-    """ Generator to create the streaming response from the submissions """
+def submissions_zip_generator(submissions, compression=None):
+    """
+    Generator to create the streaming response from the submissions. Documents are prefetched from storage
+    by a thread pool (see prefetch_submission_documents()) and compressed chunk by chunk, yielding the zipped
+    data after each chunk, so memory use is bounded by the chunk and spool sizes rather than the file sizes.
+
+    @param compression: (optional[str]) one of ZipCompression.modes (defaults to settings.ZIP_COMPRESSION)
+    """
+    compression = compression or settings.ZIP_COMPRESSION
     bytes_io = StreamingBytesIO()
     with ZipFile(bytes_io, mode="w", compression=ZIP_DEFLATED, allowZip64=True) as zip_file:
-        for submission in submissions:
-            filename = os.path.basename(submission.student_document.name)
-            zip_file.writestr(filename, submission.student_document.read())
-            yield bytes_io.getvalue()
-            bytes_io.empty()
+        for filename, document in prefetch_submission_documents(submissions):
+            zip_info = get_zip_info(filename, document, get_compress_type(filename, document, compression))
+            with document, zip_file.open(zip_info, mode="w") as zipped_file:
+                for chunk in iter(partial(document.read, settings.ZIP_CHUNK_SIZE), b""):
+                    zipped_file.write(chunk)
+                    data = bytes_io.getvalue()
+                    if data:
+                        yield data
+                        bytes_io.empty()
     yield bytes_io.getvalue()
 
 
+def get_compress_type(filename, document, compression):
+    """
+    Returns the zipfile compression method (ZIP_STORED or ZIP_DEFLATED) for a file
+
+    @param filename: (str) name of the file
+    @param document: (file) seekable file object with the file's contents
+    @param compression: (str) one of ZipCompression.modes
+    """
+    if compression not in ZipCompression.modes:
+        raise ValueError("Unknown zip compression mode {}".format(compression))
+    if compression == ZipCompression.store:
+        return ZIP_STORED
+    if compression == ZipCompression.deflate:
+        return ZIP_DEFLATED
+    # Deflating already-compressed files costs CPU time for next to no reduction in size
+    if os.path.splitext(filename)[1].lower() in settings.ZIP_STORED_EXTENSIONS:
+        return ZIP_STORED
+    if settings.ZIP_COMPRESSIBILITY_SAMPLE_SIZE:
+        sample = document.read(settings.ZIP_COMPRESSIBILITY_SAMPLE_SIZE)
+        document.seek(0)
+        # Sampled at zlib's default level, which is the level ZipFile deflates with
+        if sample and len(zlib.compress(sample)) > len(sample) * settings.ZIP_MIN_COMPRESSION_RATIO:
+            return ZIP_STORED
+    return ZIP_DEFLATED
+
+
+def get_zip_info(filename, document, compress_type=ZIP_DEFLATED):
+    """
+    Returns the ZipInfo for a file to be written to a zip file from document (a seekable file object)
+    """
+    zip_info = ZipInfo(filename, date_time=time.localtime(time.time())[:6])
+    zip_info.compress_type = compress_type
+    zip_info.external_attr = 0o600 << 16
+    # The file size determines whether ZipFile needs zip64 extensions for this file
+    document.seek(0, os.SEEK_END)
+    zip_info.file_size = document.tell()
+    document.seek(0)
+    return zip_info
+
+
+def prefetch_submission_documents(submissions, depth=None, workers=None):
+    """
+    Yields (filename, file) pairs for each submission's student document, in order. A thread pool of workers
+    fetches up to depth documents ahead of the one being consumed; the caller is responsible for closing each file.
+
+    @param depth: (optional[int]) number of documents to fetch ahead (defaults to settings.ZIP_PREFETCH_DEPTH)
+    @param workers: (optional[int]) number of threads fetching documents (defaults to settings.ZIP_PREFETCH_WORKERS)
+    """
+    depth = settings.ZIP_PREFETCH_DEPTH if depth is None else depth
+    workers = settings.ZIP_PREFETCH_WORKERS if workers is None else workers
+    submissions = iter(submissions)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        try:
+            while True:
+                for submission in submissions:
+                    filename = os.path.basename(submission.student_document.name)
+                    pending.append((filename, executor.submit(fetch_submission_document, submission)))
+                    if len(pending) > depth:
+                        break
+                if not pending:
+                    return
+                filename, future = pending.popleft()
+                yield filename, future.result()
+        finally:
+            # Abandoned (e.g. the client disconnected); discard anything fetched but not consumed
+            for _, future in pending:
+                if not future.cancel():
+                    future.add_done_callback(_close_fetched_document)
+
+
+def fetch_submission_document(submission):
+    """
+    Copies a submission's student document from storage into a spooled temporary file, chunk by chunk,
+    and returns the temporary file
+    """
+    spooled_file = SpooledTemporaryFile(max_size=settings.ZIP_SPOOL_MAX_SIZE)
+    document = submission.student_document
+    document.open("rb")
+    try:
+        for chunk in document.chunks(chunk_size=settings.ZIP_CHUNK_SIZE):
+            spooled_file.write(chunk)
+    except Exception:
+        spooled_file.close()
+        raise
+    finally:
+        document.close()
+    spooled_file.seek(0)
+    return spooled_file
+
+
+def _close_fetched_document(future):
+    """
+    Closes the file fetched by a fetch_submission_document() future
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
 def student_submission_file_path(instance, filename):
     """
     Returns the upload destination path (including filename) for a student submission
@@ -95,7 +235,21 @@ def get_submitted_submissions(request, assignment, not_graded_only=False):
     """
     Retrieves a lazy list of submitted submissions for this assignment, taking into account the role of the user
     """
-    from sga.models import Submission, Grader
+    from sga.models import Grader
+    grader = None
+    if request.role == Roles.grader:
+        grader = Grader.objects.get(user=request.user, course=assignment.course_id)
+    return get_assignment_submissions(assignment, grader=grader, not_graded_only=not_graded_only)
+
+
+def get_assignment_submissions(assignment, grader=None, not_graded_only=False):
+    """
+    Retrieves a lazy list of submitted submissions (with a document) for this assignment
+
+    @param grader: (optional[Grader]) only include submissions of this grader's students
+    @param not_graded_only: (optional[bool]) only include submissions that are not graded
+    """
+    from sga.models import Submission
     # We can chain QuerySets because they are lazy
     submissions = Submission.objects.filter(
         assignment=assignment,
@@ -104,10 +258,18 @@ def get_submitted_submissions(request, assignment, not_graded_only=False):
     ).exclude(
         student_document=""
     )
-    if request.role == Roles.grader:
-        grader = Grader.objects.get(user=request.user, course=assignment.course_id)
-        student_users = [student.user for student in grader.students.filter(deleted=False)]
-        submissions = submissions.filter(student__in=student_users)
+    if grader is not None:
+        submissions = submissions.filter(student__in=grader.students.filter(deleted=False).values("user"))
     if not_graded_only:
         submissions = submissions.exclude(graded=True)
     return submissions
+
+
+def get_archive_storage():
+    """
+    Returns the storage for cached submission archives (settings.SUBMISSION_ARCHIVE_STORAGE, or the
+    default storage if that is not set)
+    """
+    if settings.SUBMISSION_ARCHIVE_STORAGE:
+        return get_storage_class(settings.SUBMISSION_ARCHIVE_STORAGE)()
+    return default_storage
@@ -0,0 +1,189 @@
+"""
+Backend logic for sending grades to edX: the grade passback outbox, which sends queued grades in the background,
+bulk grade syncs, and reconciliation of local grades with the grades edX holds
+"""
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.db.models import F, Q
+
+from sga.backend.send_grades import RateLimiter, read_grades, send_grades
+from sga.models import GradePassback, Submission
+
+log = logging.getLogger(__name__)
+
+# edX grades that differ from local grades by less than this are considered equal (float rounding)
+GRADE_DRIFT_TOLERANCE = 1e-6
+
+
+def get_retry_delay(attempts):
+    """
+    Returns the seconds to wait before retrying a grade passback that failed attempts times (exponential backoff)
+    """
+    return min(settings.GRADE_PASSBACK_RETRY_DELAY * 2 ** (attempts - 1), settings.GRADE_PASSBACK_MAX_RETRY_DELAY)
+
+
+def claim_grade_passbacks(limit):
+    """
+    Marks up to limit grade passbacks that are due (or whose send timed out) as sending and returns them
+    """
+    now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    timed_out = now - timedelta(seconds=settings.GRADE_PASSBACK_SEND_TIMEOUT)
+    passbacks = GradePassback.objects.filter(
+        Q(status=GradePassback.PENDING, next_attempt_at__lte=now) |
+        Q(status=GradePassback.SENDING, updated_on__lt=timed_out)
+    ).order_by("next_attempt_at")[:limit]
+    claimed = []
+    for passback in passbacks:
+        # Only one worker can claim a passback, since the others' updates won't match any rows
+        if GradePassback.objects.filter(
+                pk=passback.pk,
+                status=passback.status,
+                version=passback.version,
+                updated_on=passback.updated_on
+        ).update(status=GradePassback.SENDING, updated_on=now):
+            claimed.append(passback)
+    return claimed
+
+
+def record_grade_passback(passback, error=None):
+    """
+    Records the result of sending a claimed grade passback: sent, or scheduled for a retry (failed after
+    settings.GRADE_PASSBACK_MAX_ATTEMPTS attempts). Nothing is recorded if a new grade was queued meanwhile,
+    so the new grade is still sent.
+    """
+    now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    attempts = passback.attempts + 1
+    if error is None:
+        values = {"status": GradePassback.SENT, "sent_at": now, "last_error": ""}
+    elif attempts >= settings.GRADE_PASSBACK_MAX_ATTEMPTS:
+        values = {"status": GradePassback.FAILED, "next_attempt_at": None, "last_error": str(error)}
+    else:
+        values = {
+            "status": GradePassback.PENDING,
+            "next_attempt_at": now + timedelta(seconds=get_retry_delay(attempts)),
+            "last_error": str(error),
+        }
+    recorded = GradePassback.objects.filter(
+        pk=passback.pk,
+        version=passback.version
+    ).update(attempts=F("attempts") + 1, updated_on=now, **values)
+    if recorded and passback.submission_id is not None:
+        record_grade_sync([passback.submission_id], error)
+
+
+def record_grade_sync(submission_ids, error=None):
+    """
+    Records the result of sending the grades of submissions to edX on the submissions
+    """
+    # updated_on is left alone, since the submissions themselves didn't change
+    Submission.objects.filter(pk__in=submission_ids).update(
+        grade_sync_status=GradePassback.SENT if error is None else GradePassback.FAILED,
+        grade_synced_at=datetime.utcnow().replace(tzinfo=pytz.UTC),
+        grade_sync_error=None if error is None else str(error)
+    )
+
+
+def send_pending_grades(concurrency=None):
+    """
+    Sends every due grade passback to edX with concurrency threads (defaults to
+    settings.GRADE_PASSBACK_CONCURRENCY). Returns the number of grades sent and the number of failed attempts.
+    """
+    concurrency = concurrency or settings.GRADE_PASSBACK_CONCURRENCY
+    sent = failed = 0
+    while True:
+        passbacks = claim_grade_passbacks(concurrency * 10)
+        if not passbacks:
+            break
+        errors = send_grades(
+            [(passback.consumer_key, passback.edx_url, passback.result_id, passback.score) for passback in passbacks],
+            concurrency=concurrency
+        )
+        for passback, error in zip(passbacks, errors):
+            if error is not None:
+                log.warning("Unable to send grade for %s: %s", passback.result_id, error)
+            record_grade_passback(passback, error)
+            if error is None:
+                sent += 1
+            else:
+                failed += 1
+    return sent, failed
+
+
+def get_syncable_submissions(course, assignment=None, unsynced_only=False):
+    """
+    Returns the graded submissions of a course (or an assignment) whose grades can be sent to edX
+
+    @param unsynced_only: (optional[bool]) exclude submissions whose grade was last sent successfully
+    """
+    submissions = Submission.objects.filter(
+        assignment__course=course,
+        graded=True,
+        grade__isnull=False,
+        result_id__isnull=False
+    ).exclude(result_id="")
+    if assignment is not None:
+        submissions = submissions.filter(assignment=assignment)
+    if unsynced_only:
+        submissions = submissions.exclude(grade_sync_status=GradePassback.SENT)
+    return submissions
+
+
+def sync_grades(submissions, concurrency=None, batch_size=1000):
+    """
+    Sends the grades of submissions (see get_syncable_submissions()) to edX and records the result on each
+    submission. Yields a (submission, error) pair for each submission, error being None if the grade was sent.
+    """
+    submissions = submissions.select_related("assignment", "student").order_by("id")
+    last_id = 0
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        errors = send_grades(
+            [
+                (submission.consumer_key, submission.edx_url, submission.result_id, submission.edx_grade())
+                for submission in batch
+            ],
+            concurrency=concurrency
+        )
+        record_grade_sync([submission.id for submission, error in zip(batch, errors) if error is None])
+        for submission, error in zip(batch, errors):
+            if error is not None:
+                record_grade_sync([submission.id], error)
+        yield from zip(batch, errors)
+
+
+def reconcile_grades(submissions, concurrency=None, rate=None, after_id=0, batch_size=1000):
+    """
+    Reads the grades of submissions (see get_syncable_submissions()) from edX in order of id, starting after
+    after_id, so an interrupted reconciliation can resume. Yields a list of (submission, edX grade, error) for each
+    batch of submissions, the edX grade being None if edX has no grade (or error, if it couldn't be read).
+
+    @param concurrency: (optional[int]) number of grades to read at once
+    @param rate: (optional[float]) maximum number of grades to read per second
+    """
+    submissions = submissions.select_related("assignment", "student").order_by("id")
+    rate_limiter = RateLimiter(rate)
+    last_id = after_id
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        results = read_grades(
+            [(submission.consumer_key, submission.edx_url, submission.result_id) for submission in batch],
+            concurrency=concurrency,
+            rate_limiter=rate_limiter
+        )
+        yield [(submission, edx_grade, error) for submission, (edx_grade, error) in zip(batch, results)]
+
+
+def is_grade_drifted(submission, edx_grade):
+    """
+    Returns True if the grade edX holds for a submission (None if it has none) differs from the submission's grade
+    """
+    return edx_grade is None or abs(edx_grade - submission.edx_grade()) > GRADE_DRIFT_TOLERANCE
@@ -0,0 +1,120 @@
+"""
+Backend logic for initial LTI launches from edX
+"""
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sga.backend.authentication import get_course_memberships, invalidate_course, ROLE_PRIORITY
+from sga.backend.constants import Roles
+from sga.models import Assignment, Course, Grader, Student, Submission
+
+# LTI roles that make the user an administrator of the course
+ADMIN_LTI_ROLES = ["Administrator", "Instructor"]
+
+
+def parse_due_date(due_date):
+    """
+    Returns the datetime of a custom_component_due_date LTI parameter (None if it is empty), made aware in the
+    default timezone if it has none, like it would be when saved
+    """
+    due_date = parse_datetime(due_date) if due_date else None
+    if due_date is not None and timezone.is_naive(due_date):
+        due_date = timezone.make_aware(due_date, timezone.get_default_timezone())
+    return due_date
+
+
+def process_lti_launch(user, lti_params, post_params):
+    """
+    Updates the course, assignment, memberships and submission of an initial LTI launch in one transaction,
+    writing only what the launch changed. Returns the (course, assignment, role) of the user.
+
+    @param user: (User) the launching user
+    @param lti_params: (dict) the LTI parameters of the request (request.LTI)
+    @param post_params: (QueryDict) the POST parameters of the request
+    """
+    with transaction.atomic():
+        course, _ = Course.objects.get_or_create(edx_id=lti_params["context_id"])
+        assignment = update_assignment(
+            course,
+            lti_params["resource_link_id"],
+            post_params.get("custom_component_display_name", lti_params["resource_link_id"]),
+            parse_due_date(post_params.get("custom_component_due_date"))
+        )
+        roles = {role for _, role in get_course_memberships(user, course_id=course.id)}
+        memberships_changed = False
+        if any(role in lti_params.get("roles", []) for role in ADMIN_LTI_ROLES):
+            if Roles.admin not in roles:
+                course.administrators.add(user)
+                memberships_changed = True
+            if Roles.grader in roles:
+                Grader.objects.filter(user=user, course=course).delete()
+                memberships_changed = True
+            if Roles.student in roles:
+                Student.objects.filter(user=user, course=course).delete()
+                memberships_changed = True
+            roles = {Roles.admin}
+        else:
+            if Roles.admin in roles:
+                course.administrators.remove(user)
+                roles.discard(Roles.admin)
+                memberships_changed = True
+            # Ensure the student object exists; graders also should have a student object, since
+            # they are promoted from students and if they are ever demoted, their student data
+            # should still exist
+            if Roles.student not in roles:
+                Student.objects.get_or_create(course=course, user=user)
+                roles.add(Roles.student)
+                memberships_changed = True
+            # If this user is a student, we need to generate a Submission object and store
+            # grade submission information
+            update_submission(
+                user,
+                assignment,
+                edx_url=lti_params["lis_outcome_service_url"],
+                result_id=post_params.get("lis_result_sourcedid"),
+                consumer_key=post_params.get("oauth_consumer_key")
+            )
+    if memberships_changed:
+        # Drop any cached copy of the course
+        invalidate_course(course.id)
+    role = next(role for role in ROLE_PRIORITY if role in roles)
+    return course, assignment, role
+
+
+def update_assignment(course, edx_id, name, due_date):
+    """
+    Returns the assignment with edx_id, creating it or updating its course, name and due date if they differ
+    """
+    assignment, created = Assignment.objects.get_or_create(
+        edx_id=edx_id,
+        defaults={"course": course, "name": name, "due_date": due_date}
+    )
+    if not created:
+        changes = {
+            field: value
+            for field, value in [("course_id", course.id), ("name", name), ("due_date", due_date)]
+            if getattr(assignment, field) != value
+        }
+        if changes:
+            assignment.update(**changes)
+    return assignment
+
+
+def update_submission(user, assignment, **grade_params):
+    """
+    Returns the submission of user for assignment, creating it or updating its grade passback parameters
+    (edx_url, result_id and consumer_key) if they differ
+    """
+    submission, created = Submission.objects.get_or_create(
+        student=user,
+        assignment=assignment,
+        defaults=grade_params
+    )
+    if not created:
+        changes = {
+            field: value for field, value in grade_params.items() if getattr(submission, field) != value
+        }
+        if changes:
+            submission.update(**changes)
+    return submission
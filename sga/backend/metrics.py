@@ -0,0 +1,187 @@
+"""
+Per-request metrics: time, calls and bytes of the work done while handling a request (see
+sga.middleware.RequestMetricsMiddleware), and the storage and template backends that record them
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import get_storage_class
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.engine import _dirs_undefined
+
+STORAGE = "storage"
+LTI = "lti"
+TEMPLATE = "template"
+
+_local = threading.local()  # pylint: disable=invalid-name
+
+
+class RequestMetrics(object):
+    """
+    Thread safe record of the calls, time and bytes of each kind of work (STORAGE, LTI or TEMPLATE) done while
+    handling a request
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, name, seconds, size=0):
+        """
+        Records a call that took seconds and transferred size bytes
+        """
+        with self._lock:
+            calls, total_seconds, total_size = self._totals.get(name, (0, 0.0, 0))
+            self._totals[name] = (calls + 1, total_seconds + seconds, total_size + size)
+
+    def get(self, name):
+        """
+        Returns the (calls, seconds, bytes) recorded for a kind of work
+        """
+        with self._lock:
+            return self._totals.get(name, (0, 0.0, 0))
+
+    @property
+    def duration(self):
+        """
+        Seconds from the start of the request to stop_request_metrics() (or to now if it's still recording)
+        """
+        return (self.end or time.perf_counter()) - self.start
+
+
+def start_request_metrics():
+    """
+    Starts recording metrics in the current thread and returns the RequestMetrics they are recorded in
+    """
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def stop_request_metrics():
+    """
+    Stops recording metrics in the current thread and returns the RequestMetrics they were recorded in (or None)
+    """
+    metrics = getattr(_local, "metrics", None)
+    _local.metrics = None
+    if metrics is not None:
+        metrics.end = time.perf_counter()
+    return metrics
+
+
+def get_request_metrics():
+    """
+    Returns the RequestMetrics being recorded in the current thread, or None
+    """
+    return getattr(_local, "metrics", None)
+
+
+@contextmanager
+def recording(metrics):
+    """
+    Records metrics in the current thread into metrics (a RequestMetrics, or None not to record), for work that a
+    request hands off to another thread
+    """
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    try:
+        yield
+    finally:
+        _local.metrics = previous
+
+
+@contextmanager
+def timed(name, size=0):
+    """
+    Records the time the block takes as a call of a kind of work, if metrics are being recorded
+    """
+    metrics = getattr(_local, "metrics", None)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start, size)
+
+
+class MeteredStorage(object):
+    """
+    File storage that records the calls to the storage class settings.METERED_FILE_STORAGE (and the bytes saved
+    and opened) as STORAGE metrics, and delegates everything else to it
+    """
+    def __init__(self, *args, **kwargs):
+        self.storage = get_storage_class(settings.METERED_FILE_STORAGE)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def open(self, name, mode="rb"):
+        """
+        Opens a file, recording the file's size
+        """
+        metrics = get_request_metrics()
+        if metrics is None:
+            return self.storage.open(name, mode)
+        start = time.perf_counter()
+        opened = self.storage.open(name, mode)
+        metrics.add(STORAGE, time.perf_counter() - start, opened.size if "r" in mode else 0)
+        return opened
+
+    def save(self, name, content, *args, **kwargs):
+        """
+        Saves a file, recording the content's size
+        """
+        with timed(STORAGE, getattr(content, "size", 0) or 0):
+            return self.storage.save(name, content, *args, **kwargs)
+
+    def delete(self, name):
+        """
+        Deletes a file
+        """
+        with timed(STORAGE):
+            return self.storage.delete(name)
+
+    def exists(self, name):
+        """
+        Returns whether a file exists
+        """
+        with timed(STORAGE):
+            return self.storage.exists(name)
+
+    def size(self, name):
+        """
+        Returns the size of a file
+        """
+        with timed(STORAGE):
+            return self.storage.size(name)
+
+    def listdir(self, path):
+        """
+        Returns the directories and files in a path
+        """
+        with timed(STORAGE):
+            return self.storage.listdir(path)
+
+
+class MeteredTemplate(Template):
+    """
+    Django template that records its rendering time as a TEMPLATE metric
+    """
+    def render(self, context=None, request=None):
+        with timed(TEMPLATE):
+            return super().render(context=context, request=request)
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend whose templates record their rendering time as TEMPLATE metrics
+    """
+    def from_string(self, template_code):
+        return MeteredTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name, dirs=_dirs_undefined):
+        return MeteredTemplate(super().get_template(template_name, dirs).template, self)
@@ -0,0 +1,29 @@
+"""
+S3 storage with direct uploads (see sga.backend.uploads). It builds on django-storages' boto3 backend, so using it
+(DEFAULT_FILE_STORAGE = "sga.backend.s3.DirectUploadS3Boto3Storage") requires boto3.
+"""
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+
+class DirectUploadS3Boto3Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage that presigns POSTs for uploading files straight to the bucket. The bucket's CORS configuration
+    must allow POSTs from the app's origin.
+    """
+    def get_presigned_post(self, name, max_size, expires_in):
+        """
+        Returns the url and form fields of a POST that uploads a file of at most max_size bytes to name
+        """
+        fields = {}
+        conditions = [["content-length-range", 0, max_size]]
+        if self.default_acl:
+            fields["acl"] = self.default_acl
+            conditions.append({"acl": self.default_acl})
+        return self.bucket.meta.client.generate_presigned_post(
+            self.bucket_name,
+            self._normalize_name(clean_name(name)),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires_in
+        )
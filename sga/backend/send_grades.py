@@ -4,111 +4,379 @@ This module handles sending grades back to edX
 Most of this module is a python 3 port of pylti (github.com/mitodl/sga-lti)
 and should be moved back into that library.
 """
+import http.client
+import re
+import socket
+import threading
+import time
 import uuid
-from xml.etree import ElementTree as etree
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from xml.sax.saxutils import escape, unescape
 
 import oauth2
 from django.conf import settings
 
+from sga.backend.metrics import LTI, get_request_metrics, recording, timed
+
 
 class SendGradeFailure(Exception):
     """ Exception class for failures sending grades to edX"""
 
 
-def send_grade(consumer_key, edx_url, result_id, grade):
-    """ Sends a grade to edX """
+def send_grade(consumer_key, edx_url, result_id, grade, client=None):
+    """
+    Sends a grade to edX. Defaults to the shared client from get_outcome_client().
+    """
+    _post_outcome_request(consumer_key, edx_url, "replaceResult", result_id, grade, client=client)
+
+
+def read_grade(consumer_key, edx_url, result_id, client=None):
+    """
+    Reads a grade from edX. Returns the grade (0.00 - 1.00), or None if edX has no grade for result_id.
+    """
+    response = _post_outcome_request(consumer_key, edx_url, "readResult", result_id, None, client=client)
+    if response.score is None:
+        return None
+    try:
+        return float(response.score)
+    except ValueError:
+        raise SendGradeFailure("Read grade from edX returned invalid grade %s" % response.score)
+
+
+def _post_outcome_request(consumer_key, edx_url, operation, result_id, grade, client=None):
+    # pylint: disable=too-many-arguments
+    """
+    Posts an outcome request to edX and returns the parsed OutcomeResponse, raising SendGradeFailure unless it
+    succeeded
+    """
     if consumer_key not in settings.LTI_OAUTH_CREDENTIALS:
         raise SendGradeFailure("Invalid consumer_key %s" % consumer_key)
-    body = generate_request_xml(str(uuid.uuid1()), "replaceResult", result_id, grade)
-    secret = settings.LTI_OAUTH_CREDENTIALS[consumer_key]
-    response, content = _post_patched_request(consumer_key, secret, body, edx_url, "POST", "application/xml")
-    if isinstance(content, bytes):
-        content = content.decode("utf8")
-    if "<imsx_codeMajor>success</imsx_codeMajor>" not in content:
-        raise SendGradeFailure("Send grades to edX returned %s" % response.status)
+    body = generate_request_xml(str(uuid.uuid1()), operation, result_id, grade)
+    status, content = (client or get_outcome_client()).post(consumer_key, edx_url, body)
+    response = parse_response_xml(content)
+    if response.code_major != "success":
+        raise SendGradeFailure("%s to edX returned %s%s" % (
+            _OUTCOME_ACTIONS.get(operation, operation),
+            status,
+            ": %s" % response.description if response.description else ""
+        ))
+    return response
+
+
+def send_grades(grades, concurrency=None):
+    """
+    Sends grades to edX with a pool of concurrency threads (defaults to settings.GRADE_PASSBACK_CONCURRENCY),
+    which share the keep-alive connections of the outcome client
+
+    :param grades: list of (consumer_key, edx_url, result_id, grade) tuples
+    :return: list with the exception raised sending each grade, or None if it was sent
+    """
+    return [error for _, error in _map_outcome_requests(send_grade, grades, concurrency)]
 
 
-def _post_patched_request(lti_key, secret, body, url, method, content_type):  # pylint: disable=too-many-arguments
+def read_grades(results, concurrency=None, rate_limiter=None):
     """
-    Authorization header needs to be capitalized for some LTI clients
-    this function ensures that header is capitalized
+    Reads grades from edX with a pool of concurrency threads (defaults to settings.GRADE_PASSBACK_CONCURRENCY),
+    waiting on rate_limiter (a RateLimiter, if given) before each request
 
-    :param body: body of the call
-    :param client: OAuth Client
-    :param url: outcome url
-    :return: response
+    :param results: list of (consumer_key, edx_url, result_id) tuples
+    :return: list of (grade, exception) pairs, with the grade from read_grade() or the exception raised reading it
     """
+    return _map_outcome_requests(read_grade, results, concurrency, rate_limiter=rate_limiter)
 
-    consumer = oauth2.Consumer(key=lti_key, secret=secret)
-    client = oauth2.Client(consumer)
 
-    import httplib2
+def _map_outcome_requests(function, requests, concurrency=None, rate_limiter=None):
+    """
+    Calls function with each of requests (argument tuples) and the shared outcome client in a thread pool, and
+    returns a list of (result, exception) pairs
+    """
+    client = get_outcome_client()
+    # Requests made for a request handler are measured in its metrics
+    metrics = get_request_metrics()
+
+    def call(args):
+        """ Calls function, returning the exception if it failed """
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            with recording(metrics):
+                return function(*args, client=client), None
+        except Exception as error:  # pylint: disable=broad-except
+            return None, error
+
+    with ThreadPoolExecutor(max_workers=concurrency or settings.GRADE_PASSBACK_CONCURRENCY) as executor:
+        return list(executor.map(call, requests))
+
+
+class RateLimiter(object):
+    """
+    Thread safe limiter that spaces out calls to wait() to at most rate per second (or doesn't limit them if rate
+    is None)
+    """
+    def __init__(self, rate, timer=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate if rate else 0
+        self.timer = timer
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next_time = None
 
-    http = httplib2.Http
-    # pylint: disable=protected-access
-    normalize = http._normalize_headers
+    def wait(self):
+        """
+        Blocks until the next call is allowed
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.timer()
+            call_time = now if self._next_time is None else max(now, self._next_time)
+            self._next_time = call_time + self.interval
+        if call_time > now:
+            self.sleep(call_time - now)
 
-    def my_normalize(self, headers):
-        """ This function patches Authorization header """
-        ret = normalize(self, headers)
-        if 'authorization' in ret:
-            ret['Authorization'] = ret.pop('authorization')
-        return ret
 
-    http._normalize_headers = my_normalize
-    monkey_patch_function = normalize
-    response, content = client.request(
-        url,
-        method,
-        body=body.encode("utf8"),
-        headers={'Content-Type': content_type})
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPS connection that resumes a previous TLS session with the host if it is given one
+    """
+    def __init__(self, host, session=None, **kwargs):
+        super().__init__(host, **kwargs)
+        self.session = session
+
+    def connect(self):
+        # Opens the TCP connection (and tunnel) without HTTPSConnection's TLS handshake, which can't resume a session
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(
+            self.sock,
+            server_hostname=self._tunnel_host or self.host,
+            session=self.session
+        )
+
+
+class OutcomeClient(object):
+    """
+    Thread safe client for posting signed requests to LTI outcome services. Keeps up to max_idle_connections idle
+    keep-alive connections (and the last TLS session) per outcome host, and an OAuth consumer per consumer key.
+    Timeouts and max_idle_connections default to the GRADE_PASSBACK_* settings.
+    """
+    signature_method = oauth2.SignatureMethod_HMAC_SHA1()
+
+    def __init__(self, connect_timeout=None, read_timeout=None, max_idle_connections=None):
+        self.connect_timeout = connect_timeout or settings.GRADE_PASSBACK_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.GRADE_PASSBACK_READ_TIMEOUT
+        self.max_idle_connections = (
+            settings.GRADE_PASSBACK_MAX_IDLE_CONNECTIONS if max_idle_connections is None else max_idle_connections
+        )
+        self._lock = threading.Lock()
+        self._idle_connections = {}
+        self._tls_sessions = {}
+        self._consumers = {}
 
-    http = httplib2.Http
-    # pylint: disable=protected-access
-    http._normalize_headers = monkey_patch_function
+    def get_consumer(self, consumer_key):
+        """
+        Returns the OAuth consumer for consumer_key with its secret from settings.LTI_OAUTH_CREDENTIALS
+        """
+        if consumer_key not in settings.LTI_OAUTH_CREDENTIALS:
+            raise SendGradeFailure("Invalid consumer_key %s" % consumer_key)
+        secret = settings.LTI_OAUTH_CREDENTIALS[consumer_key]
+        consumer = self._consumers.get(consumer_key)
+        if consumer is None or consumer.secret != secret:
+            consumer = self._consumers[consumer_key] = oauth2.Consumer(key=consumer_key, secret=secret)
+        return consumer
 
-    return response, content
+    def get_authorization(self, consumer_key, url, body):
+        """
+        Returns the OAuth Authorization header value (with a body hash) for posting body to url
+        """
+        consumer = self.get_consumer(consumer_key)
+        request = oauth2.Request.from_consumer_and_token(
+            consumer, http_method="POST", http_url=url, body=body, is_form_encoded=False
+        )
+        request.sign_request(self.signature_method, consumer, None)
+        scheme, netloc = urlsplit(url)[:2]
+        return request.to_header(realm=urlunsplit((scheme, netloc, "", "", "")))["Authorization"]
+
+    def post(self, consumer_key, url, body, content_type="application/xml"):
+        """
+        Posts body (a str) to url signed with the credentials of consumer_key
+
+        :return: (status, content) of the response
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise SendGradeFailure("Invalid outcome service URL %s" % url)
+        body = body.encode("utf8")
+        headers = {
+            "Authorization": self.get_authorization(consumer_key, url, body),
+            "Content-Type": content_type,
+            "Content-Length": str(len(body)),
+        }
+        host = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path = "{path}?{query}".format(path=path, query=parts.query)
+        with timed(LTI, len(body)):
+            connection = self._get_idle_connection(host)
+            if connection is not None:
+                try:
+                    return self._request(host, connection, path, body, headers)
+                except ConnectionError:
+                    # The host closed the idle connection, so retry once on a new one
+                    pass
+            return self._request(host, self._connect(host), path, body, headers)
+
+    def close(self):
+        """
+        Closes the idle connections
+        """
+        with self._lock:
+            connections = [connection for idle in self._idle_connections.values() for connection in idle]
+            self._idle_connections = {}
+        for connection in connections:
+            connection.close()
+
+    def _get_idle_connection(self, host):
+        """
+        Returns an idle connection to host, or None if there is none
+        """
+        with self._lock:
+            idle = self._idle_connections.get(host)
+            return idle.pop() if idle else None
+
+    def _connect(self, host):
+        """
+        Returns a new connection to host
+        """
+        scheme, netloc = host
+        if scheme == "https":
+            connection = _HTTPSConnection(netloc, session=self._tls_sessions.get(host), timeout=self.connect_timeout)
+        else:
+            connection = http.client.HTTPConnection(netloc, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        # http.client sends the headers and body separately, which Nagle's algorithm would delay on a kept alive
+        # connection until the host acknowledges the headers
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if scheme == "https":
+            self._tls_sessions[host] = connection.sock.session
+        return connection
+
+    def _request(self, host, connection, path, body, headers):
+        """
+        Posts a request on connection, and returns it to the idle connections if it can be reused
+        """
+        # pylint: disable=too-many-arguments
+        try:
+            connection.request("POST", path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read().decode("utf8")
+        except Exception:
+            connection.close()
+            raise
+        with self._lock:
+            idle = self._idle_connections.setdefault(host, [])
+            if not response.will_close and len(idle) < self.max_idle_connections:
+                idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+        return response.status, content
+
+
+_outcome_client = None  # pylint: disable=invalid-name
+_outcome_client_lock = threading.Lock()  # pylint: disable=invalid-name
+
+
+def get_outcome_client():
+    """
+    Returns the OutcomeClient shared by the process
+    """
+    global _outcome_client  # pylint: disable=global-statement,invalid-name
+    with _outcome_client_lock:
+        if _outcome_client is None:
+            _outcome_client = OutcomeClient()
+        return _outcome_client
+
+
+OUTCOME_XMLNS = "http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0"
+OUTCOME_OPERATIONS = ["replaceResult", "readResult", "deleteResult"]
+_OUTCOME_ACTIONS = {"replaceResult": "Send grades", "readResult": "Read grade", "deleteResult": "Delete grade"}
+
+# The envelope as ElementTree serializes it, split around the values filled in for each request. Empty values
+# are serialized as empty elements, like ElementTree does.
+_REQUEST_XML_HEADER = (
+    "<?xml version='1.0' encoding='utf-8'?>\n"
+    '<imsx_POXEnvelopeRequest xmlns="{xmlns}"><imsx_POXHeader><imsx_POXRequestHeaderInfo>'
+    "<imsx_version>V1.0</imsx_version>".format(xmlns=OUTCOME_XMLNS)
+)
+_RESPONSE_XML_FIELDS = {"imsx_codeMajor": "code_major", "imsx_description": "description", "textString": "score"}
+_RESPONSE_XML_PATTERN = re.compile(r"<(?:\w+:)?({tags})\s*>([^<]*)<".format(tags="|".join(_RESPONSE_XML_FIELDS)))
+
+
+OutcomeResponse = namedtuple("OutcomeResponse", ["code_major", "description", "score"])
+
+
+def _build_request_xml_template(operation):
+    """
+    Returns the (body start, body end) of the request envelope for operation, around the resultRecord contents
+    """
+    return (
+        "</imsx_POXRequestHeaderInfo></imsx_POXHeader><imsx_POXBody><{operation}Request><resultRecord>"
+        "<sourcedGUID>".format(operation=operation),
+        "</resultRecord></{operation}Request></imsx_POXBody></imsx_POXEnvelopeRequest>".format(operation=operation),
+    )
+
+
+_REQUEST_XML_TEMPLATES = {operation: _build_request_xml_template(operation) for operation in OUTCOME_OPERATIONS}
+
+
+def _xml_element(tag, text):
+    """
+    Returns an element with escaped text, serialized like ElementTree does
+    """
+    if not text:
+        return "<{tag} />".format(tag=tag)
+    return "<{tag}>{text}</{tag}>".format(tag=tag, text=escape(text))
 
 
 def generate_request_xml(message_identifier_id, operation,
                          lis_result_sourcedid, score):
-    # pylint: disable=too-many-locals
     """
     Generates LTI 1.1 XML for posting result to LTI consumer.
 
     :param message_identifier_id:
-    :param operation:
+    :param operation: one of OUTCOME_OPERATIONS
     :param lis_result_sourcedid:
-    :param score:
+    :param score: score for replaceResult, or None
     :return: XML string
     """
-    root = etree.Element('imsx_POXEnvelopeRequest',
-                         xmlns='http://www.imsglobal.org/services/'
-                               'ltiv1p1/xsd/imsoms_v1p0')
-
-    header = etree.SubElement(root, 'imsx_POXHeader')
-    header_info = etree.SubElement(header, 'imsx_POXRequestHeaderInfo')
-    version = etree.SubElement(header_info, 'imsx_version')
-    version.text = 'V1.0'
-    message_identifier = etree.SubElement(header_info,
-                                          'imsx_messageIdentifier')
-    message_identifier.text = message_identifier_id
-    body = etree.SubElement(root, 'imsx_POXBody')
-    xml_request = etree.SubElement(body, '%s%s' % (operation, 'Request'))
-    record = etree.SubElement(xml_request, 'resultRecord')
-
-    guid = etree.SubElement(record, 'sourcedGUID')
-
-    sourcedid = etree.SubElement(guid, 'sourcedId')
-    sourcedid.text = lis_result_sourcedid
+    body_start, body_end = _REQUEST_XML_TEMPLATES.get(operation) or _build_request_xml_template(operation)
+    parts = [
+        _REQUEST_XML_HEADER,
+        _xml_element("imsx_messageIdentifier", message_identifier_id),
+        body_start,
+        _xml_element("sourcedId", lis_result_sourcedid),
+        "</sourcedGUID>",
+    ]
     if score is not None:
-        result = etree.SubElement(record, 'result')
-        result_score = etree.SubElement(result, 'resultScore')
-        language = etree.SubElement(result_score, 'language')
-        language.text = 'en'
-        text_string = etree.SubElement(result_score, 'textString')
-        text_string.text = score.__str__()
-    ret = "<?xml version='1.0' encoding='utf-8'?>\n{}".format(
-        etree.tostring(root, encoding='unicode'))
-
-    return ret
+        parts.extend([
+            "<result><resultScore><language>en</language>",
+            _xml_element("textString", str(score)),
+            "</resultScore></result>",
+        ])
+    parts.append(body_end)
+    return "".join(parts)
+
+
+def parse_response_xml(content):
+    """
+    Returns the OutcomeResponse with the imsx_codeMajor, imsx_description and (for readResult) score of an outcome
+    service response. Values missing from the response are None.
+    """
+    values = dict.fromkeys(_RESPONSE_XML_FIELDS.values())
+    for tag, text in _RESPONSE_XML_PATTERN.findall(content):
+        name = _RESPONSE_XML_FIELDS[tag]
+        if values[name] is None:
+            values[name] = unescape(text.strip()) or None
+    return OutcomeResponse(**values)
@@ -0,0 +1,107 @@
+"""
+Session engine for SGA (set SESSION_ENGINE = "sga.backend.sessions")
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.utils import timezone
+
+KEY_PREFIX = "sga.sessions"
+
+
+def get_session_data_hash(data):
+    """
+    Returns a hash of session data, which doesn't depend on the order of its keys
+    """
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf8")).hexdigest()
+
+
+class SessionStore(DBStore):
+    """
+    Database backed sessions that are read from a cache, and only written to the database when their data
+    changed. A session is saved on every LTI launch, but its data (the user, LTI parameters and course_roles)
+    rarely changes between launches.
+
+    A session whose data changes gets a new key, so the copy of the session cached under the old key is never
+    read again and a per-process cache (like the default local memory cache) can't return stale roles. Cached
+    copies also expire after settings.SESSION_CACHE_TTL_SECONDS.
+
+    Since unchanged sessions aren't written, a session expires settings.SESSION_COOKIE_AGE after its data last
+    changed.
+    """
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._saved_data_hash = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        """
+        Returns the cache key of the session
+        """
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def get_cache_timeout(self, expiry=None):
+        """
+        Returns the seconds to cache the session for
+        """
+        return min(self.get_expiry_age(expiry=expiry), settings.SESSION_CACHE_TTL_SECONDS)
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:  # pylint: disable=broad-except
+            # Some backends (e.g. memcache) raise an exception on invalid keys
+            data = None
+        if data is None:
+            session = self._get_session_from_db()
+            if session is None:
+                self._session_key = None
+                return {}
+            data = self.decode(session.session_data)
+            self._cache.set(self.cache_key, data, self.get_cache_timeout(expiry=session.expire_date))
+        self._saved_data_hash = get_session_data_hash(data)
+        return data
+
+    def _get_session_from_db(self):
+        """
+        Returns the unexpired Session model instance of the session, or None if there is none
+        """
+        try:
+            return self.model.objects.get(session_key=self.session_key, expire_date__gt=timezone.now())
+        except self.model.DoesNotExist:
+            return None
+
+    def exists(self, session_key):
+        if session_key and (self.cache_key_prefix + session_key) in self._cache:
+            return True
+        return super().exists(session_key)
+
+    def save(self, must_create=False):
+        data_hash = get_session_data_hash(self._get_session(no_load=must_create))
+        if must_create or self.session_key is None or self._saved_data_hash is None:
+            super().save(must_create=must_create)
+            self._cache.set(self.cache_key, self._session, self.get_cache_timeout())
+            self._saved_data_hash = data_hash
+        elif data_hash != self._saved_data_hash:
+            # Saves the session under a new key (with must_create) and deletes the old key
+            self.cycle_key()
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+        self._saved_data_hash = None
@@ -0,0 +1,99 @@
+"""
+Direct uploads of student documents: the browser uploads the document straight to the storage with a presigned
+POST, and the app then confirms the upload from the stored object's metadata. Storages support direct uploads by
+implementing get_presigned_post(name, max_size, expires_in), which returns the url and form fields of a POST that
+uploads a file of at most max_size bytes to name (see sga.backend.s3 and LocalDirectUploadStorage).
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.urlresolvers import reverse
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+
+from sga.backend.files import student_submission_file_path
+from sga.backend.validators import validate_file_extension
+
+LOCAL_UPLOAD_SALT = "sga.backend.uploads.LocalDirectUploadStorage"
+
+
+def direct_uploads_enabled():
+    """
+    Returns whether student documents are uploaded directly to the storage (settings.DIRECT_UPLOADS_ENABLED, if the
+    storage supports it)
+    """
+    return settings.DIRECT_UPLOADS_ENABLED and hasattr(default_storage, "get_presigned_post")
+
+
+def get_direct_upload(submission, filename):
+    """
+    Returns the presigned POST (a dict with its url and form fields) for uploading a student's document with a
+    filename to the storage path of the submission's document. Raises ValidationError if the file type isn't
+    supported.
+    """
+    validate_file_extension(ContentFile(b"", name=filename))
+    return default_storage.get_presigned_post(
+        student_submission_file_path(submission, filename),
+        settings.MAX_FILE_SIZE_MB * 1024 * 1024,
+        settings.DIRECT_UPLOAD_EXPIRES_SECONDS
+    )
+
+
+def confirm_direct_upload(submission, filename):
+    """
+    Returns the storage path of a student's document uploaded directly to the storage with a filename, after
+    validating the stored file like an uploaded one. Raises ValidationError (deleting the stored file if it is
+    invalid) if it wasn't uploaded or is invalid.
+    """
+    field = submission._meta.get_field("student_document")
+    document = FieldFile(submission, field, student_submission_file_path(submission, filename))
+    if not document.storage.exists(document.name):
+        raise ValidationError("The file was not uploaded. Please try again.")
+    try:
+        for validator in field.validators:
+            validator(document)
+    except ValidationError:
+        document.storage.delete(document.name)
+        raise
+    finally:
+        document.close()
+    return document.name
+
+
+class LocalDirectUploadStorage(FileSystemStorage):
+    """
+    File system storage that supports direct uploads, as a local stand-in for the storage bucket: presigned POSTs
+    are signed policies that the local_direct_upload view accepts
+    """
+    @staticmethod
+    def get_presigned_post(name, max_size, expires_in):
+        """
+        Returns the url and form fields of a POST that uploads a file of at most max_size bytes to name
+        """
+        policy = signing.dumps(
+            {"key": name, "max_size": max_size, "expires": time.time() + expires_in},
+            salt=LOCAL_UPLOAD_SALT
+        )
+        return {"url": reverse("local_direct_upload"), "fields": {"key": name, "policy": policy}}
+
+    def receive_upload(self, request):
+        """
+        Saves the file of a presigned POST and returns the response (204 like S3, or an error)
+        """
+        try:
+            policy = signing.loads(request.POST.get("policy", ""), salt=LOCAL_UPLOAD_SALT)
+        except signing.BadSignature:
+            return HttpResponseForbidden("Invalid policy")
+        if policy["expires"] < time.time() or request.POST.get("key") != policy["key"]:
+            return HttpResponseForbidden("Expired policy or wrong key")
+        uploaded_file = request.FILES.get("file")
+        if uploaded_file is None or uploaded_file.size > policy["max_size"]:
+            return HttpResponseBadRequest("Missing file or file too large")
+        # Uploads replace the stored file, like in a bucket
+        self.delete(policy["key"])
+        self._save(policy["key"], uploaded_file)
+        return HttpResponse(status=204)
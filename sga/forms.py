@@ -3,8 +3,10 @@ Django form definitions
 """
 
 from django import forms
+from django.core.exceptions import ValidationError
 from django.db.models import Count, F
 
+from sga.backend.uploads import confirm_direct_upload
 from sga.models import Submission, Grader, Student
 
 
@@ -24,6 +26,44 @@ class StudentAssignmentSubmissionForm(forms.ModelForm):
         }
 
 
+class StudentDirectUploadSubmissionForm(forms.ModelForm):
+    """
+    Form for student submissions whose document was uploaded directly to the storage (see sga.backend.uploads).
+    The file field only picks the file to upload: the browser sends the file's name instead of the file.
+    """
+    student_document = forms.FileField(label="File Submission", required=False)
+    filename = forms.CharField(widget=forms.HiddenInput)
+    field_order = ["student_document", "description"]
+
+    def clean(self):
+        """
+        Confirms that the document was uploaded and is valid, replacing the filename with its storage path
+        """
+        cleaned_data = super().clean()
+        if "filename" in cleaned_data:
+            try:
+                cleaned_data["filename"] = confirm_direct_upload(self.instance, cleaned_data["filename"])
+            except ValidationError as error:
+                self.add_error("student_document", error)
+        return cleaned_data
+
+    def save(self, commit=True):
+        """
+        Save the submission with the uploaded document
+        """
+        self.instance.student_document.name = self.cleaned_data["filename"]
+        return super().save(commit=commit)
+
+    class Meta:
+        model = Submission
+        fields = [
+            "description"
+        ]
+        labels = {
+            "description": "File Description"
+        }
+
+
 class GraderAssignmentSubmissionForm(forms.ModelForm):
     """
     Form for grader submissions
@@ -0,0 +1,114 @@
+"""
+LTI launch data and a stub LTI outcome service, shared by the benchmark management commands and the tests
+"""
+import re
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+from xml.sax.saxutils import unescape
+
+DEFAULT_USER_USERNAME = "test_user_id"
+DEFAULT_ASSIGNMENT_EDX_ID = "test_assignment"
+DEFAULT_TEST_COURSE_ID = "test_course"
+DEFAULT_LIS_OUTCOME_SERVICE_URL = "lis_outcome_service_url"
+
+DEFAULT_LTI_PARAMS = {
+    "context_id": DEFAULT_TEST_COURSE_ID,
+    "resource_link_id": DEFAULT_ASSIGNMENT_EDX_ID,
+    "user_id": DEFAULT_USER_USERNAME,
+    "lis_outcome_service_url": DEFAULT_LIS_OUTCOME_SERVICE_URL
+}
+
+OUTCOME_RESPONSE_XML = (
+    "<?xml version='1.0' encoding='utf-8'?>"
+    "<imsx_POXEnvelopeResponse xmlns='http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0'>"
+    "<imsx_POXHeader><imsx_POXResponseHeaderInfo><imsx_version>V1.0</imsx_version>"
+    "<imsx_statusInfo><imsx_codeMajor>{code_major}</imsx_codeMajor><imsx_severity>status</imsx_severity>"
+    "</imsx_statusInfo></imsx_POXResponseHeaderInfo></imsx_POXHeader>"
+    "<imsx_POXBody>{body}</imsx_POXBody></imsx_POXEnvelopeResponse>"
+)
+READ_RESULT_RESPONSE_XML = (
+    "<readResultResponse><result><resultScore><language>en</language><textString>{score}</textString>"
+    "</resultScore></result></readResultResponse>"
+)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server handling each request in a thread
+    """
+    daemon_threads = True
+
+
+class StubOutcomeService(object):
+    """
+    Local LTI outcome service for benchmarking and testing grade passback. Records the requests it receives and
+    the grades in self.grades (by result id), and responds to them with success (or failure if self.fail is
+    set). Use as a context manager to run the server.
+    """
+    def __init__(self):
+        self.requests = []
+        self.grades = {}
+        self.fail = False
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+            Handler for outcome service requests
+            """
+            protocol_version = "HTTP/1.1"  # Keep connections alive
+            # The headers and body are written separately, which Nagle's algorithm would delay
+            disable_nagle_algorithm = True
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """
+                Records the request and responds with the outcome service XML
+                """
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf8")
+                service.requests.append({
+                    "path": self.path,
+                    "headers": self.headers,
+                    "body": body,
+                    "client_address": self.client_address
+                })
+                content = OUTCOME_RESPONSE_XML.format(
+                    code_major="failure" if service.fail else "success",
+                    body="" if service.fail else service.respond(body)
+                )
+                self.send_response(200)
+                self.send_header("Content-Type", "application/xml")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content.encode("utf8"))
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """
+                Silences request logging
+                """
+
+        self.server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{port}/outcome".format(port=self.server.server_port)
+
+    def respond(self, body):
+        """
+        Updates self.grades for a request, and returns the body of the response
+        """
+        match = re.search(r"<(\w+)Request>.*<sourcedId>(.*)</sourcedId>", body)
+        if match is None:
+            return ""
+        operation, result_id = match.group(1), unescape(match.group(2))
+        if operation == "replaceResult":
+            self.grades[result_id] = float(re.search(r"<textString>(.*)</textString>", body).group(1))
+        elif operation == "deleteResult":
+            self.grades.pop(result_id, None)
+        elif operation == "readResult":
+            return READ_RESULT_RESPONSE_XML.format(score=self.grades.get(result_id, ""))
+        return "<{operation}Response />".format(operation=operation)
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,32 @@
+"""
+Contains a management command for creating missing Submission objects in bulk
+"""
+from django.core.management import BaseCommand
+
+from sga.models import Assignment
+
+
+class BackfillSubmissionsCommand(BaseCommand):
+    """
+    Management command for creating missing Submission objects in bulk
+    """
+    help = "Creates a Submission for every Student and Assignment pair that doesn't have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", dest="course", help="Only backfill assignments in this course (edX id)")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        """
+        Function for creating missing Submission objects
+        """
+        assignments = Assignment.objects.all()
+        if options.get("course"):
+            assignments = assignments.filter(course__edx_id=options["course"])
+        total = 0
+        for assignment in assignments:
+            total += assignment.create_missing_submissions(batch_size=options.get("batch_size") or 500)
+        self.stdout.write(self.style.SUCCESS("Created {total} submissions.".format(total=total)))
+
+
+Command = BackfillSubmissionsCommand
@@ -0,0 +1,94 @@
+"""
+Contains a management command for benchmarking grade passback to an LTI outcome service
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import oauth2
+from django.core.management import BaseCommand
+from django.test import override_settings
+
+from sga.backend.send_grades import OutcomeClient, generate_request_xml
+from sga.management.benchmarks import StubOutcomeService
+
+CONSUMER_KEY = "benchmark_key"
+
+
+class BenchmarkGradePassbackCommand(BaseCommand):
+    """
+    Management command for benchmarking grade passback to an LTI outcome service
+    """
+    help = (
+        "Compares per-grade latency of posting grades with a new oauth2 client per grade (the previous behavior) "
+        "and with the pooled outcome client, against a local stub outcome service"
+    )
+    modes = ["oauth2", "pooled"]
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grades", dest="grades", type=int, default=500, help="Number of grades to send")
+        parser.add_argument(
+            "--concurrency",
+            dest="concurrency",
+            type=int,
+            default=1,
+            help="Number of threads sending grades"
+        )
+        parser.add_argument(
+            "--mode",
+            dest="modes",
+            action="append",
+            choices=self.modes,
+            help="Client to benchmark (can be repeated; defaults to all clients)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking grade passback
+        """
+        grades = options.get("grades", 500)
+        concurrency = max(options.get("concurrency", 1), 1)
+        self.stdout.write("{grades} grades, {concurrency} threads".format(grades=grades, concurrency=concurrency))
+        with override_settings(LTI_OAUTH_CREDENTIALS={CONSUMER_KEY: "benchmark_secret"}):
+            for mode in options.get("modes") or self.modes:
+                with StubOutcomeService() as service:
+                    send = self.get_sender(mode, service.url)
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                        latencies = sorted(executor.map(send, range(grades)))
+                    wall_time = time.perf_counter() - start
+                    connections = len({request["client_address"] for request in service.requests})
+                self.stdout.write(
+                    "{mode:<8} {mean:8.2f} ms mean {p95:8.2f} ms p95 {throughput:8.1f} grades/s "
+                    "{connections} connections".format(
+                        mode=mode,
+                        mean=sum(latencies) / max(len(latencies), 1) * 1000,
+                        p95=latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+                        throughput=grades / max(wall_time, 1e-9),
+                        connections=connections
+                    )
+                )
+
+    @staticmethod
+    def get_sender(mode, url):
+        """
+        Returns a function that sends the grade with an index to url and returns how long it took
+        """
+        client = OutcomeClient() if mode == "pooled" else None
+
+        def send(index):
+            """ Sends a grade and returns the latency """
+            body = generate_request_xml(str(uuid.uuid1()), "replaceResult", "result_{}".format(index), 0.5)
+            start = time.perf_counter()
+            if client is None:
+                oauth2.Client(oauth2.Consumer(key=CONSUMER_KEY, secret="benchmark_secret")).request(
+                    url, "POST", body=body.encode("utf8"), headers={"Content-Type": "application/xml"}
+                )
+            else:
+                client.post(CONSUMER_KEY, url, body)
+            return time.perf_counter() - start
+
+        return send
+
+
+Command = BenchmarkGradePassbackCommand
@@ -0,0 +1,94 @@
+"""
+Contains a management command for benchmarking LTI outcome envelope generation and response parsing
+"""
+import time
+import uuid
+from xml.etree import ElementTree as etree
+
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.send_grades import OUTCOME_XMLNS, generate_request_xml, parse_response_xml
+from sga.management.benchmarks import OUTCOME_RESPONSE_XML
+
+
+def etree_request_xml(message_identifier_id, operation, lis_result_sourcedid, score):
+    """
+    Generates an outcome request envelope with ElementTree, like generate_request_xml() previously did
+    """
+    root = etree.Element("imsx_POXEnvelopeRequest", xmlns=OUTCOME_XMLNS)
+    header_info = etree.SubElement(etree.SubElement(root, "imsx_POXHeader"), "imsx_POXRequestHeaderInfo")
+    etree.SubElement(header_info, "imsx_version").text = "V1.0"
+    etree.SubElement(header_info, "imsx_messageIdentifier").text = message_identifier_id
+    body = etree.SubElement(root, "imsx_POXBody")
+    record = etree.SubElement(etree.SubElement(body, "%sRequest" % operation), "resultRecord")
+    etree.SubElement(etree.SubElement(record, "sourcedGUID"), "sourcedId").text = lis_result_sourcedid
+    if score is not None:
+        result_score = etree.SubElement(etree.SubElement(record, "result"), "resultScore")
+        etree.SubElement(result_score, "language").text = "en"
+        etree.SubElement(result_score, "textString").text = str(score)
+    return "<?xml version='1.0' encoding='utf-8'?>\n{}".format(etree.tostring(root, encoding="unicode"))
+
+
+def etree_response_code_major(content):
+    """
+    Returns the imsx_codeMajor of an outcome response parsed with ElementTree
+    """
+    return etree.fromstring(content.encode("utf8")).findtext(".//{%s}imsx_codeMajor" % OUTCOME_XMLNS)
+
+
+class BenchmarkOutcomeXMLCommand(BaseCommand):
+    """
+    Management command for benchmarking LTI outcome envelope generation and response parsing
+    """
+    help = "Compares generating outcome envelopes and parsing responses from templates with ElementTree"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", dest="count", type=int, default=20000, help="Envelopes per run")
+        parser.add_argument(
+            "--repeat",
+            dest="repeat",
+            type=int,
+            default=3,
+            help="Runs per benchmark (the best is kept)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking outcome envelopes
+        """
+        count = options.get("count", 20000)
+        repeat = max(options.get("repeat", 3), 1)
+        requests = [
+            (str(uuid.uuid1()), "replaceResult", "course-v1:MITx+1+2:result_{}".format(i), i / count)
+            for i in range(count)
+        ]
+        for request in requests[:100]:
+            if generate_request_xml(*request) != etree_request_xml(*request):
+                raise CommandError("Envelopes differ for {request}".format(request=request))
+        responses = [OUTCOME_RESPONSE_XML.format(code_major="success", body="<replaceResultResponse />")] * count
+        benchmarks = [
+            ("generate", "etree", lambda: [etree_request_xml(*request) for request in requests]),
+            ("generate", "template", lambda: [generate_request_xml(*request) for request in requests]),
+            ("parse", "etree", lambda: [etree_response_code_major(content) for content in responses]),
+            ("parse", "regex", lambda: [parse_response_xml(content).code_major for content in responses]),
+        ]
+        self.stdout.write("{count} envelopes".format(count=count))
+        for name, implementation, function in benchmarks:
+            seconds = min(self.run(function) for _ in range(repeat))
+            self.stdout.write("{name:<8} {implementation:<8} {per_envelope:8.2f} us/envelope".format(
+                name=name,
+                implementation=implementation,
+                per_envelope=seconds / max(count, 1) * 10 ** 6
+            ))
+
+    @staticmethod
+    def run(function):
+        """
+        Returns the CPU time function takes
+        """
+        start = time.process_time()
+        function()
+        return time.process_time() - start
+
+
+Command = BenchmarkOutcomeXMLCommand
@@ -0,0 +1,155 @@
+"""
+Contains a management command for benchmarking the overhead of session engines per request
+"""
+import time
+from importlib import import_module
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from sga.management.benchmarks import DEFAULT_LTI_PARAMS
+
+ENGINES = [
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+    "django.contrib.sessions.backends.signed_cookies",
+    "sga.backend.sessions",
+]
+
+
+class BenchmarkSessionsCommand(BaseCommand):
+    """
+    Management command for benchmarking the overhead of session engines per request
+    """
+    help = (
+        "Compares the time and database queries per request that session engines take to load the session and "
+        "check course_roles, and to save the session on LTI launches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", dest="requests", type=int, default=1000, help="Requests per engine")
+        parser.add_argument(
+            "--launch-every",
+            dest="launch_every",
+            type=int,
+            default=5,
+            help="Every this many requests is an LTI launch, which saves the session"
+        )
+        parser.add_argument(
+            "--change-every",
+            dest="change_every",
+            type=int,
+            default=3,
+            help=(
+                "Every this many launches is of another assignment, which changes the session's LTI parameters "
+                "and course_roles (0 for never)"
+            )
+        )
+        parser.add_argument(
+            "--rotate-every",
+            dest="rotate_every",
+            type=int,
+            default=10,
+            help="Every this many launches logs the user in, which gives the session a new key (0 for never)"
+        )
+        parser.add_argument(
+            "--engine",
+            dest="engines",
+            action="append",
+            choices=ENGINES,
+            help="Session engine to benchmark (can be repeated; defaults to all engines)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking session engines
+        """
+        options = dict(
+            options,
+            requests=options.get("requests", 1000),
+            launch_every=max(options.get("launch_every", 5), 1),
+            change_every=max(options.get("change_every", 3), 0),
+            rotate_every=max(options.get("rotate_every", 10), 0)
+        )
+        self.stdout.write(
+            "{requests} requests, a launch every {launch_every}, changed every {change_every} launches, "
+            "a login every {rotate_every} launches".format(**options)
+        )
+        for engine in options.get("engines") or ENGINES:
+            seconds, queries, writes = self.run(import_module(engine).SessionStore, options)
+            self.stdout.write(
+                "{engine:<48} {per_request:8.3f} ms/request {queries:6.2f} queries/request "
+                "{writes:6.2f} writes/request".format(
+                    engine=engine,
+                    per_request=seconds / max(options["requests"], 1) * 1000,
+                    queries=queries / max(options["requests"], 1),
+                    writes=writes / max(options["requests"], 1)
+                )
+            )
+
+    @staticmethod
+    def get_launch_data(assignment):
+        """
+        Returns the session data that an LTI launch of an assignment sets
+        """
+        return {
+            "LTI_LAUNCH": dict(
+                DEFAULT_LTI_PARAMS,
+                resource_link_id="{resource_link_id}-{assignment}".format(
+                    resource_link_id=DEFAULT_LTI_PARAMS["resource_link_id"],
+                    assignment=assignment
+                ),
+                lis_result_sourcedid="sourcedid-{assignment}".format(assignment=assignment),
+                roles=["Student"]
+            ),
+            "course_roles": {str(assignment): "student"},
+        }
+
+    @classmethod
+    def launch(cls, session, launch, options):
+        """
+        Simulates the nth LTI launch of a session: it sets the session data of an assignment (another one every
+        change_every launches), and every rotate_every launches the session key is cycled like auth.login does
+        """
+        change_every, rotate_every = options["change_every"], options["rotate_every"]
+        session.update(cls.get_launch_data(launch // change_every if change_every else 0))
+        if rotate_every and launch % rotate_every == 0:
+            # auth.login cycles the key of the session it logs the user into
+            session.cycle_key()
+        session.save()
+
+    @classmethod
+    def run(cls, session_store, options):
+        """
+        Simulates the command's requests with a session, with a launch every launch_every requests, and returns
+        (seconds, queries, writes)
+        """
+        session = session_store()
+        session.update({
+            "_auth_user_id": "1",
+            "_auth_user_backend": "django_auth_lti.backends.LTIAuthBackend",
+        })
+        session.update(cls.get_launch_data(0))
+        session.save()
+        session_key = session.session_key
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for request in range(options["requests"]):
+                session = session_store(session_key)
+                session.get("course_roles", {}).get("1")
+                if request % options["launch_every"] == 0:
+                    cls.launch(session, request // options["launch_every"] + 1, options)
+                    session_key = session.session_key
+            seconds = time.perf_counter() - start
+        # Transaction control (e.g. savepoints) isn't counted
+        statements = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith(("SELECT", "INSERT", "UPDATE", "DELETE"))
+        ]
+        writes = sum(1 for statement in statements if not statement.startswith("SELECT"))
+        session_store(session_key).delete()
+        return seconds, len(statements), writes
+
+
+Command = BenchmarkSessionsCommand
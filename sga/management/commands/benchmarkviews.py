@@ -0,0 +1,290 @@
+"""
+Contains a management command for benchmarking the query count, latency and memory of the staff views
+"""
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sga.backend.authentication import course_cache
+from sga.backend.constants import Roles
+from sga.backend.dashboards import get_dashboard_cache
+from sga.management.benchmarks import DEFAULT_LTI_PARAMS
+from sga.management.commands.createmockdata import CreateMockDataCommand, get_course_edx_id
+from sga.models import Course, Grader, Student, User
+
+# Datasets benchmarked by default, as (students, assignments) of one course
+DEFAULT_SIZES = ["10:2", "100:5", "500:10"]
+# Query string of a first page of a server-side list, as DataTables sends it
+LIST_DATA_PARAMS = {"draw": 1, "start": 0, "length": 25}
+
+# The staff views and the roles they are benchmarked as (see BenchmarkViewsCommand.get_url())
+VIEWS = [
+    ("staff_index", [Roles.admin, Roles.grader]),
+    ("view_student_list", [Roles.admin, Roles.grader]),
+    ("student_list_data", [Roles.admin, Roles.grader]),
+    ("view_grader_list", [Roles.admin]),
+    ("grader_list_data", [Roles.admin]),
+    ("view_assignment_list", [Roles.admin, Roles.grader]),
+    ("assignment_list_data", [Roles.admin, Roles.grader]),
+    ("view_assignment", [Roles.admin, Roles.grader]),
+    ("submission_list_data", [Roles.admin, Roles.grader]),
+    ("view_student", [Roles.admin, Roles.grader]),
+    ("view_grader", [Roles.admin, Roles.grader]),
+    ("view_submission_as_staff", [Roles.admin, Roles.grader]),
+    ("download_all_submissions", [Roles.admin, Roles.grader]),
+    ("download_not_graded_submissions", [Roles.admin, Roles.grader]),
+]
+# The most database queries a cold request (empty caches) of each view may take as any role, whatever the dataset
+# size. Raise a budget only for a query that doesn't depend on the number of rows.
+QUERY_BUDGETS = {
+    "staff_index": 3,
+    "view_student_list": 3,
+    "student_list_data": 6,
+    "view_grader_list": 3,
+    "grader_list_data": 3,
+    "view_assignment_list": 3,
+    "assignment_list_data": 10,
+    "view_assignment": 8,
+    "submission_list_data": 7,
+    "view_student": 10,
+    "view_grader": 8,
+    "view_submission_as_staff": 11,
+    "download_all_submissions": 9,
+    "download_not_graded_submissions": 9,
+}
+
+
+def parse_size(size):
+    """
+    Returns the (students, assignments) of a size like "100:5"
+    """
+    try:
+        students, assignments = (int(value) for value in size.split(":"))
+    except ValueError:
+        raise CommandError("Invalid size {size} (expected students:assignments)".format(size=size))
+    if students < 1 or assignments < 1:
+        raise CommandError("Invalid size {size} (needs a student and an assignment)".format(size=size))
+    return students, assignments
+
+
+def count_statements(captured_queries):
+    """
+    Returns the number of captured queries that read or write data (transaction control like savepoints
+    isn't counted)
+    """
+    return sum(
+        1 for query in captured_queries if query["sql"].startswith(("SELECT", "INSERT", "UPDATE", "DELETE"))
+    )
+
+
+def clear_caches():
+    """
+    Clears the process and dashboard caches, so that a request is measured as if it were the first one
+    """
+    course_cache.clear()
+    get_dashboard_cache().clear()
+
+
+class BenchmarkViewsCommand(BaseCommand):
+    """
+    Management command for benchmarking the query count, latency and memory of the staff views
+    """
+    help = (
+        "Runs each staff view against generated datasets of increasing size and reports (as JSON) the database "
+        "queries, wall time and peak memory of a request with empty caches. Each dataset is created with "
+        "createmockdata in a transaction that is rolled back, on a database without createmockdata's course. "
+        "With --check, fails if a view takes more queries than its budget or more queries on a larger dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            dest="sizes",
+            action="append",
+            help="Dataset size as students:assignments (can be repeated; defaults to {sizes})".format(
+                sizes=", ".join(DEFAULT_SIZES)
+            )
+        )
+        parser.add_argument("--repeat", dest="repeat", type=int, default=3, help="Timed requests per view")
+        parser.add_argument("--output", dest="output", help="Write the JSON results to this file")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            dest="check",
+            default=False,
+            help="Fail if a view exceeds its query budget or its query count grows with the dataset size"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking the staff views
+        """
+        sizes = [parse_size(size) for size in options.get("sizes") or DEFAULT_SIZES]
+        if Course.objects.filter(edx_id=get_course_edx_id(1)).exists():
+            raise CommandError("Course {edx_id} already exists".format(edx_id=get_course_edx_id(1)))
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"],
+                DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+                MEDIA_ROOT=media_root
+            ):
+                results = []
+                for students, assignments in sizes:
+                    results.extend(self.run(students, assignments, max(options.get("repeat", 3), 1)))
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        report = json.dumps({"budgets": QUERY_BUDGETS, "results": results}, indent=2, sort_keys=True)
+        if options.get("output"):
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+        if options.get("check"):
+            self.check_results(results)
+
+    def run(self, students, assignments, repeat):
+        """
+        Creates a dataset with the given number of students and assignments, benchmarks every view against it and
+        rolls it back. Returns a result (dict) for each view and role.
+        """
+        results = []
+        with transaction.atomic():
+            CreateMockDataCommand().execute(
+                students=students,
+                graders=max(students // 20, 1),
+                assignments=assignments,
+                documents=True,
+                stdout=StringIO()
+            )
+            course = Course.objects.get(edx_id=get_course_edx_id(1))
+            grader = Grader.objects.filter(course=course).order_by("id").first()
+            clients = {
+                Roles.admin: self.get_client(User.objects.get(username="_admin_user"), course, Roles.admin),
+                Roles.grader: self.get_client(grader.user, course, Roles.grader),
+            }
+            for name, roles in VIEWS:
+                url, params = self.get_url(name, course, grader)
+                for role in roles:
+                    result = self.measure(clients[role], url, params, repeat)
+                    result.update(
+                        view=name,
+                        role=role,
+                        students=students,
+                        assignments=assignments,
+                        submissions=students * assignments
+                    )
+                    results.append(result)
+            transaction.set_rollback(True)
+        clear_caches()
+        return results
+
+    @staticmethod
+    def get_client(user, course, role):
+        """
+        Returns a test client logged in to the course with a role, as SGAMiddleware leaves the session after an
+        LTI launch
+        """
+        client = Client()
+        client.force_login(user)
+        session = client.session
+        session["LTI_LAUNCH"] = DEFAULT_LTI_PARAMS
+        session["course_roles"] = {str(course.id): role}
+        session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return client
+
+    @staticmethod
+    def get_url(name, course, grader):
+        """
+        Returns the (url, query parameters) of a view for the first assignment of a course, a grader and the
+        grader's first student
+        """
+        assignment = course.assignments.order_by("id").first()
+        student = Student.objects.filter(grader=grader).order_by("id").first()
+        kwargs = {"course_id": course.id}
+        if name in ("view_assignment", "submission_list_data", "view_submission_as_staff") or \
+                name.startswith("download_"):
+            kwargs["assignment_id"] = assignment.id
+        if name in ("view_student", "view_submission_as_staff"):
+            kwargs["student_user_id"] = student.user_id
+        if name == "view_grader":
+            kwargs["grader_user_id"] = grader.user_id
+        return reverse(name, kwargs=kwargs), LIST_DATA_PARAMS if name.endswith("_data") else {}
+
+    @staticmethod
+    def measure(client, url, params, repeat):
+        """
+        Requests url with empty caches, once counting queries and peak memory and then repeat times for the wall
+        time. Returns a result (dict).
+        """
+        def request():
+            """ Requests the url and reads the whole response """
+            clear_caches()
+            response = client.get(url, params, secure=True)
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+            return response.status_code, len(content)
+
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                status, size = request()
+            # Captured queries are read from the query log, which the next request clears
+            query_count = count_statements(queries.captured_queries)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            request()
+            times.append(time.perf_counter() - start)
+        return {
+            "status": status,
+            "response_bytes": size,
+            "queries": query_count,
+            "time_ms": round(statistics.median(times) * 1000, 2),
+            "peak_memory_kb": round(peak_memory / 1024, 1),
+        }
+
+    @staticmethod
+    def check_results(results):
+        """
+        Raises a CommandError if a view failed, took more queries than its budget, or took more queries on a
+        larger dataset
+        """
+        errors = []
+        queries = {}
+        for result in results:
+            key = "{view} ({role})".format(view=result["view"], role=result["role"])
+            if result["status"] != 200:
+                errors.append("{key} returned {status}".format(key=key, status=result["status"]))
+            if result["queries"] > QUERY_BUDGETS[result["view"]]:
+                errors.append("{key} took {queries} queries (budget {budget})".format(
+                    key=key,
+                    queries=result["queries"],
+                    budget=QUERY_BUDGETS[result["view"]]
+                ))
+            queries.setdefault(key, []).append(result["queries"])
+        for key, counts in sorted(queries.items()):
+            if len(set(counts)) > 1:
+                errors.append("{key} took {counts} queries as the dataset grew".format(
+                    key=key,
+                    counts=", ".join(str(count) for count in counts)
+                ))
+        if errors:
+            raise CommandError("\n".join(errors))
+
+
+Command = BenchmarkViewsCommand
@@ -0,0 +1,107 @@
+"""
+Contains a management command for benchmarking the compression modes of bulk submission downloads
+"""
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand
+from django.test import override_settings
+
+from sga.backend.constants import ZipCompression
+from sga.backend.files import submissions_zip_generator
+
+WORDS = ["assignment", "submission", "grader", "student", "course", "feedback", "lorem", "ipsum", "dolor", "sit"]
+
+
+class BenchmarkZipCompressionCommand(BaseCommand):
+    """
+    Management command for benchmarking the compression modes of bulk submission downloads
+    """
+    help = "Compares throughput, CPU time and archive size of the zip compression modes on synthetic submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", dest="files", type=int, default=50, help="Number of submissions")
+        parser.add_argument("--file-size", dest="file_size", type=int, default=1024, help="File size in KB")
+        parser.add_argument(
+            "--kind",
+            dest="kind",
+            choices=["pdf", "text", "mixed"],
+            default="mixed",
+            help="pdf for incompressible .pdf files, text for compressible .txt files, mixed for both"
+        )
+        parser.add_argument(
+            "--mode",
+            dest="modes",
+            action="append",
+            choices=ZipCompression.modes,
+            help="Compression mode to benchmark (can be repeated; defaults to all modes)"
+        )
+        parser.add_argument("--repeat", dest="repeat", type=int, default=3, help="Runs per mode (the best is kept)")
+        parser.add_argument(
+            "--sample-size",
+            dest="sample_size",
+            type=int,
+            default=settings.ZIP_COMPRESSIBILITY_SAMPLE_SIZE,
+            help="Bytes sampled for compressibility in auto mode (0 to disable)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking the compression modes
+        """
+        documents = self.generate_documents(
+            options.get("files", 50),
+            options.get("file_size", 1024) * 1024,
+            options.get("kind", "mixed")
+        )
+        total_size = sum(len(content) for _, content in documents)
+        self.stdout.write("{files} files, {size:.1f} MB".format(files=len(documents), size=total_size / 1024 ** 2))
+        sample_size = options.get("sample_size", settings.ZIP_COMPRESSIBILITY_SAMPLE_SIZE)
+        with override_settings(ZIP_COMPRESSIBILITY_SAMPLE_SIZE=sample_size):
+            for mode in options.get("modes") or ZipCompression.modes:
+                results = [self.run(documents, mode) for _ in range(max(options.get("repeat", 3), 1))]
+                wall_time, cpu_time, archive_size = min(results)
+                self.stdout.write(
+                    "{mode:<8} {throughput:8.1f} MB/s {wall_time:8.3f}s wall {cpu_time:8.3f}s CPU "
+                    "{ratio:7.1%} size".format(
+                        mode=mode,
+                        throughput=total_size / 1024 ** 2 / max(wall_time, 1e-9),
+                        wall_time=wall_time,
+                        cpu_time=cpu_time,
+                        ratio=archive_size / max(total_size, 1)
+                    )
+                )
+
+    @staticmethod
+    def generate_documents(count, size, kind):
+        """
+        Returns a list of (filename, content) pairs. PDFs are random bytes, like the compressed streams
+        that make up most of a PDF; text files are random words.
+        """
+        documents = []
+        for i in range(count):
+            if kind == "pdf" or (kind == "mixed" and i % 2 == 0):
+                documents.append(("submission{}.pdf".format(i), os.urandom(size)))
+            else:
+                text = " ".join(random.choice(WORDS) for _ in range(size // 5))
+                documents.append(("submission{}.txt".format(i), text.encode("utf8")[:size]))
+        return documents
+
+    @staticmethod
+    def run(documents, mode):
+        """
+        Streams a zip file of the documents and returns (wall time, CPU time, archive size)
+        """
+        submissions = [
+            SimpleNamespace(student_document=ContentFile(content, name=filename)) for filename, content in documents
+        ]
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        archive_size = sum(len(chunk) for chunk in submissions_zip_generator(submissions, compression=mode))
+        return time.perf_counter() - start_wall, time.process_time() - start_cpu, archive_size
+
+
+Command = BenchmarkZipCompressionCommand
@@ -0,0 +1,48 @@
+"""
+Contains a management command for building cached submission archives in the background
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from sga.backend.archives import build_pending_archives
+
+
+class BuildSubmissionArchivesCommand(BaseCommand):
+    """
+    Management command for building cached submission archives in the background
+    """
+    help = "Builds the queued zip files of submissions for download, polling for new ones unless --once is given"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            dest="once",
+            default=False,
+            help="Build the queued archives and exit"
+        )
+        parser.add_argument(
+            "--interval",
+            dest="interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls for queued archives"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for building cached submission archives
+        """
+        while True:
+            close_old_connections()
+            built = build_pending_archives()
+            if built:
+                self.stdout.write("Built {built} submission archives.".format(built=built))
+            if options.get("once"):
+                break
+            time.sleep(options.get("interval", 5))
+
+
+Command = BuildSubmissionArchivesCommand
@@ -1,90 +1,301 @@
 """
 Contains a management command for creating mock data
 """
+import math
+import random
+import time
 from datetime import datetime
-from django.core.management import BaseCommand
 
-from sga.models import Course, Assignment, Grader, Student, User
+import pytz
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from sga.backend.dashboards import invalidate_course_dashboards
+from sga.backend.files import grader_submission_file_path, student_submission_file_path
+from sga.models import Course, Assignment, Grader, Student, Submission, SubmissionCounter, User
+
+MOCK_DOCUMENT = b"%PDF-1.4\n% Mock submission document\n"
+# Values per "IN" lookup of existing objects (SQLite allows 999 query parameters by default)
+LOOKUP_BATCH_SIZE = 500
+
+
+def get_course_edx_id(number):
+    """
+    Returns the edX id of the mock course with the given number
+    """
+    return "course-v1:MITx+B{number}+2015_T3".format(number=100 + number)
+
+
+def is_local_storage():
+    """
+    Returns whether the default storage keeps files on the local filesystem
+    """
+    try:
+        default_storage.path("")
+    except NotImplementedError:
+        return False
+    return True
+
+
+def get_existing(queryset, field, values, value_field):
+    """
+    Returns {value of field: value of value_field} for the objects of queryset whose field is in values, querying
+    in batches so that the number of query parameters stays under the database's limit
+    """
+    values = list(values)
+    existing = {}
+    for index in range(0, len(values), LOOKUP_BATCH_SIZE):
+        batch = queryset.filter(**{"{field}__in".format(field=field): values[index:index + LOOKUP_BATCH_SIZE]})
+        existing.update(batch.values_list(field, value_field))
+    return existing
+
+
+def get_nth(items, number):
+    """
+    Returns the item at position number of items taken in turn (items repeat), or None if there are no items
+    """
+    return items[number % len(items)] if items else None
 
 
 class CreateMockDataCommand(BaseCommand):
     """
     Management command for creating mock data
     """
-    help = "Creates mock data (Course, Users, Students, Graders, Administrator, Assignments"
+    help = (
+        "Creates mock data (Courses, Users, Students, Graders, Administrator, Assignments and Submissions) in bulk. "
+        "Objects that already exist (e.g. from a previous run) are reused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", dest="courses", type=int, default=1, help="Number of courses")
+        parser.add_argument("--students", dest="students", type=int, default=4, help="Students per course")
+        parser.add_argument("--graders", dest="graders", type=int, default=2, help="Graders per course")
+        parser.add_argument("--assignments", dest="assignments", type=int, default=2, help="Assignments per course")
+        parser.add_argument(
+            "--submitted-ratio",
+            dest="submitted_ratio",
+            type=float,
+            default=0.5,
+            help="Fraction of submissions (one per student and assignment) that are submitted"
+        )
+        parser.add_argument(
+            "--graded-ratio",
+            dest="graded_ratio",
+            type=float,
+            default=0.5,
+            help="Fraction of submitted submissions that are graded"
+        )
+        parser.add_argument(
+            "--documents",
+            action="store_true",
+            dest="documents",
+            default=False,
+            help="Attach a small dummy document to submitted and graded submissions (needs a local file storage)"
+        )
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000, help="Objects per INSERT")
+        parser.add_argument("--seed", dest="seed", type=int, default=0, help="Seed for submission states and grades")
 
     def handle(self, *args, **options):
         """
         Function for creating mock data
         """
-        admin_user, _ = User.objects.get_or_create(
-            username="_admin_user"
-        )
-        course, _ = Course.objects.get_or_create(
-            edx_id="course-v1:MITx+B101+2015_T3"
-        )
-        course.administrators.add(admin_user)
-        grader_user_1, _ = User.objects.get_or_create(
-            username="_grader1"
-        )
-        grader_user_2, _ = User.objects.get_or_create(
-            username="_grader2"
-        )
-        grader_1, _ = Grader.objects.get_or_create(
-            max_students=3,
-            user=grader_user_1,
-            course=course
-        )
-        grader_2, _ = Grader.objects.get_or_create(
-            max_students=1,
-            user=grader_user_2,
-            course=course
-        )
-        student_user_1, _ = User.objects.get_or_create(
-            username="_student1",
-            email="_student1@test"
-        )
-        student_user_2, _ = User.objects.get_or_create(
-            username="_student2",
-            email="_student2@test"
-        )
-        student_user_3, _ = User.objects.get_or_create(
-            username="_student3",
-            email="_student3@test"
-        )
-        student_user_4, _ = User.objects.get_or_create(
-            username="_student4",
-            email="_student4@test"
+        for ratio in ("submitted_ratio", "graded_ratio"):
+            if not 0 <= options.get(ratio, 0.5) <= 1:
+                raise CommandError("--{option} must be between 0 and 1".format(option=ratio.replace("_", "-")))
+        if options.get("documents") and not is_local_storage():
+            raise CommandError("--documents needs a local file storage (DEFAULT_FILE_STORAGE)")
+        self.batch_size = max(options.get("batch_size", 1000), 1)  # pylint: disable=attribute-defined-outside-init
+        start = time.perf_counter()
+        with transaction.atomic():
+            courses = self.create_courses(options.get("courses", 1))
+            graders = self.create_graders(courses, options.get("graders", 2), options.get("students", 4))
+            students = self.create_students(courses, graders, options.get("students", 4))
+            assignments = self.create_assignments(courses, options.get("assignments", 2))
+            created = self.create_submissions(assignments, students, options)
+            # bulk_create() bypasses Submission.save(), which keeps the counters up to date
+            for course in courses:
+                SubmissionCounter.objects.rebuild(course=course)
+                invalidate_course_dashboards(course.id)
+        self.stdout.write(
+            "{courses} courses, {students} students, {graders} graders, {assignments} assignments, "
+            "{created} new submissions in {seconds:.1f}s".format(
+                courses=len(courses),
+                students=len(students),
+                graders=len(graders),
+                assignments=len(assignments),
+                created=created,
+                seconds=time.perf_counter() - start
+            )
         )
-        Student.objects.get_or_create(
-            user=student_user_1,
-            course=course,
-            grader=grader_1
-        )
-        Student.objects.get_or_create(
-            user=student_user_2,
-            course=course,
-            grader=grader_1
-        )
-        Student.objects.get_or_create(
-            user=student_user_3,
-            course=course,
-            grader=grader_2
-        )
-        Student.objects.get_or_create(
-            user=student_user_4,
-            course=course
+        self.stdout.write(self.style.SUCCESS("Successfully created mock data."))
+
+    def bulk_create(self, model, objs):
+        """
+        Inserts objs in batches of at most --batch-size objects, and no more than the database allows per INSERT
+        (bulk_create() ignores the database's limit when given a batch size)
+        """
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        batch_size = min(self.batch_size, max(connection.ops.bulk_batch_size(fields, objs), 1))
+        model.objects.bulk_create(objs, batch_size=batch_size)
+
+    def create_users(self, usernames, with_email=False):
+        """
+        Creates the users with usernames that don't exist yet and returns {username: id} for every username
+        """
+        existing = get_existing(User.objects.all(), "username", usernames, "id")
+        self.bulk_create(
+            User,
+            [
+                User(username=username, email="{username}@test".format(username=username) if with_email else "")
+                for username in usernames if username not in existing
+            ]
         )
-        Assignment.objects.get_or_create(
-            edx_id="_assignment1id",
-            name="_Assignment 1 Name",
-            due_date=datetime.utcnow(),
-            course=course
+        return get_existing(User.objects.all(), "username", usernames, "id")
+
+    def create_courses(self, count):
+        """
+        Creates the mock courses with their administrator and returns them
+        """
+        admin_user, _ = User.objects.get_or_create(username="_admin_user")
+        edx_ids = [get_course_edx_id(number) for number in range(1, count + 1)]
+        existing = set(Course.objects.filter(edx_id__in=edx_ids).values_list("edx_id", flat=True))
+        self.bulk_create(Course, [Course(edx_id=edx_id) for edx_id in edx_ids if edx_id not in existing])
+        courses = list(Course.objects.filter(edx_id__in=edx_ids).order_by("edx_id"))
+        for course in courses:
+            course.administrators.add(admin_user)
+        return courses
+
+    def create_graders(self, courses, count, students):
+        """
+        Creates the graders of each course, with room for an equal share of its students. Returns a list of
+        (grader id, grader user id, course id).
+        """
+        max_students = math.ceil(students / count) if count else 0
+        usernames = {
+            "_grader{number}".format(number=index * count + number): course
+            for index, course in enumerate(courses) for number in range(1, count + 1)
+        }
+        user_ids = self.create_users(list(usernames))
+        existing = set(Grader.objects.filter(course__in=courses).values_list("user_id", "course_id"))
+        self.bulk_create(
+            Grader,
+            [
+                Grader(user_id=user_ids[username], course=course, max_students=max_students)
+                for username, course in usernames.items() if (user_ids[username], course.id) not in existing
+            ]
         )
-        Assignment.objects.get_or_create(
-            edx_id="_assignment2id",
-            name="_Assignment 2 Name",
-            due_date=datetime.utcnow(),
-            course=course
+        return list(Grader.objects.filter(course__in=courses).order_by("id").values_list("id", "user_id", "course_id"))
+
+    def create_students(self, courses, graders, count):
+        """
+        Creates the students of each course, assigned to its graders in turn. Returns a list of
+        (user id, username, course id, grader user id).
+        """
+        usernames = {
+            "_student{number}".format(number=index * count + number): (course, number)
+            for index, course in enumerate(courses) for number in range(1, count + 1)
+        }
+        user_ids = self.create_users(list(usernames), with_email=True)
+        existing = set(Student.objects.filter(course__in=courses).values_list("user_id", "course_id"))
+        graders_by_course = {}
+        for grader_id, _, course_id in graders:
+            graders_by_course.setdefault(course_id, []).append(grader_id)
+        self.bulk_create(Student, [
+            Student(
+                user_id=user_ids[username],
+                course=course,
+                grader_id=get_nth(graders_by_course.get(course.id), number)
+            )
+            for username, (course, number) in usernames.items() if (user_ids[username], course.id) not in existing
+        ])
+        grader_user_ids = {grader_id: user_id for grader_id, user_id, _ in graders}
+        return [
+            (user_id, username, course_id, grader_user_ids.get(grader_id))
+            for user_id, username, course_id, grader_id in Student.objects.filter(
+                course__in=courses,
+                deleted=False
+            ).order_by("id").values_list("user_id", "user__username", "course_id", "grader_id")
+        ]
+
+    def create_assignments(self, courses, count):
+        """
+        Creates the assignments of each course and returns them
+        """
+        edx_ids = {
+            "_assignment{number}id".format(number=index * count + number): (course, index * count + number)
+            for index, course in enumerate(courses) for number in range(1, count + 1)
+        }
+        existing = set(Assignment.objects.filter(edx_id__in=edx_ids).values_list("edx_id", flat=True))
+        self.bulk_create(
+            Assignment,
+            [
+                Assignment(
+                    edx_id=edx_id,
+                    name="_Assignment {number} Name".format(number=number),
+                    due_date=datetime.utcnow().replace(tzinfo=pytz.UTC),
+                    course=course
+                )
+                for edx_id, (course, number) in edx_ids.items() if edx_id not in existing
+            ]
         )
-        self.stdout.write(self.style.SUCCESS("Successfully created mock data."))
+        return list(Assignment.objects.filter(edx_id__in=edx_ids).select_related("course").order_by("id"))
+
+    def create_submissions(self, assignments, students, options):
+        """
+        Creates a Submission for every student and assignment of a course that don't have one, submitted and graded
+        at random with the ratios in the command's options. Returns the number of Submissions created.
+        """
+        students_by_course = {}
+        for student in students:
+            students_by_course.setdefault(student[2], []).append(student)
+        rng = random.Random(options.get("seed", 0))
+        admin_user_id = User.objects.get(username="_admin_user").id
+        created = 0
+        for assignment in assignments:
+            existing = set(assignment.submissions.values_list("student_id", flat=True))
+            submissions = [
+                self.build_submission(assignment, student, rng, options, admin_user_id)
+                for student in students_by_course.get(assignment.course_id, []) if student[0] not in existing
+            ]
+            self.bulk_create(Submission, submissions)
+            created += len(submissions)
+        return created
+
+    @staticmethod
+    def build_submission(assignment, student, rng, options, admin_user_id):
+        """
+        Returns a new Submission of a student (a (user id, username, course id, grader user id) tuple) for an
+        assignment, submitted and graded at random with the ratios in the command's options
+        """
+        user_id, username, _, grader_user_id = student
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        submission = Submission(assignment=assignment, student_id=user_id)
+        if rng.random() >= options.get("submitted_ratio", 0.5):
+            return submission
+        submission.submitted = True
+        submission.submitted_at = now
+        submission.description = "Mock submission"
+        if options.get("documents", False):
+            submission.student = User(id=user_id, username=username)
+            submission.student_document.name = default_storage.save(
+                student_submission_file_path(submission, "submission.pdf"),
+                ContentFile(MOCK_DOCUMENT)
+            )
+        if rng.random() >= options.get("graded_ratio", 0.5):
+            return submission
+        submission.graded = True
+        submission.graded_at = now
+        submission.graded_by_id = grader_user_id or admin_user_id
+        submission.grade = rng.randint(0, 100)
+        submission.feedback = "Mock feedback"
+        if options.get("documents", False):
+            submission.grader_document.name = default_storage.save(
+                grader_submission_file_path(submission, "feedback.pdf"),
+                ContentFile(MOCK_DOCUMENT)
+            )
+        return submission
+
+
+Command = CreateMockDataCommand
@@ -0,0 +1,59 @@
+"""
+Contains a management command for rebuilding and verifying SubmissionCounter objects
+"""
+from django.core.management import BaseCommand, CommandError
+
+from sga.models import Course, SubmissionCounter
+
+
+class RebuildSubmissionCountersCommand(BaseCommand):
+    """
+    Management command for rebuilding and verifying SubmissionCounter objects
+    """
+    help = "Rebuilds the denormalized submission counters from Submissions, or verifies them with --verify"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", dest="course", help="Only rebuild/verify this course (edX id)")
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            dest="verify",
+            default=False,
+            help="Only compare the counters with Submissions and report differences"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for rebuilding or verifying SubmissionCounter objects
+        """
+        course = None
+        if options.get("course"):
+            try:
+                course = Course.objects.get(edx_id=options["course"])
+            except Course.DoesNotExist:
+                raise CommandError("Course {course} does not exist".format(course=options["course"]))
+        if not options.get("verify"):
+            SubmissionCounter.objects.rebuild(course=course)
+            self.stdout.write(self.style.SUCCESS("Successfully rebuilt submission counters."))
+            return
+        stored = SubmissionCounter.objects.get_counts(course=course)
+        computed = SubmissionCounter.objects.compute_counts(course=course)
+        mismatches = sorted(
+            (key for key in set(stored) | set(computed) if stored.get(key) != computed.get(key)),
+            key=str
+        )
+        for assignment_id, grader_id in mismatches:
+            self.stdout.write(
+                "Assignment {assignment_id}, grader {grader_id}: stored {stored}, expected {computed}".format(
+                    assignment_id=assignment_id,
+                    grader_id=grader_id,
+                    stored=stored.get((assignment_id, grader_id), (0, 0, 0)),
+                    computed=computed.get((assignment_id, grader_id), (0, 0, 0))
+                )
+            )
+        if mismatches:
+            raise CommandError("{count} submission counters are out of date.".format(count=len(mismatches)))
+        self.stdout.write(self.style.SUCCESS("Submission counters are up to date."))
+
+
+Command = RebuildSubmissionCountersCommand
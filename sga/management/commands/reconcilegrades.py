@@ -0,0 +1,155 @@
+"""
+Contains a management command for comparing the grades of a course with the grades edX holds
+"""
+import json
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.grade_passback import get_syncable_submissions, is_grade_drifted, reconcile_grades
+from sga.models import Assignment, Course, GradePassback
+
+COUNTS = ["checked", "matched", "drifted", "failed", "queued"]
+
+
+class ReconcileGradesCommand(BaseCommand):
+    """
+    Management command for comparing the grades of a course with the grades edX holds
+    """
+    help = (
+        "Reads every grade of a course (or an assignment) from edX with readResult, reports the grades that differ "
+        "from the local grades, and with --fix queues the local grades to be sent again"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course", help="Course to reconcile grades for (edX id)")
+        parser.add_argument(
+            "--assignment",
+            dest="assignment",
+            help="Only reconcile grades for this assignment (edX id)"
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            dest="fix",
+            default=False,
+            help="Queue the local grades that differ from edX to be sent by the sendgrades worker"
+        )
+        parser.add_argument(
+            "--concurrency",
+            dest="concurrency",
+            type=int,
+            help="Number of grades to read at once (defaults to settings.GRADE_PASSBACK_CONCURRENCY)"
+        )
+        parser.add_argument(
+            "--rate",
+            dest="rate",
+            type=float,
+            help="Maximum grades read per second (defaults to settings.GRADE_RECONCILE_RATE, 0 for no limit)"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            dest="checkpoint",
+            help="File recording progress, to resume from if the command is interrupted (deleted when it finishes)"
+        )
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000, help="Grades per checkpoint")
+
+    def handle(self, *args, **options):
+        """
+        Function for reconciling grades with edX
+        """
+        try:
+            course = Course.objects.get(edx_id=options["course"])
+        except Course.DoesNotExist:
+            raise CommandError("Course {course} does not exist".format(course=options["course"]))
+        assignment = None
+        if options.get("assignment"):
+            try:
+                assignment = Assignment.objects.get(course=course, edx_id=options["assignment"])
+            except Assignment.DoesNotExist:
+                raise CommandError("Assignment {assignment} does not exist".format(assignment=options["assignment"]))
+        checkpoint_path = options.get("checkpoint")
+        checkpoint = self.load_checkpoint(checkpoint_path, course, assignment)
+        if checkpoint["last_id"]:
+            self.stdout.write("Resuming after submission {last_id}.".format(last_id=checkpoint["last_id"]))
+        rate = options.get("rate")
+        batches = reconcile_grades(
+            get_syncable_submissions(course, assignment=assignment),
+            concurrency=options.get("concurrency"),
+            rate=settings.GRADE_RECONCILE_RATE if rate is None else rate,
+            after_id=checkpoint["last_id"],
+            batch_size=options.get("batch_size", 1000)
+        )
+        for batch in batches:
+            drifted = []
+            for submission, edx_grade, error in batch:
+                checkpoint["checked"] += 1
+                if error is not None:
+                    checkpoint["failed"] += 1
+                    self.write_result(submission, "failed ({error})".format(error=error))
+                elif is_grade_drifted(submission, edx_grade):
+                    drifted.append(submission)
+                    self.write_result(submission, "local {local}, edX {edx}".format(
+                        local=submission.edx_grade(),
+                        edx="none" if edx_grade is None else edx_grade
+                    ))
+                else:
+                    checkpoint["matched"] += 1
+            checkpoint["drifted"] += len(drifted)
+            if options.get("fix"):
+                checkpoint["queued"] += GradePassback.objects.enqueue_many(drifted)
+            checkpoint["last_id"] = batch[-1][0].id
+            self.save_checkpoint(checkpoint_path, checkpoint)
+        self.stdout.write(
+            "Checked {checked} grades: {matched} match, {drifted} differ, {failed} failed.".format(**checkpoint)
+        )
+        if options.get("fix"):
+            self.stdout.write("Queued {queued} grades to send.".format(**checkpoint))
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def write_result(self, submission, result):
+        """
+        Writes a line of the drift report
+        """
+        self.stdout.write("{assignment} {username}: {result}".format(
+            assignment=submission.assignment.edx_id,
+            username=submission.student.username,
+            result=result
+        ))
+
+    @staticmethod
+    def load_checkpoint(path, course, assignment):
+        """
+        Returns the checkpoint saved at path, or a new checkpoint if there is none
+        """
+        checkpoint = dict(
+            dict.fromkeys(COUNTS, 0),
+            course=course.edx_id,
+            assignment=assignment.edx_id if assignment else None,
+            last_id=0
+        )
+        if not path or not os.path.exists(path):
+            return checkpoint
+        with open(path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if (saved.get("course"), saved.get("assignment")) != (checkpoint["course"], checkpoint["assignment"]):
+            raise CommandError("Checkpoint {path} is for a different course or assignment".format(path=path))
+        checkpoint.update(saved)
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(path, checkpoint):
+        """
+        Saves a checkpoint to path (if given), replacing the previous checkpoint atomically
+        """
+        if not path:
+            return
+        temp_path = "{path}.tmp".format(path=path)
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temp_path, path)
+
+
+Command = ReconcileGradesCommand
@@ -0,0 +1,54 @@
+"""
+Contains a management command for sending queued grades to edX
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from sga.backend.grade_passback import send_pending_grades
+
+
+class SendGradesCommand(BaseCommand):
+    """
+    Management command for sending queued grades to edX
+    """
+    help = "Sends the grades queued in the grade passback outbox to edX, polling for new ones unless --once is given"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            dest="once",
+            default=False,
+            help="Send the grades that are due and exit"
+        )
+        parser.add_argument(
+            "--interval",
+            dest="interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls for queued grades"
+        )
+        parser.add_argument(
+            "--concurrency",
+            dest="concurrency",
+            type=int,
+            help="Number of grades to send at once (defaults to settings.GRADE_PASSBACK_CONCURRENCY)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for sending queued grades
+        """
+        while True:
+            close_old_connections()
+            sent, failed = send_pending_grades(concurrency=options.get("concurrency"))
+            if sent or failed:
+                self.stdout.write("Sent {sent} grades, {failed} failed.".format(sent=sent, failed=failed))
+            if options.get("once"):
+                break
+            time.sleep(options.get("interval", 5))
+
+
+Command = SendGradesCommand
@@ -0,0 +1,68 @@
+"""
+Contains a management command for sending the grades of a course or assignment to edX
+"""
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.grade_passback import get_syncable_submissions, sync_grades
+from sga.models import Assignment, Course
+
+
+class SyncGradesCommand(BaseCommand):
+    """
+    Management command for sending the grades of a course or assignment to edX
+    """
+    help = "Sends every grade of a course (or an assignment) to edX and reports the result for each submission"
+
+    def add_arguments(self, parser):
+        parser.add_argument("course", help="Course to send grades for (edX id)")
+        parser.add_argument("--assignment", dest="assignment", help="Only send grades for this assignment (edX id)")
+        parser.add_argument(
+            "--unsynced-only",
+            action="store_true",
+            dest="unsynced_only",
+            default=False,
+            help="Skip submissions whose grade was last sent successfully"
+        )
+        parser.add_argument(
+            "--concurrency",
+            dest="concurrency",
+            type=int,
+            help="Number of grades to send at once (defaults to settings.GRADE_PASSBACK_CONCURRENCY)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for sending grades to edX
+        """
+        try:
+            course = Course.objects.get(edx_id=options["course"])
+        except Course.DoesNotExist:
+            raise CommandError("Course {course} does not exist".format(course=options["course"]))
+        assignment = None
+        if options.get("assignment"):
+            try:
+                assignment = Assignment.objects.get(course=course, edx_id=options["assignment"])
+            except Assignment.DoesNotExist:
+                raise CommandError("Assignment {assignment} does not exist".format(assignment=options["assignment"]))
+        submissions = get_syncable_submissions(
+            course,
+            assignment=assignment,
+            unsynced_only=options.get("unsynced_only", False)
+        )
+        sent = failed = 0
+        for submission, error in sync_grades(submissions, concurrency=options.get("concurrency")):
+            if error is None:
+                sent += 1
+                result = "sent"
+            else:
+                failed += 1
+                result = "failed ({error})".format(error=error)
+            self.stdout.write("{assignment} {username}: {result}".format(
+                assignment=submission.assignment.edx_id,
+                username=submission.student.username,
+                result=result
+            ))
+        self.stdout.write("Sent {sent} grades, {failed} failed.".format(sent=sent, failed=failed))
+
+
+Command = SyncGradesCommand
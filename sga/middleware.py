@@ -1,39 +1,121 @@
 """
 Custom middleware
 """
+import json
+import logging
+import random
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.core.urlresolvers import reverse
+from django.db import connections
 from django.http import HttpResponseBadRequest
 from django.shortcuts import redirect
-from django.utils.dateparse import parse_datetime
 from django_auth_lti.backends import LTIAuthBackend
 
 from sga.backend.constants import STUDIO_USER_USERNAME, Roles
-from sga.models import Course, Assignment, Student, Grader, Submission
-from sga.backend.authentication import get_role
+from sga.backend.launch import process_lti_launch
+from sga.backend.metrics import LTI, STORAGE, TEMPLATE, start_request_metrics, stop_request_metrics
+
+log = logging.getLogger(__name__)
+
+# Paths requests take through SGAMiddleware
+EXEMPT_PATH = "exempt"  # static files and pages that never need LTI processing
+PASSTHROUGH_PATH = "passthrough"  # requests after the initial LTI launch
+LAUNCH_PATH = "launch"  # initial LTI launches
+REJECTED_PATH = "rejected"  # initial LTI launches that were rejected or redirected to an info page
+
+path_counts = Counter()  # pylint: disable=invalid-name
+_path_counts_lock = Lock()  # pylint: disable=invalid-name
+
+
+def count_path(path):
+    """
+    Counts a request taking a path through SGAMiddleware, logging the counts every
+    settings.SGA_MIDDLEWARE_STATS_LOG_INTERVAL requests (if it is set)
+    """
+    with _path_counts_lock:
+        path_counts[path] += 1
+        total = sum(path_counts.values())
+        counts = dict(path_counts)
+    interval = settings.SGA_MIDDLEWARE_STATS_LOG_INTERVAL
+    if interval and total % interval == 0:
+        log.info("SGAMiddleware path counts after %s requests: %s", total, counts)
 
 
 class SGAMiddleware(object):
     """
     Middleware for processing incoming LTI requests
     """
-    ADMIN_ROLES = ["Administrator", "Instructor"]
     LTI_MIDDLEWARE_NOT_INSTALLED_MESSAGE = "LTI middleware not installed"
     UNSUCCESSFUL_LTI_AUTHENTICATION_MESSAGE = "Bad or missing LTI credentials"
     NO_CONTEXT_ID_MESSAGE = "No context_id in LTI parameters"
     NO_RESOURCE_LINK_ID_MESSAGE = "No resource_link_id in LTI parameters"
     REQUEST_USERNAME_FALSE_MESSAGE = '"Request user\'s username" must be set to True on this assignment.'
 
-    def process_request(self, request):  # pylint: disable=no-self-use
+    def __init__(self):
+        self.exempt_path_prefixes = None
+
+    def get_exempt_path_prefixes(self):
+        """
+        Returns the path prefixes of requests that never need LTI processing: static and media files, the admin,
+        and the info pages that launches are redirected to
+        """
+        if self.exempt_path_prefixes is None:
+            prefixes = [
+                settings.STATIC_URL,
+                settings.MEDIA_URL,
+                reverse("admin:index"),
+                reverse("not_graded_block_error_page"),
+                reverse("studio_message_page"),
+            ]
+            self.exempt_path_prefixes = tuple(
+                prefix for prefix in prefixes if prefix and prefix.startswith("/") and prefix != "/"
+            )
+        return self.exempt_path_prefixes
+
+    def process_request(self, request):
         """
-        Processes incoming LTI requests
+        Processes incoming LTI requests. Only initial LTI launches touch the session or the database.
         """
         if not hasattr(request, "LTI"):
             raise ImproperlyConfigured(self.LTI_MIDDLEWARE_NOT_INSTALLED_MESSAGE)
-        if "course_roles" not in request.session:
-            request.session["course_roles"] = {}
+        if request.path_info.startswith(self.get_exempt_path_prefixes()):
+            count_path(EXEMPT_PATH)
+            return
         if not request.lti_initial_request:
             # Not initial request, don't process
+            count_path(PASSTHROUGH_PATH)
             return
+        try:
+            response = self.validate_launch(request)
+        except SuspiciousOperation:
+            count_path(REJECTED_PATH)
+            raise
+        if response is not None:
+            count_path(REJECTED_PATH)
+            return response
+        count_path(LAUNCH_PATH)
+        # On the initial request, we have potentially gotten new information
+        # from edX; update the database accordingly
+        course, assignment, user_role = process_lti_launch(request.user, request.LTI, request.POST)
+
+        # We only check for role on the initial LTI request since the user's session in our tool
+        # is expected to be short-lived enough to not warrant checking on every request.
+        # We also need to cast str on course.id because the url parameters are passed as string
+        # to the decorator and views. The dict is reassigned so the session is saved.
+        course_roles = dict(request.session.get("course_roles", {}))
+        course_roles[str(course.id)] = user_role
+        request.session["course_roles"] = course_roles
+        # Redirect edX launch to the appropriate page
+        return self.redirect_edx_launch(user_role, course, assignment)
+
+    def validate_launch(self, request):
+        """
+        Returns a response for an initial LTI launch that can't be processed, or None if it can
+        """
         if not request.lti_authentication_successful:
             # Raise 400; user is using bad LTI credentials
             return HttpResponseBadRequest(self.UNSUCCESSFUL_LTI_AUTHENTICATION_MESSAGE)
@@ -50,46 +132,7 @@ class SGAMiddleware(object):
         if request.user.username.startswith(LTIAuthBackend.unknown_user_prefix):
             request.user.delete()
             return HttpResponseBadRequest(self.REQUEST_USERNAME_FALSE_MESSAGE)
-        # On the initial request, we have potentially gotten new information
-        # from edX; update the database accordingly
-        # Course
-        course, _ = Course.objects.get_or_create(edx_id=request.LTI["context_id"])
-        # Assignment
-        due_date = request.POST.get("custom_component_due_date")
-        if due_date:
-            due_date = parse_datetime(due_date)
-        name = request.POST.get("custom_component_display_name", request.LTI["resource_link_id"])
-        defaults = {"course": course, "due_date": due_date, "name": name}
-        assignment, _ = Assignment.objects.update_or_create(
-            edx_id=request.LTI["resource_link_id"],
-            defaults=defaults
-        )
-        if any([r for r in self.ADMIN_ROLES if r in request.LTI.get("roles", [])]):
-            course.administrators.add(request.user)
-            Grader.objects.filter(user=request.user, course=course).delete()
-            Student.objects.filter(user=request.user, course=course).delete()
-        else:
-            course.administrators.remove(request.user)
-            # Ensure the student object exists; graders also should have a student object, since
-            # they are promoted from students and if they are ever demoted, their student data
-            # should still exist
-            Student.objects.get_or_create(course=course, user=request.user)
-            # If this user is a student, we need to generate a Submission object and store
-            # grade submission information
-            submission, _ = Submission.objects.get_or_create(student=request.user, assignment=assignment)
-            submission.edx_url = request.LTI["lis_outcome_service_url"]
-            submission.result_id = request.POST.get("lis_result_sourcedid")
-            submission.consumer_key = request.POST.get("oauth_consumer_key")
-            submission.save()
-
-        # We only check for role on the initial LTI request since the user's session in our tool
-        # is expected to be short-lived enough to not warrant checking on every request.
-        # We also need to cast str on course.id because the url parameters are passed as string
-        # to the decorator and views.
-        user_role = get_role(request.user, course.id)
-        request.session["course_roles"][str(course.id)] = user_role
-        # Redirect edX launch to the appropriate page
-        return self.redirect_edx_launch(user_role, course, assignment)
+        return None
 
     @staticmethod
     def redirect_edx_launch(user_role, course, assignment):
@@ -101,3 +144,99 @@ class SGAMiddleware(object):
         if user_role in [Roles.admin, Roles.grader]:
             return redirect("view_assignment", course_id=course.id, assignment_id=assignment.id)
         raise Exception("Bad role %s" % user_role)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Middleware that measures a sample of requests (settings.REQUEST_METRICS_SAMPLE_RATE): their database queries,
+    storage calls, outbound LTI calls and template rendering (see sga.backend.metrics). The measurements are
+    logged as JSON and sent in a Server-Timing header (if settings.REQUEST_METRICS_SERVER_TIMING is set). Work done
+    in other database connections and threads (except grade passback) or while a streaming response is read isn't
+    measured. Requests that aren't sampled only cost a random number.
+    """
+    def process_request(self, request):
+        """
+        Starts measuring a sample of requests
+        """
+        sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        if not sample_rate or random.random() >= sample_rate:
+            return
+        self.start_query_log(request)
+        request.metrics = start_request_metrics()
+
+    def process_response(self, request, response):
+        """
+        Logs the measurements of a sampled request and adds them to its response
+        """
+        if getattr(request, "metrics", None) is None:
+            return response
+        metrics = stop_request_metrics() or request.metrics
+        summary = self.get_summary(request, response, metrics, *self.stop_query_log(request))
+        log.info("Request metrics: %s", json.dumps(summary, sort_keys=True))
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response["Server-Timing"] = self.get_server_timing(summary)
+        return response
+
+    @staticmethod
+    def start_query_log(request):
+        """
+        Starts logging the queries of every database connection
+        """
+        # The query log of the connections (see CaptureQueriesContext) is cleared when a request starts
+        request.metrics_connections = [
+            (connection, connection.force_debug_cursor, len(connection.queries_log))
+            for connection in connections.all()
+        ]
+        for connection, _, _ in request.metrics_connections:
+            connection.force_debug_cursor = True
+
+    @staticmethod
+    def stop_query_log(request):
+        """
+        Stops logging queries and returns the number of queries logged since start_query_log() and their seconds
+        """
+        queries = 0
+        query_seconds = 0.0
+        for connection, force_debug_cursor, initial_queries in request.metrics_connections:
+            connection.force_debug_cursor = force_debug_cursor
+            captured_queries = list(connection.queries_log)[initial_queries:]
+            queries += len(captured_queries)
+            query_seconds += sum(float(query["time"]) for query in captured_queries)
+        return queries, query_seconds
+
+    @staticmethod
+    def get_summary(request, response, metrics, queries, query_seconds):
+        """
+        Returns the measurements of a request (dict) as they are logged
+        """
+        storage_calls, storage_seconds, storage_bytes = metrics.get(STORAGE)
+        lti_calls, lti_seconds, _ = metrics.get(LTI)
+        resolver_match = getattr(request, "resolver_match", None)
+        return {
+            "method": request.method,
+            "path": request.path,
+            "view": resolver_match.url_name if resolver_match else None,
+            "status": response.status_code,
+            "total_ms": round(metrics.duration * 1000, 1),
+            "queries": queries,
+            "db_ms": round(query_seconds * 1000, 1),
+            "storage_calls": storage_calls,
+            "storage_bytes": storage_bytes,
+            "storage_ms": round(storage_seconds * 1000, 1),
+            "lti_calls": lti_calls,
+            "lti_ms": round(lti_seconds * 1000, 1),
+            "template_ms": round(metrics.get(TEMPLATE)[1] * 1000, 1),
+        }
+
+    @staticmethod
+    def get_server_timing(summary):
+        """
+        Returns the Server-Timing header value for the measurements of a request (see get_summary())
+        """
+        return ", ".join([
+            'db;dur={db_ms:.1f};desc="{queries} queries"'.format(**summary),
+            'storage;dur={storage_ms:.1f};desc="{storage_calls} calls / {storage_bytes} bytes"'.format(**summary),
+            'lti;dur={lti_ms:.1f};desc="{lti_calls} calls"'.format(**summary),
+            "template;dur={template_ms:.1f}".format(**summary),
+            "total;dur={total_ms:.1f}".format(**summary),
+        ])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 04:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, IntegerField, Sum, When
+import django.db.models.deletion
+
+
+def populate_submission_counters(apps, schema_editor):
+    """
+    Creates SubmissionCounter objects for existing submissions
+    """
+    Submission = apps.get_model("sga", "Submission")
+    SubmissionCounter = apps.get_model("sga", "SubmissionCounter")
+    rows = Submission.objects.filter(
+        student__student__course=F("assignment__course"),
+        student__student__deleted=False,
+        submitted=True
+    ).values("assignment", "student__student__grader").annotate(
+        submitted=Count("id"),
+        graded=Sum(Case(When(graded=True, then=1), default=0, output_field=IntegerField()))
+    )
+    SubmissionCounter.objects.bulk_create([
+        SubmissionCounter(
+            assignment_id=row["assignment"],
+            grader_id=row["student__student__grader"],
+            submitted_count=row["submitted"],
+            graded_count=row["graded"],
+            not_graded_count=row["submitted"] - row["graded"]
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0004_auto_20160705_1742'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submitted_count', models.IntegerField(default=0)),
+                ('graded_count', models.IntegerField(default=0)),
+                ('not_graded_count', models.IntegerField(default=0)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='sga.Assignment')),
+                ('grader', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='sga.Grader')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='submissioncounter',
+            unique_together=set([('assignment', 'grader')]),
+        ),
+        migrations.RunPython(populate_submission_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 04:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0005_submissioncounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('scope', models.CharField(choices=[('all', 'All submissions'), ('not_graded', 'Not graded submissions')], max_length=16)),
+                ('compression', models.CharField(max_length=16)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('building', 'Building'), ('ready', 'Ready')], default='pending', max_length=16)),
+                ('file_name', models.CharField(blank=True, max_length=512)),
+                ('size', models.BigIntegerField(default=0)),
+                ('last_accessed', models.DateTimeField(null=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='sga.Assignment')),
+                ('grader', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='sga.Grader')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='submissionarchive',
+            unique_together=set([('assignment', 'scope', 'grader', 'compression', 'fingerprint')]),
+        ),
+    ]
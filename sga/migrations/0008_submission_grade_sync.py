@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 04:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0007_gradepassback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='grade_sync_error',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='grade_sync_status',
+            field=models.CharField(max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='grade_synced_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
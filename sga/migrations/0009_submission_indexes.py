@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 05:28
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# The index_together indexes of Student and Submission, created with explicit names so that they can be referred to
+# (index_together can't name its indexes)
+COMPOSITE_INDEXES = [
+    ("sga_student_course_deleted_grader", "sga_student", "course_id, deleted, grader_id"),
+    ("sga_submission_assignment_status", "sga_submission", "assignment_id, submitted, graded"),
+    ("sga_submission_student_status", "sga_submission", "student_id, submitted, graded"),
+    ("sga_submission_graded_by_status", "sga_submission", "graded_by_id, submitted, graded"),
+]
+
+# Partial indexes on the submissions waiting to be graded, which the not graded counts and lists read. They are
+# only created on PostgreSQL: SQLite can't use a partial index for a query whose condition is a bound parameter.
+PARTIAL_INDEXES = [
+    ("sga_submission_assignment_not_graded", "assignment_id, student_id", "submitted AND NOT graded"),
+    ("sga_submission_student_not_graded", "student_id, assignment_id", "submitted AND NOT graded"),
+    ("sga_submission_graded_by_graded", "graded_by_id, assignment_id", "submitted AND graded"),
+]
+
+
+def create_composite_indexes(apps, schema_editor):
+    """
+    Creates the index_together indexes
+    """
+    for name, table, columns in COMPOSITE_INDEXES:
+        schema_editor.execute("CREATE INDEX {name} ON {table} ({columns})".format(
+            name=name,
+            table=table,
+            columns=columns
+        ))
+
+
+def drop_composite_indexes(apps, schema_editor):
+    """
+    Drops the index_together indexes
+    """
+    for name, _, _ in COMPOSITE_INDEXES:
+        schema_editor.execute("DROP INDEX {name}".format(name=name))
+
+
+def create_partial_indexes(apps, schema_editor):
+    """
+    Creates the partial submission indexes on PostgreSQL
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, columns, condition in PARTIAL_INDEXES:
+        schema_editor.execute("CREATE INDEX {name} ON sga_submission ({columns}) WHERE {condition}".format(
+            name=name,
+            columns=columns,
+            condition=condition
+        ))
+
+
+def drop_partial_indexes(apps, schema_editor):
+    """
+    Drops the partial submission indexes on PostgreSQL
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in PARTIAL_INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {name}".format(name=name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0008_submission_grade_sync'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_composite_indexes, drop_composite_indexes)],
+            state_operations=[
+                migrations.AlterIndexTogether(
+                    name='student',
+                    index_together=set([('course', 'deleted', 'grader')]),
+                ),
+                migrations.AlterIndexTogether(
+                    name='submission',
+                    index_together=set([
+                        ('assignment', 'submitted', 'graded'),
+                        ('graded_by', 'submitted', 'graded'),
+                        ('student', 'submitted', 'graded'),
+                    ]),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
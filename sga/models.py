@@ -4,14 +4,31 @@ Model definitions
 from datetime import datetime
 
 import pytz
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, IntegerField, Q, Sum, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
 
-from sga.backend.files import student_submission_file_path, grader_submission_file_path
+from sga.backend.files import student_submission_file_path, grader_submission_file_path, get_archive_storage
 from sga.backend.validators import validate_file_extension, validate_file_size
 
 
+# SubmissionCounter key for students whose submissions are not counted (deleted students)
+NOT_COUNTED = "not_counted"
+# Counter key or state of an instance that wasn't loaded with the fields it is computed from
+NOT_LOADED = object()
+
+
+def _conditional_count(condition):
+    """
+    Returns an aggregate expression counting the rows that match condition (a Q object)
+    """
+    return Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+
 class TimeStampedModel(models.Model):
     """
     Base model for create/update timestamps
@@ -33,6 +50,57 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class GraderQuerySet(models.QuerySet):
+    """
+    QuerySet for Grader objects
+    """
+    def with_stats(self):
+        """
+        Annotates every grader with number_of_students, available_student_slots, graded_count and
+        not_graded_count (the values of the Grader methods with the same names) using correlated subqueries,
+        so that the graders and their stats are loaded with a single query
+        """
+        tables = {
+            "grader": self.model._meta.db_table,
+            "student": Student._meta.db_table,
+            "submission": Submission._meta.db_table,
+            "assignment": Assignment._meta.db_table,
+            "counter": SubmissionCounter._meta.db_table,
+        }
+        number_of_students = RawSQL(
+            "SELECT COUNT(*) FROM {student} "
+            "WHERE {student}.grader_id = {grader}.id AND {student}.deleted = %s".format(**tables),
+            (False,),
+            output_field=IntegerField()
+        )
+        graded_count = RawSQL(
+            "SELECT COUNT(*) FROM {submission} "
+            "INNER JOIN {assignment} ON {assignment}.id = {submission}.assignment_id "
+            "INNER JOIN {student} ON {student}.user_id = {submission}.student_id "
+            "AND {student}.course_id = {assignment}.course_id "
+            "WHERE {submission}.graded_by_id = {grader}.user_id AND {assignment}.course_id = {grader}.course_id "
+            "AND {submission}.submitted = %s AND {submission}.graded = %s AND {student}.deleted = %s".format(**tables),
+            (True, True, False),
+            output_field=IntegerField()
+        )
+        not_graded_count = RawSQL(
+            "SELECT COALESCE(SUM({counter}.not_graded_count), 0) FROM {counter} "
+            "WHERE {counter}.grader_id = {grader}.id".format(**tables),
+            (),
+            output_field=IntegerField()
+        )
+        return self.annotate(
+            number_of_students=number_of_students,
+            graded_count=graded_count,
+            not_graded_count=not_graded_count
+        ).annotate(
+            available_student_slots=ExpressionWrapper(
+                F("max_students") - F("number_of_students"),
+                output_field=IntegerField()
+            )
+        )
+
+
 class Grader(TimeStampedModel):
     """
     Grader model (intermediate between Course and User)
@@ -41,6 +109,8 @@ class Grader(TimeStampedModel):
     user = models.ForeignKey(User)
     course = models.ForeignKey("Course")
 
+    objects = GraderQuerySet.as_manager()
+
     def __str__(self):
         return self.user.username
 
@@ -65,13 +135,7 @@ class Grader(TimeStampedModel):
         """
         Returns a count of submission that are submitted but not graded by this grader
         """
-        student_users = [s.user for s in self.students.filter(deleted=False)]
-        return Submission.objects.filter(
-            student__in=student_users,
-            assignment__course=self.course,
-            submitted=True,
-            graded=False
-        ).count()
+        return SubmissionCounter.objects.get_totals(grader=self)["not_graded"]
 
     def available_student_slots_count(self):
         """
@@ -83,6 +147,52 @@ class Grader(TimeStampedModel):
         unique_together = (("user", "course"),)
 
 
+class StudentQuerySet(models.QuerySet):
+    """
+    QuerySet for Student objects
+    """
+    def with_stats(self):
+        """
+        Annotates every student with not_graded_count (the number of their submissions in the student's course that
+        are submitted but not graded) using a correlated subquery
+        """
+        tables = {
+            "student": self.model._meta.db_table,
+            "submission": Submission._meta.db_table,
+            "assignment": Assignment._meta.db_table,
+        }
+        return self.annotate(not_graded_count=RawSQL(
+            "SELECT COUNT(*) FROM {submission} "
+            "INNER JOIN {assignment} ON {assignment}.id = {submission}.assignment_id "
+            "WHERE {submission}.student_id = {student}.user_id AND {assignment}.course_id = {student}.course_id "
+            "AND {submission}.submitted = %s AND {submission}.graded = %s".format(**tables),
+            (True, False),
+            output_field=IntegerField()
+        ))
+
+    def with_submission_status(self, assignment):
+        """
+        Annotates every student with submitted and graded, the status of their submission for assignment (both
+        False if they have no submission), using correlated subqueries
+        """
+        tables = {
+            "student": self.model._meta.db_table,
+            "submission": Submission._meta.db_table,
+        }
+        status_sql = (
+            "EXISTS (SELECT 1 FROM {submission} WHERE {submission}.student_id = {student}.user_id "
+            "AND {submission}.assignment_id = %s AND {submission}.{field} = %s)"
+        )
+        return self.annotate(**{
+            field: RawSQL(
+                status_sql.format(field=field, **tables),
+                (assignment.id, True),
+                output_field=models.BooleanField()
+            )
+            for field in ["submitted", "graded"]
+        })
+
+
 class Student(TimeStampedModel):
     """
     Student model (intermediate between Course and User)
@@ -92,11 +202,62 @@ class Student(TimeStampedModel):
     course = models.ForeignKey("Course")
     deleted = models.BooleanField(default=False)
 
+    objects = StudentQuerySet.as_manager()
+
+    # The counter key the student was loaded or last saved with (NOT_LOADED if unknown)
+    _loaded_counter_key = NOT_LOADED
+
     def __str__(self):
         return self.user.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "grader_id" in instance.__dict__ and "deleted" in instance.__dict__:
+            instance._loaded_counter_key = instance.get_counter_key()  # pylint: disable=protected-access
+        return instance
+
+    def get_counter_key(self):
+        """
+        Returns the grader id this student's submissions are counted under in SubmissionCounter (None if the
+        student has no grader), or NOT_COUNTED if they are not counted
+        """
+        return NOT_COUNTED if self.deleted else self.grader_id
+
+    def get_saved_counter_key(self):
+        """
+        Returns the counter key of the saved student (NOT_COUNTED if it isn't saved), and locks its row until the
+        end of the transaction so that concurrent saves of the student don't move the same counts twice
+        """
+        row = Student.objects.select_for_update().filter(pk=self.pk).values_list("grader_id", "deleted").first()
+        return NOT_COUNTED if row is None or row[1] else row[0]
+
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Saves the student and moves their submission counts in SubmissionCounter if the grader or deleted
+        status changed
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"grader", "grader_id", "deleted"} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            if self._state.adding:
+                old_key = NOT_COUNTED
+            elif self._loaded_counter_key == self.get_counter_key():
+                # The grader and deleted status weren't changed since the student was loaded
+                old_key = self._loaded_counter_key
+            else:
+                old_key = self.get_saved_counter_key()
+            super().save(*args, **kwargs)
+            new_key = self.get_counter_key()
+            if new_key != old_key:
+                SubmissionCounter.objects.move_student(self, old_key, new_key)
+        self._loaded_counter_key = new_key
+
     class Meta():
         unique_together = (("user", "course"),)
+        index_together = (("course", "deleted", "grader"),)
 
 
 class Course(TimeStampedModel):
@@ -139,6 +300,71 @@ class Course(TimeStampedModel):
             graded=False
         ).count()
 
+    def get_submission_counts_by_student(self, grader=None):
+        """
+        Returns a dict of {student_user_id: {"submitted": int, "graded": int, "not_graded": int}} counting the
+        submitted submissions of every student in this course (or only the students assigned to grader) with one
+        grouped query. Students without submitted submissions are left out.
+        """
+        submissions = Submission.objects.filter(assignment__course=self, submitted=True)
+        if grader:
+            submissions = submissions.filter(student__student__course=self, student__student__grader=grader)
+        rows = submissions.values("student").annotate(
+            submitted=Count("id"),
+            graded=_conditional_count(Q(graded=True))
+        )
+        return {
+            row["student"]: {
+                "submitted": row["submitted"],
+                "graded": row["graded"],
+                "not_graded": row["submitted"] - row["graded"]
+            }
+            for row in rows
+        }
+
+    def get_submission_counts_by_assignment(self, grader=None):
+        """
+        Returns a dict of {assignment_id: {"not_submitted": int, "not_graded": int, "graded": int}} for every
+        assignment in this course, computed with grouped queries. If grader is provided, counts are limited to that
+        grader (the graded count includes all Submissions graded by the Grader, even if the Student is no longer
+        assigned to the Grader)
+        """
+        counters = SubmissionCounter.objects.filter(assignment__course=self)
+        if grader:
+            number_of_students = grader.get_number_of_students()
+            counters = counters.filter(grader=grader)
+            # Submissions graded by this grader aren't tracked by SubmissionCounter, so they're counted directly
+            graded_counts = dict(Submission.objects.filter(
+                graded_by=grader.user,
+                assignment__course=self,
+                student__student__course=self,
+                student__student__deleted=False,
+                submitted=True,
+                graded=True
+            ).values_list("assignment").annotate(Count("id")))
+        else:
+            number_of_students = self.students.filter(student__deleted=False).count()
+            graded_counts = None
+        rows = counters.values("assignment").annotate(
+            submitted=Sum("submitted_count"),
+            graded=Sum("graded_count"),
+            not_graded=Sum("not_graded_count")
+        )
+        counts = {
+            assignment_id: {"not_submitted": number_of_students, "not_graded": 0, "graded": 0}
+            for assignment_id in self.assignments.values_list("id", flat=True)
+        }
+        for row in rows:
+            counts[row["assignment"]].update({
+                "not_submitted": number_of_students - row["submitted"],
+                "not_graded": row["not_graded"],
+                "graded": row["graded"]
+            })
+        if graded_counts is not None:
+            for assignment_id, assignment_counts in counts.items():
+                assignment_counts["graded"] = graded_counts.get(assignment_id, 0)
+        return counts
+
 
 class Assignment(TimeStampedModel):
     """
@@ -154,7 +380,7 @@ class Assignment(TimeStampedModel):
         """
         Returns a count of submissions for this assignment that are graded
         """
-        return self.submissions.filter(submitted=True, graded=True, student__student__deleted=False).count()
+        return SubmissionCounter.objects.get_totals(assignment=self)["graded"]
 
     def graded_submissions_count_by_grader(self, grader=None, grader_user=None, limit_to_current_students=True):
         """
@@ -171,15 +397,14 @@ class Assignment(TimeStampedModel):
             graded=True
         )
         if limit_to_current_students:
-            student_users = [s.user for s in grader.students.filter(deleted=False)]
-            submissions = submissions.filter(student__in=student_users)
+            submissions = submissions.filter(student__in=grader.students.filter(deleted=False).values("user"))
         return submissions.count()
 
     def not_graded_submissions_count(self):
         """
         Returns a count of submissions for this assignment that are submitted but not graded
         """
-        return self.submissions.filter(submitted=True, graded=False, student__student__deleted=False).count()
+        return SubmissionCounter.objects.get_totals(assignment=self)["not_graded"]
 
     def not_graded_submissions_count_by_grader(self, grader=None, grader_user=None):
         """
@@ -187,13 +412,7 @@ class Assignment(TimeStampedModel):
         """
         if not grader:
             grader = Grader.objects.get(user=grader_user, course=self.course)
-        student_users = [s.user for s in grader.students.filter(deleted=False)]
-        return Submission.objects.filter(
-            student__in=student_users,
-            assignment=self,
-            submitted=True,
-            graded=False
-        ).count()
+        return SubmissionCounter.objects.get_totals(assignment=self, grader=grader)["not_graded"]
 
     def not_submitted_submissions_count(self):
         """
@@ -201,7 +420,7 @@ class Assignment(TimeStampedModel):
         """
         # Graders all have student objects
         students_in_course = self.course.students.filter(student__deleted=False).count()
-        return students_in_course - self.graded_submissions_count() - self.not_graded_submissions_count()
+        return students_in_course - SubmissionCounter.objects.get_totals(assignment=self)["submitted"]
 
     def not_submitted_submissions_count_by_grader(self, grader=None, grader_user=None):
         """
@@ -210,8 +429,32 @@ class Assignment(TimeStampedModel):
         if not grader:
             grader = Grader.objects.get(user=grader_user, course=self.course)
         return (grader.get_number_of_students()
-                - self.graded_submissions_count_by_grader(grader_user=grader.user)
-                - self.not_graded_submissions_count_by_grader(grader=grader))
+                - SubmissionCounter.objects.get_totals(assignment=self, grader=grader)["submitted"])
+
+    def get_submission_statuses(self):
+        """
+        Returns a dict of {student_user_id: (submitted, graded)} for every existing Submission for this assignment,
+        fetched with a single query. Students without a Submission have not submitted.
+        """
+        return {
+            student_id: (submitted, graded)
+            for student_id, submitted, graded in self.submissions.values_list("student", "submitted", "graded")
+        }
+
+    def create_missing_submissions(self, batch_size=500):
+        """
+        Creates (in bulk) a Submission for every Student in the course that doesn't have one for this assignment.
+        Returns the number of Submissions created.
+        """
+        student_user_ids = Student.objects.filter(
+            course_id=self.course_id,
+            deleted=False
+        ).exclude(
+            user__in=self.submissions.values("student")
+        ).values_list("user", flat=True)
+        submissions = [Submission(assignment=self, student_id=user_id) for user_id in student_user_ids]
+        Submission.objects.bulk_create(submissions, batch_size=batch_size)
+        return len(submissions)
 
     def is_past_due_date(self, now=datetime.utcnow().replace(tzinfo=pytz.UTC)):
         """
@@ -254,6 +497,57 @@ class Submission(TimeStampedModel):
     edx_url = models.CharField(max_length=256, null=True)  # lis_outcome_service_url
     result_id = models.CharField(max_length=256, null=True)  # lis_result_sourcedid
     consumer_key = models.CharField(max_length=256, null=True)  # oauth_consumer_key
+    # Result of the last attempt to send the grade to edX
+    grade_sync_status = models.CharField(max_length=16, null=True)  # GradePassback.SENT or GradePassback.FAILED
+    grade_synced_at = models.DateTimeField(null=True)  # UTC
+    grade_sync_error = models.TextField(null=True)
+
+    # The counter state the submission was loaded or last saved with (NOT_LOADED if unknown)
+    _loaded_counter_state = NOT_LOADED
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "submitted" in instance.__dict__ and "graded" in instance.__dict__:
+            instance._loaded_counter_state = instance.get_counter_state()  # pylint: disable=protected-access
+        return instance
+
+    def get_counter_state(self):
+        """
+        Returns the (submitted, graded) state this submission is counted with in SubmissionCounter
+        """
+        return self.submitted, self.graded
+
+    def get_saved_counter_state(self):
+        """
+        Returns the counter state of the saved submission ((False, False) if it isn't saved), and locks its row
+        until the end of the transaction so that concurrent saves of the submission don't apply the same deltas
+        twice
+        """
+        row = Submission.objects.select_for_update().filter(pk=self.pk).values_list("submitted", "graded").first()
+        return (False, False) if row is None else row
+
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Saves the submission and updates SubmissionCounter if it was submitted, graded or unsubmitted
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"submitted", "graded"} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            if self._state.adding:
+                old_state = (False, False)
+            elif self._loaded_counter_state == self.get_counter_state():
+                # The submitted and graded status weren't changed since the submission was loaded
+                old_state = self._loaded_counter_state
+            else:
+                old_state = self.get_saved_counter_state()
+            super().save(*args, **kwargs)
+            new_state = self.get_counter_state()
+            if new_state != old_state:
+                SubmissionCounter.objects.update_submission(self, old_state, new_state)
+        self._loaded_counter_state = new_state
 
     def grade_display(self):
         """
@@ -272,3 +566,358 @@ class Submission(TimeStampedModel):
 
     class Meta:
         unique_together = (("assignment", "student"),)
+        # The lists and counts of sga.backend filter submissions by assignment, student or grader and by status
+        index_together = (
+            ("assignment", "submitted", "graded"),
+            ("student", "submitted", "graded"),
+            ("graded_by", "submitted", "graded"),
+        )
+
+
+def get_counter_deltas(state):
+    """
+    Returns the (submitted, graded, not_graded) counts that a submission with state (submitted, graded) adds
+    to its SubmissionCounter
+    """
+    submitted, graded = state
+    if not submitted:
+        return 0, 0, 0
+    return (1, 1, 0) if graded else (1, 0, 1)
+
+
+class SubmissionCounterManager(models.Manager):
+    """
+    Manager for maintaining and reading SubmissionCounter objects
+    """
+    def add(self, assignment_id, grader_id, deltas):
+        """
+        Atomically adds deltas (a (submitted, graded, not_graded) tuple) to the counter for
+        (assignment_id, grader_id), creating it if necessary
+        """
+        submitted, graded, not_graded = deltas
+        if not (submitted or graded or not_graded):
+            return
+        counters = self.filter(assignment_id=assignment_id, grader_id=grader_id)
+        with transaction.atomic():
+            counter_id = counters.order_by("id").values_list("id", flat=True).first()
+            if counter_id is None:
+                if submitted < 0 or graded < 0 or not_graded < 0:
+                    # Nothing has been counted yet, so there is nothing to take away (this also avoids creating
+                    # counters while their assignment or grader is being deleted)
+                    return
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            assignment_id=assignment_id,
+                            grader_id=grader_id,
+                            submitted_count=submitted,
+                            graded_count=graded,
+                            not_graded_count=not_graded
+                        )
+                    return
+                except IntegrityError:
+                    # Created concurrently
+                    counter_id = counters.values_list("id", flat=True).get()
+            self.filter(id=counter_id).update(
+                submitted_count=F("submitted_count") + submitted,
+                graded_count=F("graded_count") + graded,
+                not_graded_count=F("not_graded_count") + not_graded
+            )
+
+    def update_submission(self, submission, old_state, new_state):
+        """
+        Updates the counters after a submission changed from old_state to new_state ((submitted, graded) tuples)
+        """
+        old_deltas = get_counter_deltas(old_state)
+        new_deltas = get_counter_deltas(new_state)
+        if old_deltas == new_deltas:
+            return
+        student_key = Student.objects.filter(
+            user_id=submission.student_id,
+            course__assignments=submission.assignment_id
+        ).values_list("grader", "deleted").first()
+        if student_key is None or student_key[1]:
+            # Submissions are only counted for current students
+            return
+        self.add(
+            submission.assignment_id,
+            student_key[0],
+            tuple(new - old for new, old in zip(new_deltas, old_deltas))
+        )
+
+    def move_student(self, student, old_key, new_key):
+        """
+        Moves the counts of a student's submissions from one counter key to another (see Student.get_counter_key())
+        """
+        submission_states = Submission.objects.filter(
+            student_id=student.user_id,
+            assignment__course_id=student.course_id,
+            submitted=True
+        ).values_list("assignment", "submitted", "graded")
+        for assignment_id, submitted, graded in submission_states:
+            deltas = get_counter_deltas((submitted, graded))
+            if old_key != NOT_COUNTED:
+                self.add(assignment_id, old_key, tuple(-delta for delta in deltas))
+            if new_key != NOT_COUNTED:
+                self.add(assignment_id, new_key, deltas)
+
+    def get_totals(self, **filters):
+        """
+        Returns a dict of the summed "submitted", "graded" and "not_graded" counts of the counters matching filters
+        """
+        totals = self.filter(**filters).aggregate(
+            submitted=Sum("submitted_count"),
+            graded=Sum("graded_count"),
+            not_graded=Sum("not_graded_count")
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    def get_counts(self, course=None):
+        """
+        Returns a dict of {(assignment_id, grader_id): (submitted, graded, not_graded)} as stored in the counters
+        """
+        counters = self.all()
+        if course:
+            counters = counters.filter(assignment__course=course)
+        rows = counters.values("assignment", "grader").annotate(
+            submitted=Sum("submitted_count"),
+            graded=Sum("graded_count"),
+            not_graded=Sum("not_graded_count")
+        )
+        return {
+            (row["assignment"], row["grader"]): (row["submitted"], row["graded"], row["not_graded"])
+            for row in rows
+            if row["submitted"] or row["graded"] or row["not_graded"]
+        }
+
+    def compute_counts(self, course=None):  # pylint: disable=no-self-use
+        """
+        Returns a dict of {(assignment_id, grader_id): (submitted, graded, not_graded)} counted from Submissions
+        """
+        return compute_submission_counts(course=course)
+
+    def rebuild(self, course=None):
+        """
+        Replaces the counters (for one course, or all courses) with counts computed from Submissions
+        """
+        with transaction.atomic():
+            counters = self.all()
+            if course:
+                counters = counters.filter(assignment__course=course)
+            counters.delete()
+            self.bulk_create([
+                SubmissionCounter(
+                    assignment_id=assignment_id,
+                    grader_id=grader_id,
+                    submitted_count=submitted,
+                    graded_count=graded,
+                    not_graded_count=not_graded
+                )
+                for (assignment_id, grader_id), (submitted, graded, not_graded)
+                in self.compute_counts(course=course).items()
+            ])
+
+
+def compute_submission_counts(course=None):
+    """
+    Counts submissions by (assignment_id, grader_id) with one grouped query
+    """
+    submissions = Submission.objects.filter(
+        student__student__course=F("assignment__course"),
+        student__student__deleted=False,
+        submitted=True
+    )
+    if course:
+        submissions = submissions.filter(assignment__course=course)
+    rows = submissions.values("assignment", "student__student__grader").annotate(
+        submitted=Count("id"),
+        graded=_conditional_count(Q(graded=True))
+    )
+    return {
+        (row["assignment"], row["student__student__grader"]): (
+            row["submitted"],
+            row["graded"],
+            row["submitted"] - row["graded"]
+        )
+        for row in rows
+    }
+
+
+class SubmissionCounter(models.Model):
+    """
+    Denormalized counts of submitted, graded and not graded submissions for an assignment, grouped by the grader
+    the students are assigned to (grader is null for students without a grader). Submissions of deleted students
+    are not counted.
+    """
+    assignment = models.ForeignKey(Assignment, related_name="submission_counters", on_delete=models.CASCADE)
+    grader = models.ForeignKey(Grader, null=True, related_name="submission_counters", on_delete=models.CASCADE)
+    submitted_count = models.IntegerField(default=0)
+    graded_count = models.IntegerField(default=0)
+    not_graded_count = models.IntegerField(default=0)
+
+    objects = SubmissionCounterManager()
+
+    def __str__(self):
+        return "{assignment} ({grader})".format(assignment=self.assignment_id, grader=self.grader_id)
+
+    class Meta:
+        unique_together = (("assignment", "grader"),)
+
+
+class SubmissionArchiveManager(models.Manager):
+    """
+    Manager for SubmissionArchive
+    """
+    def evict(self, max_total_size=None):
+        """
+        Deletes the least recently used ready archives until their total size is at most max_total_size
+        (defaults to settings.SUBMISSION_ARCHIVE_MAX_TOTAL_SIZE)
+        """
+        if max_total_size is None:
+            max_total_size = settings.SUBMISSION_ARCHIVE_MAX_TOTAL_SIZE
+        archives = self.filter(status=SubmissionArchive.READY)
+        total_size = archives.aggregate(total_size=Sum("size"))["total_size"] or 0
+        if total_size <= max_total_size:
+            return
+        least_recently_used = archives.annotate(
+            last_used=Coalesce("last_accessed", "updated_on")
+        ).order_by("last_used", "id")
+        for archive in least_recently_used:
+            archive.delete()
+            total_size -= archive.size
+            if total_size <= max_total_size:
+                return
+
+
+class SubmissionArchive(TimeStampedModel):
+    """
+    A cached zip file of an assignment's submitted submissions, built in the background (see the
+    buildsubmissionarchives command). fingerprint identifies the submissions (and their versions) it contains.
+    """
+    PENDING = "pending"
+    BUILDING = "building"
+    READY = "ready"
+    STATUS_CHOICES = ((PENDING, "Pending"), (BUILDING, "Building"), (READY, "Ready"))
+
+    ALL = "all"
+    NOT_GRADED = "not_graded"
+    SCOPE_CHOICES = ((ALL, "All submissions"), (NOT_GRADED, "Not graded submissions"))
+
+    assignment = models.ForeignKey(Assignment, related_name="archives", on_delete=models.CASCADE)
+    scope = models.CharField(max_length=16, choices=SCOPE_CHOICES)
+    # Null for archives of every student in the course (downloaded by admins)
+    grader = models.ForeignKey(Grader, null=True, related_name="archives", on_delete=models.CASCADE)
+    compression = models.CharField(max_length=16)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    file_name = models.CharField(max_length=512, blank=True)
+    size = models.BigIntegerField(default=0)
+    last_accessed = models.DateTimeField(null=True)  # UTC
+
+    objects = SubmissionArchiveManager()
+
+    def delete_file(self):
+        """
+        Deletes the zip file from storage
+        """
+        if self.file_name:
+            get_archive_storage().delete(self.file_name)
+
+    def __str__(self):
+        return "{assignment} {scope} ({grader}): {status}".format(
+            assignment=self.assignment_id,
+            scope=self.scope,
+            grader=self.grader_id,
+            status=self.status
+        )
+
+    class Meta:
+        unique_together = (("assignment", "scope", "grader", "compression", "fingerprint"),)
+
+
+class GradePassbackManager(models.Manager):
+    """
+    Manager for GradePassback
+    """
+    def enqueue(self, submission):
+        """
+        Queues a submission's grade to be sent to edX, replacing any grade for the same result_id that has not
+        been sent yet. Submissions without a result_id (not launched from a graded edX block) are skipped.
+        """
+        if not submission.result_id:
+            return
+        values = {
+            "submission": submission,
+            "consumer_key": submission.consumer_key,
+            "edx_url": submission.edx_url,
+            "score": submission.edx_grade(),
+            "status": GradePassback.PENDING,
+            "attempts": 0,
+            "next_attempt_at": datetime.utcnow().replace(tzinfo=pytz.UTC),
+            "last_error": "",
+        }
+        if self.filter(result_id=submission.result_id).update(version=F("version") + 1, **values):
+            return
+        try:
+            with transaction.atomic():
+                self.create(result_id=submission.result_id, **values)
+        except IntegrityError:
+            # Queued concurrently
+            self.filter(result_id=submission.result_id).update(version=F("version") + 1, **values)
+
+    def enqueue_many(self, submissions, batch_size=500):
+        """
+        Queues the grades of many submissions (see enqueue()) in bulk, replacing any queued grades for their
+        result_ids. Returns the number of grades queued.
+        """
+        submissions = list({
+            submission.result_id: submission for submission in submissions if submission.result_id
+        }.values())
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        with transaction.atomic():
+            for start in range(0, len(submissions), batch_size):
+                batch = submissions[start:start + batch_size]
+                # A worker sending a replaced grade won't record it as sent, since its row no longer exists
+                self.filter(result_id__in=[submission.result_id for submission in batch]).delete()
+                self.bulk_create([
+                    GradePassback(
+                        result_id=submission.result_id,
+                        submission=submission,
+                        consumer_key=submission.consumer_key,
+                        edx_url=submission.edx_url,
+                        score=submission.edx_grade(),
+                        next_attempt_at=now
+                    )
+                    for submission in batch
+                ])
+        return len(submissions)
+
+
+class GradePassback(TimeStampedModel):
+    """
+    Outbox of grades to send to edX (see the sendgrades command). There is one row per result_id, so a grade
+    that changes before it is sent replaces the queued one and only the latest grade is sent.
+    """
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = ((PENDING, "Pending"), (SENDING, "Sending"), (SENT, "Sent"), (FAILED, "Failed"))
+
+    submission = models.ForeignKey(Submission, null=True, related_name="grade_passbacks", on_delete=models.SET_NULL)
+    result_id = models.CharField(max_length=256, unique=True)  # lis_result_sourcedid
+    consumer_key = models.CharField(max_length=256, null=True)  # oauth_consumer_key
+    edx_url = models.CharField(max_length=256, null=True)  # lis_outcome_service_url
+    score = models.FloatField(null=True)  # 0.00 - 1.00
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    # Incremented whenever a new grade is queued, so a send of an older grade isn't recorded as sending the new one
+    version = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True)  # UTC
+    sent_at = models.DateTimeField(null=True)  # UTC
+    last_error = models.TextField(blank=True)
+
+    objects = GradePassbackManager()
+
+    def __str__(self):
+        return "{result_id}: {status}".format(result_id=self.result_id, status=self.status)
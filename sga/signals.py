@@ -0,0 +1,95 @@
+"""
+Signal handlers
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from sga.backend.dashboards import invalidate_course_dashboards
+from sga.models import Assignment, Grader, NOT_COUNTED, Student, Submission, SubmissionArchive, SubmissionCounter
+
+# Submission fields shown on dashboard pages; saves that only update other fields don't invalidate dashboards
+DASHBOARD_SUBMISSION_FIELDS = {"submitted", "graded", "graded_by", "graded_by_id"}
+
+
+@receiver(post_delete, sender=Submission)
+def remove_deleted_submission_from_counters(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Takes a deleted submission out of SubmissionCounter
+    """
+    SubmissionCounter.objects.update_submission(instance, instance.get_counter_state(), (False, False))
+
+
+@receiver(pre_delete, sender=Student)
+def load_deleted_student_counter_key(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Stores the counter key of a student that is about to be deleted (the instance may be out of date)
+    """
+    instance.deleted_counter_key = Student.objects.get(pk=instance.pk).get_counter_key()
+
+
+@receiver(post_delete, sender=Student)
+def remove_deleted_student_from_counters(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Takes the submissions of a deleted student out of SubmissionCounter. If the student's submissions are
+    deleted in the same cascade, whichever is deleted last finds nothing left to take out, so nothing is
+    counted twice.
+    """
+    SubmissionCounter.objects.move_student(instance, instance.deleted_counter_key, NOT_COUNTED)
+
+
+@receiver(pre_delete, sender=Grader)
+def move_grader_students_counters(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Moves the counts of a grader's students to the "no grader" counters before the grader is deleted (the
+    students' grader is set to null by the delete)
+    """
+    for student in instance.students.filter(deleted=False):
+        SubmissionCounter.objects.move_student(student, student.get_counter_key(), None)
+
+
+@receiver(post_delete, sender=SubmissionArchive)
+def delete_archive_file(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Deletes the zip file of a deleted SubmissionArchive from storage
+    """
+    instance.delete_file()
+
+
+def invalidate_dashboards(course_id):
+    """
+    Invalidates the dashboard payloads of a course now and again when the transaction commits, so that a payload
+    computed by another request before the commit isn't kept
+    """
+    invalidate_course_dashboards(course_id)
+    transaction.on_commit(lambda: invalidate_course_dashboards(course_id))
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Grader)
+@receiver(post_delete, sender=Grader)
+def invalidate_membership_dashboards(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidates the dashboard payloads of the course of a saved or deleted assignment, student or grader
+    """
+    invalidate_dashboards(instance.course_id)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def invalidate_submission_dashboards(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidates the dashboard payloads of the course of a saved or deleted submission
+    """
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not DASHBOARD_SUBMISSION_FIELDS & set(update_fields):
+        return
+    if Submission.assignment.is_cached(instance):
+        course_id = instance.assignment.course_id
+    else:
+        course_id = Assignment.objects.filter(pk=instance.assignment_id).values_list("course_id", flat=True).first()
+    if course_id is not None:
+        invalidate_dashboards(course_id)
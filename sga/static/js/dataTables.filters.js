@@ -1,24 +1,11 @@
-function filterReset(table) {
-    table.search("").columns().search("").draw();
-}
-
-function filterHasNoGrader(table, column) {
-    filterReset(table);
-    table.columns(column).search("(No Grader)").draw();
-}
+// Filters of lists paged on the server, by table id (sent as the "filter" parameter)
+var listFilters = {};
 
-function filterHasGrader(table, column) {
-    filterReset(table);
-    table.columns(column).search("^((?!\(No Grader\)).)*$", true).draw();
-}
-
-function filterGreaterThanZero(table, column) {
-    filterReset(table);
-    table.columns(column).search("^[0-9]*[1-9]$", true).draw();
+function filterReset(table) {
+    filterList(table, "");
 }
 
-function filterEqualToZero(table, column) {
-    filterReset(table);
-    table.columns(column).search("^0+$", true).draw();
+function filterList(table, filter) {
+    listFilters[table.table().node().id] = filter;
+    table.search("").draw();
 }
-
@@ -0,0 +1,66 @@
+// Lists paged, sorted and searched on the server (see sga.backend.datatables)
+
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, "&amp;")
+        .replace(/</g, "&lt;")
+        .replace(/>/g, "&gt;")
+        .replace(/"/g, "&quot;")
+        .replace(/'/g, "&#39;");
+}
+
+// Renders a column as a link to the URL in row[urlKey] (or emptyText if the column has no value)
+function renderLink(urlKey, emptyText) {
+    return function (data, type, row) {
+        if (data === null || data === undefined) {
+            return emptyText || "";
+        }
+        if (type !== "display") {
+            return data;
+        }
+        if (!row[urlKey]) {
+            return escapeHtml(data);
+        }
+        return '<a href="' + escapeHtml(row[urlKey]) + '">' + escapeHtml(data) + "</a>";
+    };
+}
+
+// Renders a column as text (cells are otherwise inserted as HTML)
+function renderText(data, type) {
+    if (data === null || data === undefined) {
+        return "";
+    }
+    return type === "display" ? escapeHtml(data) : data;
+}
+
+function renderYesNo(data) {
+    return data ? "Yes" : "No";
+}
+
+function serverSideTable(selector, url, columns, options) {
+    // The page after the last row of the previous page is fetched with the previous page's cursor (keyset
+    // pagination) instead of an offset
+    var previous = {};
+    return $(selector).DataTable($.extend({
+        serverSide: true,
+        processing: true,
+        searchDelay: 400,
+        columns: columns,
+        ajax: function (data, callback, settings) {
+            data.filter = (typeof listFilters === "undefined") ? "" : (listFilters[settings.nTable.id] || "");
+            var key = JSON.stringify([data.length, data.order, data.search, data.filter]);
+            if (previous.cursor && previous.key === key && data.start === previous.start + data.length) {
+                data.after = previous.cursor;
+            }
+            $.ajax({url: url, data: data, dataType: "json"}).done(function (json) {
+                var rows = json.data;
+                previous = {
+                    key: key,
+                    start: data.start,
+                    cursor: rows.length ? rows[rows.length - 1].cursor : null
+                };
+                callback(json);
+            });
+        }
+    }, options || {}));
+}
@@ -0,0 +1,48 @@
+// Student documents uploaded by the browser straight to the storage (see sga.backend.uploads)
+
+function showUploadError(form, message) {
+    form.find(".direct-upload-error").remove();
+    $("<p class='alert alert-danger direct-upload-error'></p>").text(message).prependTo(form);
+}
+
+// Uploads the file picked in the form with a presigned POST, then submits the form with the file's name instead
+// of the file
+function directUpload(selector) {
+    var form = $(selector);
+    form.on("submit", function (event) {
+        var fileInput = form.find("input[type=file]");
+        var file = fileInput[0].files[0];
+        if (form.data("uploaded") || !file) {
+            return;
+        }
+        event.preventDefault();
+        var button = form.find("button[type=submit]").prop("disabled", true);
+        $.ajax({
+            url: form.data("request-upload-url"),
+            method: "POST",
+            data: {
+                filename: file.name,
+                csrfmiddlewaretoken: form.find("input[name=csrfmiddlewaretoken]").val()
+            },
+            dataType: "json"
+        }).then(function (upload) {
+            var data = new FormData();
+            $.each(upload.fields, function (name, value) {
+                data.append(name, value);
+            });
+            // The storage ignores fields after the file
+            data.append("file", file);
+            return $.ajax({url: upload.url, method: "POST", data: data, processData: false, contentType: false});
+        }).done(function () {
+            form.find("input[name=filename]").val(file.name);
+            fileInput.prop("disabled", true);
+            form.data("uploaded", true);
+            form.submit();
+        }).fail(function (xhr) {
+            button.prop("disabled", false);
+            // The app explains why it refused an upload; the storage's errors are XML
+            var explained = xhr.status === 400 && /^text\/html/.test(xhr.getResponseHeader("Content-Type") || "");
+            showUploadError(form, explained ? xhr.responseText : "The upload failed. Please try again.");
+        });
+    });
+}
@@ -1,20 +1,74 @@
 """
 Test backend functions
 """
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import tracemalloc
 from io import BytesIO
-from zipfile import is_zipfile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED, is_zipfile
 
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
 from django.test import override_settings
 from mock import MagicMock, patch
 
-from sga.backend.authentication import get_role
-from sga.backend.constants import Roles
-from sga.backend.files import convert_illegal_S3_chars, submissions_zip_generator
-from sga.backend.send_grades import send_grade, SendGradeFailure
+from sga.backend.archives import build_pending_archives, get_archive, serve_archive
+from sga.backend.authentication import course_cache, get_course, get_course_roles, get_role, invalidate_course
+from sga.backend.cache import LRUCache
+from sga.backend.constants import Roles, ZipCompression
+from sga.backend.dashboards import (
+    get_assignment_list,
+    get_course_version,
+    get_grader_list,
+    get_student_list_page,
+    invalidate_course_dashboards,
+    STUDENT_LIST_COLUMNS
+)
+from sga.backend.datatables import Column, DataTablesQuery
+from sga.backend.launch import process_lti_launch
+from sga.backend.metrics import LTI, STORAGE, TEMPLATE, MeteredStorage, start_request_metrics, stop_request_metrics
+from sga.backend.sessions import SessionStore
+from sga.backend.files import (
+    convert_illegal_S3_chars,
+    get_archive_storage,
+    get_assignment_submissions,
+    get_compress_type,
+    prefetch_submission_documents,
+    submissions_zip_generator
+)
+from sga.backend.grade_passback import (
+    get_retry_delay,
+    get_syncable_submissions,
+    is_grade_drifted,
+    reconcile_grades,
+    send_pending_grades,
+    sync_grades
+)
+from sga.backend.send_grades import (
+    generate_request_xml,
+    OutcomeClient,
+    OutcomeResponse,
+    parse_response_xml,
+    RateLimiter,
+    send_grade,
+    send_grades,
+    SendGradeFailure
+)
 from sga.backend.validators import validate_file_extension, validate_file_size
-from sga.tests.common import SGATestCase
+from sga.management.benchmarks import (
+    DEFAULT_LIS_OUTCOME_SERVICE_URL,
+    DEFAULT_LTI_PARAMS,
+    OUTCOME_RESPONSE_XML,
+    StubOutcomeService
+)
+from sga.management.commands.benchmarkoutcomexml import etree_request_xml
+from sga.models import Assignment, Course, Grader, GradePassback, Student, Submission, SubmissionArchive
+from sga.tests.common import SGATestCase, TEST_FILE_LOCATION
 
 
 class TestBackend(SGATestCase):
@@ -59,6 +113,218 @@ class TestBackend(SGATestCase):
         self.assertEqual(get_role(grader_user, course.id), Roles.grader)
         self.assertEqual(get_role(user, course.id), Roles.none)
 
+    def test_get_course_roles(self):
+        """
+        Verify that authentication.get_course_roles() resolves roles in every course with one query,
+        preferring admin over grader over student
+        """
+        course = self.get_test_course()
+        other_course = Course.objects.create(edx_id="other_course")
+        grader = self.get_test_grader()
+        Student.objects.create(course=course, user=grader.user)
+        Student.objects.create(course=other_course, user=grader.user)
+        with self.assertNumQueries(1):
+            course_roles = get_course_roles(grader.user)
+        self.assertEqual(course_roles, {str(course.id): Roles.grader, str(other_course.id): Roles.student})
+        course.administrators.add(grader.user)
+        self.assertEqual(get_course_roles(grader.user, course_id=course.id), {str(course.id): Roles.admin})
+        self.assertEqual(get_course_roles(self.get_test_user()), {})
+
+    def test_get_course(self):
+        """
+        Verify that authentication.get_course() caches courses until they are invalidated
+        """
+        course = self.get_test_course()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_course(str(course.id)), course)
+            self.assertEqual(get_course(course.id), course)
+        invalidate_course(course.id)
+        with self.assertNumQueries(1):
+            get_course(course.id)
+        course_cache.clear()
+        with self.assertRaises(Course.DoesNotExist):
+            get_course(course.id + 1)
+
+    def test_process_lti_launch(self):
+        """
+        Verify that launch.process_lti_launch() creates the launch's rows, only writes what a repeated launch
+        changed, and derives the role without querying it again
+        """
+        user = self.get_test_user()
+        lti_params = dict(DEFAULT_LTI_PARAMS)
+        post_params = {
+            "custom_component_display_name": "Assignment",
+            "custom_component_due_date": "2016-06-30 00:00:00",
+            "lis_result_sourcedid": "result_id",
+            "oauth_consumer_key": "key",
+        }
+        course, assignment, role = process_lti_launch(user, lti_params, post_params)
+        self.assertEqual((course, role), (self.default_course, Roles.student))
+        self.assertEqual(
+            (assignment.name, assignment.due_date.isoformat()),
+            ("Assignment", "2016-06-30T00:00:00+00:00")
+        )
+        submission = Submission.objects.get(student=user, assignment=assignment)
+        self.assertEqual(
+            (submission.edx_url, submission.result_id, submission.consumer_key),
+            (DEFAULT_LIS_OUTCOME_SERVICE_URL, "result_id", "key")
+        )
+        # Selects of the course, assignment, memberships and submission, and the transaction savepoint
+        with self.assertNumQueries(6):
+            self.assertEqual(process_lti_launch(user, lti_params, post_params), (course, assignment, Roles.student))
+        post_params.update(custom_component_display_name="Renamed", lis_result_sourcedid="new_result_id")
+        process_lti_launch(user, lti_params, post_params)
+        self.assertEqual(Assignment.objects.get(pk=assignment.pk).name, "Renamed")
+        self.assertEqual(Submission.objects.get(pk=submission.pk).result_id, "new_result_id")
+        Grader.objects.create(course=course, user=user)
+        self.assertEqual(process_lti_launch(user, lti_params, post_params)[2], Roles.grader)
+        lti_params["roles"] = ["Instructor"]
+        self.assertEqual(process_lti_launch(user, lti_params, post_params)[2], Roles.admin)
+        self.assertEqual(get_course_roles(user), {str(course.id): Roles.admin})
+        self.assertFalse(Student.objects.filter(user=user).exists())
+        lti_params["roles"] = ["Student"]
+        self.assertEqual(process_lti_launch(user, lti_params, post_params)[2], Roles.student)
+        self.assertEqual(get_course_roles(user), {str(course.id): Roles.student})
+
+    @override_settings(SESSION_CACHE_TTL_SECONDS=60)
+    def test_session_store(self):
+        """
+        Verify that sessions.SessionStore reads sessions from the cache, and only writes sessions whose data
+        changed, under a new key
+        """
+        session = SessionStore()
+        session["course_roles"] = {"1": Roles.student}
+        session.save()
+        session_key = session.session_key
+        self.assertTrue(Session.objects.filter(session_key=session_key).exists())
+        with self.assertNumQueries(0):
+            session = SessionStore(session_key)
+            self.assertEqual(session["course_roles"], {"1": Roles.student})
+            # Reassigning the same data doesn't write anything
+            session["course_roles"] = {"1": Roles.student}
+            session.save()
+        self.assertEqual(session.session_key, session_key)
+        session["course_roles"] = {"1": Roles.student, "2": Roles.admin}
+        session.save()
+        self.assertNotEqual(session.session_key, session_key)
+        self.assertFalse(SessionStore(session_key).exists(session_key))
+        self.assertEqual(SessionStore(session_key).get("course_roles"), None)
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(session.session_key)["course_roles"]["2"], Roles.admin)
+        session.flush()
+        self.assertFalse(Session.objects.exists())
+
+    def test_dashboard_cache(self):
+        """
+        Verify that dashboard payloads are cached per course and grader, and invalidated by changes to the course's
+        assignments, students, graders and submissions
+        """
+        course = self.default_course
+        grader = self.get_test_grader()
+        submission = self.get_test_submission()
+        Student.objects.filter(pk=self.get_test_student().pk).update(grader=grader)
+        invalidate_course_dashboards(course.id)
+        query = DataTablesQuery({}, STUDENT_LIST_COLUMNS)
+        self.assertEqual([row["not_graded"] for row in get_student_list_page(course, query)["data"]], [0])
+        self.assertEqual([assignment.not_submitted_count for assignment in get_assignment_list(course)], [1])
+        self.assertEqual(get_grader_list(course)[0].number_of_students, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_student_list_page(course, query)["recordsTotal"], 1)
+            self.assertEqual(len(get_assignment_list(course)), 1)
+            self.assertEqual(len(get_grader_list(course)), 1)
+        # Payloads of a grader are cached separately
+        other_grader = self.get_test_grader(username="other_grader")
+        self.assertEqual(get_student_list_page(course, query, grader=other_grader)["recordsTotal"], 0)
+        self.assertEqual(get_student_list_page(course, query, grader=grader)["recordsTotal"], 1)
+        self.assertEqual(get_assignment_list(course, grader=grader)[0].not_submitted_count, 1)
+        # Saves that don't change what dashboards show don't invalidate them
+        version = get_course_version(course.id)
+        submission.update(feedback="feedback")
+        self.assertEqual(get_course_version(course.id), version)
+        submission.submitted = True
+        submission.save()
+        self.assertNotEqual(get_course_version(course.id), version)
+        self.assertEqual([row["not_graded"] for row in get_student_list_page(course, query)["data"]], [1])
+        self.assertEqual(get_assignment_list(course, grader=grader)[0].not_graded_count, 1)
+        self.assertEqual({g.pk: g.not_graded_count for g in get_grader_list(course)}[grader.pk], 1)
+        for change in [
+                lambda: self.get_test_assignment(edx_id="other_assignment"),
+                lambda: self.get_test_student(username="other_student"),
+                lambda: grader.update(max_students=5),
+                submission.delete,
+        ]:
+            version = get_course_version(course.id)
+            change()
+            self.assertNotEqual(get_course_version(course.id), version)
+        self.assertEqual(len(get_assignment_list(course)), 2)
+        self.assertEqual(get_student_list_page(course, query)["recordsTotal"], 2)
+        self.assertEqual({g.pk: g.max_students for g in get_grader_list(course)}[grader.pk], 5)
+
+    def test_datatables_query(self):
+        """
+        Verify that DataTablesQuery reads the paging, sorting and filtering parameters of DataTables requests, and
+        pages querysets with offsets or after a cursor, and lists of rows
+        """
+        columns = [Column("username", "user__username", True), Column("not_graded", "not_graded", False)]
+        query = DataTablesQuery({"draw": "2", "start": "-5", "length": "-1", "filter": "unknown"}, columns)
+        self.assertEqual(
+            (query.draw, query.start, query.length, query.order_column, query.filter, query.after),
+            (2, 0, settings.DATATABLES_MAX_PAGE_LENGTH, columns[0], "", None)
+        )
+        query = DataTablesQuery({
+            "columns[1][data]": "not_graded",
+            "order[0][column]": "1",
+            "order[0][dir]": "desc",
+            "length": "2",
+            "filter": "some",
+        }, columns, filters=["some"])
+        self.assertEqual((query.order_column, query.descending, query.filter), (columns[1], True, "some"))
+        rows = [{"username": name, "not_graded": count} for name, count in [("a", 1), ("b", 0), ("c", 3), ("d", 2)]]
+        page = query.page_rows(rows, search_keys=["username"], filters={"some": lambda row: row["not_graded"] > 0})
+        self.assertEqual(
+            (page["recordsTotal"], page["recordsFiltered"], [row["username"] for row in page["data"]]),
+            (4, 3, ["c", "d"])
+        )
+        # Queryset pages have cursors for fetching the next page
+        for username in ["student_b", "student_a", "student_c"]:
+            self.get_test_student(username=username)
+        students = Student.objects.select_related("user")
+        query = DataTablesQuery({"length": "2"}, columns)
+        page = query.page_queryset(students, lambda student: {"username": student.user.username})
+        self.assertEqual([row["username"] for row in page["data"]], ["student_a", "student_b"])
+        query = DataTablesQuery({"length": "2", "after": page["data"][-1]["cursor"]}, columns)
+        self.assertEqual(query.after, ("student_b", Student.objects.get(user__username="student_b").pk))
+        with self.assertNumQueries(2):
+            page = query.page_queryset(students, lambda student: {"username": student.user.username})
+        self.assertEqual([row["username"] for row in page["data"]], ["student_c"])
+        # Cursors for another sort order are ignored
+        cursor = page["data"][-1]["cursor"]
+        self.assertIsNone(DataTablesQuery({"after": cursor, "order[0][dir]": "desc"}, columns).after)
+        self.assertIsNone(DataTablesQuery({"after": "not json"}, columns).after)
+
+    def test_lru_cache(self):  # pylint: disable=no-self-use
+        """
+        Verify that LRUCache evicts the least recently used entries and expires entries after the ttl
+        """
+        now = [0]
+        cache = LRUCache(2, 10, timer=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        now[0] = 10
+        assert cache.get("a") is None
+        assert len(cache) == 1
+        cache.delete("c")
+        assert cache.get("c", "missing") == "missing"
+        disabled_cache = LRUCache(2, 0)
+        disabled_cache.set("a", 1)
+        assert disabled_cache.get("a") is None
+
     def test_convert_illegal_S3_chars(self):
         """
         Verify that convert_illegal_S3_chars returns the correct conversions
@@ -71,9 +337,55 @@ class TestBackend(SGATestCase):
         for unconverted, converted in CONVERSIONS.items():
             self.assertEqual(convert_illegal_S3_chars(unconverted), converted)
 
+    def test_generate_request_xml(self):
+        """
+        Tests that generate_request_xml() fills in escaped values, and serializes empty values like ElementTree
+        """
+        self.assertEqual(
+            generate_request_xml("id", "replaceResult", "a&b<c>", 0.5),
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<imsx_POXEnvelopeRequest xmlns="http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0">'
+            "<imsx_POXHeader><imsx_POXRequestHeaderInfo><imsx_version>V1.0</imsx_version>"
+            "<imsx_messageIdentifier>id</imsx_messageIdentifier></imsx_POXRequestHeaderInfo></imsx_POXHeader>"
+            "<imsx_POXBody><replaceResultRequest><resultRecord><sourcedGUID><sourcedId>a&amp;b&lt;c&gt;</sourcedId>"
+            "</sourcedGUID><result><resultScore><language>en</language><textString>0.5</textString></resultScore>"
+            "</result></resultRecord></replaceResultRequest></imsx_POXBody></imsx_POXEnvelopeRequest>"
+        )
+        self.assertEqual(
+            generate_request_xml("", "readResult", None, None),
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<imsx_POXEnvelopeRequest xmlns="http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0">'
+            "<imsx_POXHeader><imsx_POXRequestHeaderInfo><imsx_version>V1.0</imsx_version>"
+            "<imsx_messageIdentifier /></imsx_POXRequestHeaderInfo></imsx_POXHeader>"
+            "<imsx_POXBody><readResultRequest><resultRecord><sourcedGUID><sourcedId /></sourcedGUID>"
+            "</resultRecord></readResultRequest></imsx_POXBody></imsx_POXEnvelopeRequest>"
+        )
+        for operation in ["replaceResult", "readResult", "deleteResult"]:
+            request = ("id", operation, "result_id", 1 if operation == "replaceResult" else None)
+            self.assertEqual(generate_request_xml(*request), etree_request_xml(*request))
+
+    def test_parse_response_xml(self):
+        """
+        Tests that parse_response_xml() extracts the status and score of outcome responses
+        """
+        self.assertEqual(
+            parse_response_xml(OUTCOME_RESPONSE_XML.format(code_major="success", body="<replaceResultResponse />")),
+            OutcomeResponse(code_major="success", description=None, score=None)
+        )
+        self.assertEqual(
+            parse_response_xml(
+                "<x:imsx_statusInfo><x:imsx_codeMajor> failure </x:imsx_codeMajor>"
+                "<x:imsx_description>Result &amp; score</x:imsx_description></x:imsx_statusInfo>"
+                "<readResultResponse><result><resultScore><language>en</language><textString>0.5</textString>"
+                "</resultScore></result></readResultResponse>"
+            ),
+            OutcomeResponse(code_major="failure", description="Result & score", score="0.5")
+        )
+        self.assertEqual(parse_response_xml(""), OutcomeResponse(code_major=None, description=None, score=None))
+
     @patch(
-        "oauth2.Client.request",
-        MagicMock(return_value=("", "<imsx_codeMajor>success</imsx_codeMajor>"))
+        "sga.backend.send_grades.OutcomeClient.post",
+        MagicMock(return_value=(200, "<imsx_codeMajor>success</imsx_codeMajor>"))
     )
     @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
     def test_send_grade(self):  # pylint: disable=no-self-use
@@ -84,7 +396,7 @@ class TestBackend(SGATestCase):
         # Call this to assert that it does NOT raise Exception
         send_grade("key", "url", "result_id", 1)
 
-    @patch("oauth2.Client.request", MagicMock(return_value=(MagicMock(status="Bad"), "")))
+    @patch("sga.backend.send_grades.OutcomeClient.post", MagicMock(return_value=(500, "")))
     @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
     def test_bad_send_grade(self):  # pylint: disable=no-self-use
         """
@@ -92,6 +404,239 @@ class TestBackend(SGATestCase):
         """
         self.assertRaises(SendGradeFailure, send_grade, "key", "url", "result_id", None)
 
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_send_grade_to_outcome_service(self):  # pylint: disable=no-self-use
+        """
+        Tests that send_grade() posts a signed replaceResult request to the outcome service
+        """
+        with StubOutcomeService() as service:
+            send_grade("key", service.url, "result_id", 0.5)
+            service.fail = True
+            self.assertRaises(SendGradeFailure, send_grade, "key", service.url, "result_id", 0.5)
+        request = service.requests[0]
+        self.assertIn("<sourcedId>result_id</sourcedId>", request["body"])
+        self.assertIn("<textString>0.5</textString>", request["body"])
+        # Some LTI clients require the header to be capitalized
+        self.assertIn("Authorization", request["headers"].keys())
+        self.assertTrue(request["headers"]["Authorization"].startswith("OAuth "))
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret", "other_key": "other_secret"})
+    def test_send_grades(self):
+        """
+        Tests that send_grades() reuses connections to the outcome host, and returns errors in order
+        """
+        with StubOutcomeService() as service:
+            grades = [("key", service.url, "result_{}".format(i), 0.5) for i in range(5)]
+            grades.insert(2, ("invalid_key", service.url, "result", 0.5))
+            grades.append(("other_key", service.url, "result", 0.5))
+            errors = send_grades(grades, concurrency=1)
+        self.assertEqual([error is None for error in errors], [True, True, False, True, True, True, True])
+        self.assertIsInstance(errors[2], SendGradeFailure)
+        self.assertEqual(len(service.requests), 6)
+        self.assertEqual(len({request["client_address"] for request in service.requests}), 1)
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_send_grades_metrics(self):
+        """
+        Verify that grades sent while recording request metrics (in the thread pool) are recorded as LTI calls
+        """
+        with StubOutcomeService() as service:
+            grades = [("key", service.url, "result_{}".format(i), 0.5) for i in range(3)]
+            send_grades(grades, concurrency=2)
+            metrics = start_request_metrics()
+            try:
+                send_grades(grades, concurrency=2)
+            finally:
+                stop_request_metrics()
+        calls, seconds, _ = metrics.get(LTI)
+        self.assertEqual(calls, 3)
+        self.assertGreater(seconds, 0)
+
+    @override_settings(METERED_FILE_STORAGE="django.core.files.storage.FileSystemStorage")
+    def test_metered_storage(self):
+        """
+        Verify that MeteredStorage records storage calls and bytes, and delegates to METERED_FILE_STORAGE
+        """
+        storage = MeteredStorage(location=TEST_FILE_LOCATION)
+        name = storage.save("unmetered.txt", ContentFile(b"unmetered"))
+        metrics = start_request_metrics()
+        try:
+            name = storage.save("metered.txt", ContentFile(b"0123456789"))
+            with storage.open(name) as opened:
+                self.assertEqual(opened.read(), b"0123456789")
+            self.assertTrue(storage.exists(name))
+            self.assertEqual(storage.path(name), os.path.join(TEST_FILE_LOCATION, name))
+            storage.delete(name)
+        finally:
+            self.assertIs(stop_request_metrics(), metrics)
+        calls, _, size = metrics.get(STORAGE)
+        self.assertEqual((calls, size), (4, 20))
+        self.assertEqual(metrics.get(TEMPLATE), (0, 0.0, 0))
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_outcome_client(self):
+        """
+        Tests that OutcomeClient pools connections per host, caches consumers, and signs requests
+        """
+        client = OutcomeClient(max_idle_connections=4)
+        with StubOutcomeService() as service:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(
+                    lambda i: client.post("key", service.url, "body {}".format(i)), range(20)
+                ))
+            # Closed idle connections are replaced
+            client.close()
+            client.post("key", service.url, "body")
+            unpooled = OutcomeClient(max_idle_connections=0)
+            for _ in range(2):
+                unpooled.post("key", service.url, "body")
+        self.assertTrue(all(status == 200 for status, _ in results))
+        self.assertTrue(all("<imsx_codeMajor>success</imsx_codeMajor>" in content for _, content in results))
+        self.assertEqual(len(service.requests), 23)
+        self.assertLessEqual(len({request["client_address"] for request in service.requests[:20]}), 4)
+        self.assertEqual(len({request["client_address"] for request in service.requests[20:]}), 3)
+        self.assertIs(client.get_consumer("key"), client.get_consumer("key"))
+        authorization = service.requests[0]["headers"]["Authorization"]
+        self.assertTrue(authorization.startswith('OAuth realm="http://127.0.0.1:'))
+        self.assertIn('oauth_consumer_key="key"', authorization)
+        self.assertIn("oauth_body_hash=", authorization)
+        self.assertRaises(SendGradeFailure, client.post, "not_key", service.url, "body")
+        self.assertRaises(SendGradeFailure, client.post, "key", "ftp://example.com/outcome", "body")
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_sync_grades(self):
+        """
+        Tests that sync_grades() sends the grades of graded submissions and records the results on the submissions
+        """
+        course = self.get_test_course()
+        with StubOutcomeService() as service:
+            for i in range(4):
+                submission = self.get_test_submission(student_username="sync_student_{}".format(i))
+                submission.update(
+                    result_id="result_{}".format(i),
+                    edx_url=service.url,
+                    consumer_key="key",
+                    graded=i > 0,
+                    grade=10 * i
+                )
+            submission.update(consumer_key="invalid_key")
+            submissions = get_syncable_submissions(course)
+            self.assertEqual(submissions.count(), 3)
+            results = list(sync_grades(submissions, concurrency=2, batch_size=2))
+        self.assertEqual(len(service.requests), 2)
+        self.assertEqual([error is None for _, error in results], [True, True, False])
+        self.assertEqual(
+            list(submissions.order_by("id").values_list("grade_sync_status", flat=True)),
+            [GradePassback.SENT, GradePassback.SENT, GradePassback.FAILED]
+        )
+        self.assertIn("Invalid consumer_key", Submission.objects.get(pk=submission.pk).grade_sync_error)
+        self.assertEqual(list(get_syncable_submissions(course, unsynced_only=True)), [submission])
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_reconcile_grades(self):
+        """
+        Tests that reconcile_grades() reads the edX grades of submissions in batches, resuming after an id
+        """
+        course = self.get_test_course()
+        with StubOutcomeService() as service:
+            submissions = []
+            for i in range(4):
+                submission = self.get_test_submission(student_username="reconcile_student_{}".format(i))
+                submission.update(
+                    result_id="result_{}".format(i),
+                    edx_url=service.url,
+                    consumer_key="key",
+                    graded=True,
+                    grade=10 * i
+                )
+                submissions.append(submission)
+            service.grades = {"result_0": 0.0, "result_1": 0.2, "result_2": 0.2}
+            submissions[3].update(consumer_key="invalid_key")
+            batches = list(reconcile_grades(get_syncable_submissions(course), concurrency=2, batch_size=2))
+            resumed = list(reconcile_grades(get_syncable_submissions(course), after_id=submissions[2].id))
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        results = batches[0] + batches[1]
+        self.assertEqual([submission for submission, _, _ in results], submissions)
+        self.assertEqual([edx_grade for _, edx_grade, _ in results], [0.0, 0.2, 0.2, None])
+        self.assertIsInstance(results[3][2], SendGradeFailure)
+        self.assertEqual(
+            [is_grade_drifted(submission, edx_grade) for submission, edx_grade, _ in results[:3]],
+            [False, True, False]
+        )
+        self.assertTrue(is_grade_drifted(submissions[0], None))
+        self.assertEqual([submission for submission, _, _ in resumed[0]], [submissions[3]])
+        self.assertTrue(all("<readResultRequest>" in request["body"] for request in service.requests))
+
+    def test_rate_limiter(self):
+        """
+        Tests that RateLimiter spaces out calls to wait()
+        """
+        now = [10.0]
+        sleeps = []
+        limiter = RateLimiter(4, timer=lambda: now[0], sleep=sleeps.append)
+        for _ in range(3):
+            limiter.wait()
+        self.assertEqual(sleeps, [0.25, 0.5])
+        now[0] = 20.0
+        limiter.wait()
+        self.assertEqual(len(sleeps), 2)
+        unlimited = RateLimiter(None, sleep=sleeps.append)
+        unlimited.wait()
+        unlimited.wait()
+        self.assertEqual(len(sleeps), 2)
+
+    @override_settings(
+        LTI_OAUTH_CREDENTIALS={"key": "secret"},
+        GRADE_PASSBACK_RETRY_DELAY=30,
+        GRADE_PASSBACK_MAX_RETRY_DELAY=100,
+        GRADE_PASSBACK_MAX_ATTEMPTS=2
+    )
+    def test_grade_passback_outbox(self):
+        """
+        Tests that queued grades are sent concurrently, coalesced per result_id and retried with backoff
+        """
+        with StubOutcomeService() as service:
+            submissions = []
+            for i in range(3):
+                submission = self.get_test_submission(student_username="passback_student_{}".format(i))
+                submission.update(result_id="result_{}".format(i), edx_url=service.url, consumer_key="key", grade=50)
+                GradePassback.objects.enqueue(submission)
+                submissions.append(submission)
+            # Only the latest grade for a result_id is sent
+            submissions[0].update(grade=90)
+            GradePassback.objects.enqueue(submissions[0])
+            self.assertEqual(GradePassback.objects.count(), 3)
+            self.assertEqual(send_pending_grades(concurrency=2), (3, 0))
+            self.assertEqual(len(service.requests), 3)
+            body = next(request["body"] for request in service.requests if "result_0" in request["body"])
+            self.assertIn("<textString>0.9</textString>", body)
+            self.assertEqual(GradePassback.objects.filter(status=GradePassback.SENT).count(), 3)
+            self.assertEqual(send_pending_grades(), (0, 0))
+            # Failures are retried after a delay
+            service.fail = True
+            GradePassback.objects.enqueue(submissions[1])
+            self.assertEqual(send_pending_grades(), (0, 1))
+            passback = GradePassback.objects.get(result_id="result_1")
+            self.assertEqual((passback.status, passback.attempts), (GradePassback.PENDING, 1))
+            self.assertIn("Send grades to edX returned", passback.last_error)
+            self.assertEqual(send_pending_grades(), (0, 0))
+            passback.update(next_attempt_at=passback.created_on)
+            self.assertEqual(send_pending_grades(), (0, 1))
+            passback = GradePassback.objects.get(result_id="result_1")
+            self.assertEqual((passback.status, passback.attempts), (GradePassback.FAILED, 2))
+        # The result of the last attempt is recorded on the submissions
+        self.assertEqual(
+            list(Submission.objects.filter(
+                id__in=[submission.id for submission in submissions]
+            ).order_by("id").values_list("grade_sync_status", flat=True)),
+            [GradePassback.SENT, GradePassback.FAILED, GradePassback.SENT]
+        )
+        self.assertEqual([get_retry_delay(attempts) for attempts in range(1, 5)], [30, 60, 100, 100])
+        # Submissions that weren't launched from a graded block have nowhere to send grades
+        submission = self.get_test_submission(student_username="passback_student_3")
+        GradePassback.objects.enqueue(submission)
+        self.assertFalse(GradePassback.objects.filter(submission=submission).exists())
+
     def test_submissions_zip_generator(self):
         """
         Tests submissions_zip_generator()
@@ -100,3 +645,201 @@ class TestBackend(SGATestCase):
         # Since we're getting a stream, unpack streamed response
         zipfile = bytearray("", encoding="utf8").join(submissions_zip_generator(submissions))
         self.assertTrue(is_zipfile(BytesIO(zipfile)))
+
+    @override_settings(ZIP_CHUNK_SIZE=1000, ZIP_SPOOL_MAX_SIZE=2000)
+    def test_submissions_zip_generator_contents(self):
+        """
+        Tests that submissions_zip_generator() streams every document, in order, in chunks
+        """
+        contents = [bytes(str(i), encoding="utf8") * 1000 * i for i in range(1, 6)]
+
+        def get_submissions():
+            """Returns submissions with the test contents"""
+            return [
+                MagicMock(student_document=SimpleUploadedFile("file{}.pdf".format(i), content))
+                for i, content in enumerate(contents)
+            ]
+
+        submissions = get_submissions()
+        chunks = list(submissions_zip_generator(submissions))
+        self.assertGreater(len(chunks), len(submissions))
+        with ZipFile(BytesIO(b"".join(chunks))) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.namelist(), ["file{}.pdf".format(i) for i in range(len(contents))])
+            for i, content in enumerate(contents):
+                self.assertEqual(zip_file.read("file{}.pdf".format(i)), content)
+            self.assertEqual({info.compress_type for info in zip_file.infolist()}, {ZIP_STORED})
+        deflated = b"".join(submissions_zip_generator(get_submissions(), ZipCompression.deflate))
+        with ZipFile(BytesIO(deflated)) as zip_file:
+            self.assertEqual({info.compress_type for info in zip_file.infolist()}, {ZIP_DEFLATED})
+
+    @override_settings(ZIP_CHUNK_SIZE=64 * 1024, ZIP_SPOOL_MAX_SIZE=256 * 1024, ZIP_PREFETCH_DEPTH=2)
+    def test_submissions_zip_generator_memory(self):
+        """
+        Tests that the peak memory used by submissions_zip_generator() is bounded by the chunk and spool sizes,
+        no matter how large the documents are
+        """
+        memory_bound = (settings.ZIP_PREFETCH_DEPTH + 3) * settings.ZIP_SPOOL_MAX_SIZE + 8 * settings.ZIP_CHUNK_SIZE
+        for file_size in [1024 * 1024, 8 * 1024 * 1024]:
+            for compression in [ZipCompression.store, ZipCompression.deflate]:
+                submissions = [
+                    MagicMock(student_document=ContentFile(os.urandom(file_size), name="file{}.pdf".format(i)))
+                    for i in range(3)
+                ]
+                tracemalloc.start()
+                try:
+                    zip_size = sum(len(chunk) for chunk in submissions_zip_generator(submissions, compression))
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                self.assertGreater(zip_size, 3 * file_size)
+                self.assertLess(peak, memory_bound)
+
+    @override_settings(ZIP_STORED_EXTENSIONS=[".pdf"], ZIP_COMPRESSIBILITY_SAMPLE_SIZE=1000)
+    def test_get_compress_type(self):
+        """
+        Tests that get_compress_type() stores already-compressed files and deflates everything else
+        """
+        compressible = BytesIO(b"a" * 2000)
+        incompressible = BytesIO(os.urandom(2000))
+        self.assertEqual(get_compress_type("file.PDF", compressible, ZipCompression.auto), ZIP_STORED)
+        self.assertEqual(get_compress_type("file.txt", compressible, ZipCompression.auto), ZIP_DEFLATED)
+        self.assertEqual(get_compress_type("file.txt", incompressible, ZipCompression.auto), ZIP_STORED)
+        self.assertEqual(incompressible.tell(), 0)
+        self.assertEqual(get_compress_type("file.txt", incompressible, ZipCompression.deflate), ZIP_DEFLATED)
+        self.assertEqual(get_compress_type("file.txt", compressible, ZipCompression.store), ZIP_STORED)
+        with override_settings(ZIP_COMPRESSIBILITY_SAMPLE_SIZE=0):
+            self.assertEqual(get_compress_type("file.txt", incompressible, ZipCompression.auto), ZIP_DEFLATED)
+        self.assertRaises(ValueError, get_compress_type, "file.txt", compressible, "bzip2")
+
+    def test_prefetch_submission_documents(self):
+        """
+        Tests that prefetch_submission_documents() fetches at most depth documents ahead and closes
+        fetched documents that were never consumed
+        """
+        submissions = [
+            MagicMock(student_document=SimpleUploadedFile("file{}.pdf".format(i), b"contents"))
+            for i in range(10)
+        ]
+        fetched = {}
+
+        def fetch_submission_document(submission):
+            """Stand-in for fetching a document from storage"""
+            filename = submission.student_document.name
+            fetched[filename] = BytesIO(filename.encode("utf8"))
+            return fetched[filename]
+
+        with patch("sga.backend.files.fetch_submission_document", fetch_submission_document):
+            documents = prefetch_submission_documents(submissions, depth=2, workers=2)
+            filename, document = next(documents)
+            self.assertEqual(filename, "file0.pdf")
+            self.assertEqual(document.read(), b"file0.pdf")
+            self.assertEqual(next(documents)[0], "file1.pdf")
+            documents.close()
+        # Documents fetched ahead are either cancelled or closed, since they will never be consumed
+        self.assertFalse(fetched.pop("file0.pdf").closed)
+        self.assertFalse(fetched.pop("file1.pdf").closed)
+        self.assertTrue(set(fetched).issubset({"file2.pdf", "file3.pdf"}))
+        self.assertTrue(all(document.closed for document in fetched.values()))
+
+    def create_submitted_submissions(self, count, grader=None):
+        """
+        Creates submitted submissions with documents for the test assignment
+        """
+        submissions = []
+        for i in range(count):
+            student = self.get_test_student(username="archive_student_{}".format(i))
+            student.update(grader=grader)
+            submission = self.get_test_submission(student_username=student.user.username)
+            submission.student_document.save("file.pdf", ContentFile(os.urandom(1000)), save=False)
+            submission.submitted = True
+            submission.save()
+            submissions.append(submission)
+        return submissions
+
+    def test_submission_archives(self):
+        """
+        Tests that archives are queued, built in the background and served, and that older versions are deleted
+        """
+        assignment = self.get_test_assignment()
+        grader = self.get_test_grader()
+        submission = self.create_submitted_submissions(3, grader=grader)[0]
+        submissions = get_assignment_submissions(assignment)
+        self.assertIsNone(get_archive(assignment, submissions))
+        self.assertIsNone(get_archive(assignment, submissions))
+        archive = SubmissionArchive.objects.get()
+        self.assertEqual(archive.status, SubmissionArchive.PENDING)
+        self.assertEqual(build_pending_archives(), 1)
+        archive = get_archive(assignment, submissions)
+        self.assertEqual(archive.status, SubmissionArchive.READY)
+        self.assertTrue(get_archive_storage().exists(archive.file_name))
+        response = serve_archive(archive, "zipname")
+        self.assertEqual(response["Content-Disposition"], "attachment; filename=zipname.zip")
+        with ZipFile(BytesIO(b"".join(response.streaming_content))) as zip_file:
+            self.assertEqual(len(zip_file.namelist()), 3)
+        response.close()
+        self.assertIsNotNone(SubmissionArchive.objects.get(pk=archive.pk).last_accessed)
+        # Changing a submission queues a new archive, which replaces the old one once it is built
+        submission.update(grade=50)
+        self.assertIsNone(get_archive(assignment, submissions))
+        # Archives of a grader's students are separate
+        grader_submissions = get_assignment_submissions(assignment, grader=grader)
+        self.assertIsNone(get_archive(assignment, grader_submissions, grader=grader))
+        self.assertEqual(build_pending_archives(), 2)
+        self.assertFalse(SubmissionArchive.objects.filter(pk=archive.pk).exists())
+        self.assertFalse(get_archive_storage().exists(archive.file_name))
+        self.assertEqual(SubmissionArchive.objects.filter(status=SubmissionArchive.READY).count(), 2)
+        # Archives of submissions that changed before they were built are discarded
+        submission.update(grade=60)
+        self.assertIsNone(get_archive(assignment, submissions))
+        submission.update(grade=70)
+        self.assertEqual(build_pending_archives(), 0)
+        self.assertEqual(SubmissionArchive.objects.count(), 2)
+
+    def test_serve_archive_redirect(self):
+        """
+        Tests that archives in storage without local paths (e.g. S3) are served with a redirect
+        """
+        assignment = self.get_test_assignment()
+        archive = SubmissionArchive.objects.create(
+            assignment=assignment,
+            scope=SubmissionArchive.ALL,
+            compression=ZipCompression.auto,
+            fingerprint="fingerprint",
+            status=SubmissionArchive.READY,
+            file_name="archive.zip"
+        )
+        storage = MagicMock(
+            path=MagicMock(side_effect=NotImplementedError),
+            url=MagicMock(return_value="/archive.zip")
+        )
+        with patch("sga.backend.archives.get_archive_storage", return_value=storage):
+            response = serve_archive(archive, "zipname")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, "/archive.zip")
+
+    def test_submission_archive_eviction(self):
+        """
+        Tests that the least recently used archives are deleted once the archives exceed the size cap
+        """
+        assignment = self.get_test_assignment()
+        storage = get_archive_storage()
+        archives = []
+        for i in range(3):
+            archives.append(SubmissionArchive.objects.create(
+                assignment=assignment,
+                scope=SubmissionArchive.ALL,
+                compression=ZipCompression.auto,
+                fingerprint=str(i),
+                status=SubmissionArchive.READY,
+                file_name=storage.save("archive.zip", ContentFile(b"x" * 100)),
+                size=100
+            ))
+        SubmissionArchive.objects.filter(pk=archives[0].pk).update(
+            last_accessed=archives[2].updated_on + timedelta(minutes=1)
+        )
+        SubmissionArchive.objects.evict(max_total_size=300)
+        self.assertEqual(SubmissionArchive.objects.count(), 3)
+        SubmissionArchive.objects.evict(max_total_size=150)
+        self.assertEqual(list(SubmissionArchive.objects.values_list("id", flat=True)), [archives[0].id])
+        self.assertEqual([storage.exists(archive.file_name) for archive in archives], [True, False, False])
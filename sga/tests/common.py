@@ -10,24 +10,21 @@ from django.test import TestCase, override_settings
 from django.test.client import Client
 from django.contrib.auth import get_user_model
 
-from sga.backend.authentication import get_role
+from sga.backend.authentication import course_cache, get_role
 from sga.backend.constants import Roles
+from sga.backend.dashboards import get_dashboard_cache
+from sga.management.benchmarks import (
+    DEFAULT_ASSIGNMENT_EDX_ID,
+    DEFAULT_LTI_PARAMS,
+    DEFAULT_TEST_COURSE_ID,
+    DEFAULT_USER_USERNAME
+)
 from sga.models import Assignment, Course, Submission, Student, Grader
 
 
 DEFAULT_STUDENT_USERNAME = "test_student"
 DEFAULT_GRADER_USERNAME = "test_grader"
 DEFAULT_ADMIN_USERNAME = "test_admin"
-DEFAULT_USER_USERNAME = "test_user_id"
-DEFAULT_ASSIGNMENT_EDX_ID = "test_assignment"
-DEFAULT_TEST_COURSE_ID = "test_course"
-DEFAULT_LIS_OUTCOME_SERVICE_URL = "lis_outcome_service_url"
-DEFAULT_LTI_PARAMS = {
-    "context_id": DEFAULT_TEST_COURSE_ID,
-    "resource_link_id": DEFAULT_ASSIGNMENT_EDX_ID,
-    "user_id": DEFAULT_USER_USERNAME,
-    "lis_outcome_service_url": DEFAULT_LIS_OUTCOME_SERVICE_URL
-}
 
 
 TEST_FILE_LOCATION = os.path.join(settings.BASE_DIR, "temp_files")
@@ -47,6 +44,8 @@ class SGATestCase(TestCase):
         Common test setup
         """
         super(SGATestCase, self).setUp()
+        course_cache.clear()
+        get_dashboard_cache().clear()
         self.client = Client()
         self.user_model = get_user_model()
         self.default_course = self.get_test_course()
@@ -73,6 +72,8 @@ class SGATestCase(TestCase):
         session["course_roles"] = {}
         session["course_roles"][str(course.id)] = get_role(user, course.id)
         session.save()
+        # The session gets a new key when its data changes (see sga.backend.sessions)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
 
     def log_in_as(self, role, lti_params=None):
         """
@@ -1,10 +1,30 @@
 """
 Test management commands
 """
+import json
+import os
 from io import StringIO
 
+from django.core.management import CommandError
+from django.test import override_settings
+
+from sga.backend.archives import get_submissions_fingerprint
+from sga.backend.constants import ZipCompression
+from sga.management.benchmarks import StubOutcomeService
+from sga.management.commands.backfillsubmissions import BackfillSubmissionsCommand
+from sga.management.commands.benchmarkgradepassback import BenchmarkGradePassbackCommand
+from sga.management.commands.benchmarkoutcomexml import BenchmarkOutcomeXMLCommand
+from sga.management.commands.benchmarksessions import BenchmarkSessionsCommand, ENGINES
+from sga.management.commands.benchmarkviews import BenchmarkViewsCommand, VIEWS
+from sga.management.commands.benchmarkzipcompression import BenchmarkZipCompressionCommand
+from sga.management.commands.buildsubmissionarchives import BuildSubmissionArchivesCommand
 from sga.management.commands.createmockdata import CreateMockDataCommand
-from sga.tests.common import SGATestCase
+from sga.management.commands.reconcilegrades import ReconcileGradesCommand
+from sga.management.commands.rebuildsubmissioncounters import RebuildSubmissionCountersCommand
+from sga.management.commands.sendgrades import SendGradesCommand
+from sga.management.commands.syncgrades import SyncGradesCommand
+from sga.models import Course, GradePassback, Submission, SubmissionArchive, SubmissionCounter
+from sga.tests.common import SGATestCase, TEST_FILE_LOCATION
 
 
 class ManagementTest(SGATestCase):
@@ -19,3 +39,262 @@ class ManagementTest(SGATestCase):
         command = CreateMockDataCommand()
         command.execute(stdout=out)
         self.assertIn("Successfully created mock data.", out.getvalue())
+        course = Course.objects.get(edx_id="course-v1:MITx+B101+2015_T3")
+        self.assertEqual(course.assignments.count(), 2)
+        self.assertEqual(Submission.objects.filter(assignment__course=course).count(), 8)
+        # Running again reuses the existing objects
+        out = StringIO()
+        command.execute(stdout=out)
+        self.assertIn("0 new submissions", out.getvalue())
+        self.assertEqual(Submission.objects.filter(assignment__course=course).count(), 8)
+
+    def test_create_mock_data_in_bulk(self):
+        """
+        Test createmockdata command with several courses, ratios and documents
+        """
+        out = StringIO()
+        CreateMockDataCommand().execute(
+            courses=2,
+            students=30,
+            graders=3,
+            assignments=4,
+            submitted_ratio=0.8,
+            graded_ratio=0.5,
+            documents=True,
+            batch_size=50,
+            stdout=out
+        )
+        self.assertIn("2 courses, 60 students, 6 graders, 8 assignments, 240 new submissions", out.getvalue())
+        course = Course.objects.get(edx_id="course-v1:MITx+B102+2015_T3")
+        self.assertEqual(course.student_set.filter(grader__isnull=False).count(), 30)
+        submissions = Submission.objects.filter(assignment__course=course)
+        submitted = submissions.filter(submitted=True)
+        self.assertTrue(0 < submitted.filter(graded=True).count() < submitted.count() < submissions.count())
+        self.assertFalse(submissions.filter(submitted=False).exclude(student_document="").exists())
+        self.assertFalse(submitted.filter(student_document="").exists())
+        self.assertTrue(os.path.exists(os.path.join(TEST_FILE_LOCATION, submitted.first().student_document.name)))
+        # The counters are rebuilt after the bulk inserts
+        self.assertEqual(
+            SubmissionCounter.objects.get_counts(course=course),
+            SubmissionCounter.objects.compute_counts(course=course)
+        )
+        with self.assertRaises(CommandError):
+            CreateMockDataCommand().execute(graded_ratio=2, stdout=StringIO())
+
+    def test_backfill_submissions(self):
+        """
+        Test backfillsubmissions command
+        """
+        self.get_test_assignment()
+        self.get_test_student()
+        self.get_test_student(username="test_student_2")
+        out = StringIO()
+        command = BackfillSubmissionsCommand()
+        command.execute(stdout=out)
+        self.assertIn("Created 2 submissions.", out.getvalue())
+        self.assertEqual(Submission.objects.count(), 2)
+        # Running again should not create any more submissions
+        out = StringIO()
+        command.execute(stdout=out)
+        self.assertIn("Created 0 submissions.", out.getvalue())
+
+    def test_rebuild_submission_counters(self):
+        """
+        Test rebuildsubmissioncounters command
+        """
+        assignment = self.get_test_assignment()
+        submission = self.get_test_submission()
+        submission.update(submitted=True)
+        command = RebuildSubmissionCountersCommand()
+        out = StringIO()
+        command.execute(verify=True, stdout=out)
+        self.assertIn("Submission counters are up to date.", out.getvalue())
+        # Bypass Submission.save() so that the counters are out of date
+        Submission.objects.filter(pk=submission.pk).update(graded=True)
+        with self.assertRaises(CommandError):
+            command.execute(verify=True, stdout=StringIO())
+        out = StringIO()
+        command.execute(stdout=out)
+        self.assertIn("Successfully rebuilt submission counters.", out.getvalue())
+        self.assertEqual(SubmissionCounter.objects.get_counts(), {(assignment.id, None): (1, 1, 0)})
+        out = StringIO()
+        command.execute(verify=True, course=self.get_test_course().edx_id, stdout=out)
+        self.assertIn("Submission counters are up to date.", out.getvalue())
+
+    def test_benchmark_zip_compression(self):
+        """
+        Test benchmarkzipcompression command
+        """
+        out = StringIO()
+        BenchmarkZipCompressionCommand().execute(stdout=out, files=4, file_size=16, repeat=1, sample_size=1024)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "4 files, 0.1 MB")
+        self.assertEqual([line.split()[0] for line in lines[1:]], ZipCompression.modes)
+
+    def test_benchmark_grade_passback(self):
+        """
+        Test benchmarkgradepassback command
+        """
+        out = StringIO()
+        BenchmarkGradePassbackCommand().execute(stdout=out, grades=4, concurrency=2)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "4 grades, 2 threads")
+        self.assertEqual([line.split()[0] for line in lines[1:]], BenchmarkGradePassbackCommand.modes)
+        self.assertTrue(lines[1].endswith(" 4 connections"))
+
+    def test_benchmark_outcome_xml(self):
+        """
+        Test benchmarkoutcomexml command
+        """
+        out = StringIO()
+        BenchmarkOutcomeXMLCommand().execute(stdout=out, count=10, repeat=1)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "10 envelopes")
+        self.assertEqual(
+            [tuple(line.split()[:2]) for line in lines[1:]],
+            [("generate", "etree"), ("generate", "template"), ("parse", "etree"), ("parse", "regex")]
+        )
+
+    def test_benchmark_sessions(self):
+        """
+        Test benchmarksessions command
+        """
+        out = StringIO()
+        BenchmarkSessionsCommand().execute(stdout=out, requests=20, launch_every=2, change_every=2, rotate_every=5)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            lines[0],
+            "20 requests, a launch every 2, changed every 2 launches, a login every 5 launches"
+        )
+        self.assertEqual([line.split()[0] for line in lines[1:]], ENGINES)
+        # The database engine writes on every launch, and inserts and deletes a session on every login
+        self.assertIn("   0.70 writes/request", lines[1])
+        # The cached engine inserts and deletes a session when launches change its data or log the user in
+        self.assertIn("   0.60 writes/request", lines[-1])
+
+    def test_benchmark_views(self):
+        """
+        Test benchmarkviews command: every staff view takes the same number of queries on a larger dataset
+        """
+        out = StringIO()
+        BenchmarkViewsCommand().execute(stdout=out, sizes=["6:2", "30:4"], repeat=1, check=True)
+        results = json.loads(out.getvalue())["results"]
+        self.assertEqual(len(results), 2 * sum(len(roles) for _, roles in VIEWS))
+        self.assertEqual({result["status"] for result in results}, {200})
+        self.assertEqual(
+            [(result["students"], result["assignments"]) for result in results[::len(results) // 2]],
+            [(6, 2), (30, 4)]
+        )
+        # The datasets are rolled back
+        self.assertFalse(Course.objects.filter(edx_id="course-v1:MITx+B101+2015_T3").exists())
+        with self.assertRaises(CommandError):
+            BenchmarkViewsCommand().execute(stdout=StringIO(), sizes=["6"])
+
+    def test_build_submission_archives(self):
+        """
+        Test buildsubmissionarchives command
+        """
+        archive = SubmissionArchive.objects.create(
+            assignment=self.get_test_assignment(),
+            scope=SubmissionArchive.ALL,
+            compression=ZipCompression.auto,
+            fingerprint=get_submissions_fingerprint(Submission.objects.none())
+        )
+        out = StringIO()
+        BuildSubmissionArchivesCommand().execute(stdout=out, once=True)
+        self.assertEqual(out.getvalue(), "Built 1 submission archives.\n")
+        self.assertEqual(SubmissionArchive.objects.get(pk=archive.pk).status, SubmissionArchive.READY)
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_send_grades(self):
+        """
+        Test sendgrades command
+        """
+        submission = self.get_test_submission()
+        with StubOutcomeService() as service:
+            submission.update(result_id="result_id", edx_url=service.url, consumer_key="key", grade=80)
+            GradePassback.objects.enqueue(submission)
+            out = StringIO()
+            SendGradesCommand().execute(stdout=out, once=True, concurrency=2)
+        self.assertEqual(out.getvalue(), "Sent 1 grades, 0 failed.\n")
+        self.assertEqual(len(service.requests), 1)
+        self.assertEqual(GradePassback.objects.get().status, GradePassback.SENT)
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_sync_grades(self):
+        """
+        Test syncgrades command
+        """
+        submission = self.get_test_submission()
+        with StubOutcomeService() as service:
+            submission.update(result_id="result_id", edx_url=service.url, consumer_key="key", graded=True, grade=80)
+            out = StringIO()
+            SyncGradesCommand().execute(stdout=out, course=self.default_course.edx_id, concurrency=2)
+        self.assertEqual(out.getvalue(), "{assignment} {username}: sent\nSent 1 grades, 0 failed.\n".format(
+            assignment=submission.assignment.edx_id,
+            username=submission.student.username
+        ))
+        self.assertEqual(Submission.objects.get(pk=submission.pk).grade_sync_status, GradePassback.SENT)
+        with self.assertRaises(CommandError):
+            SyncGradesCommand().execute(stdout=StringIO(), course="missing_course")
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_reconcile_grades(self):
+        """
+        Test reconcilegrades command
+        """
+        submissions = []
+        with StubOutcomeService() as service:
+            for i in range(3):
+                submission = self.get_test_submission(student_username="reconcile_student_{}".format(i))
+                submission.update(
+                    result_id="result_{}".format(i),
+                    edx_url=service.url,
+                    consumer_key="key",
+                    graded=True,
+                    grade=50
+                )
+                submissions.append(submission)
+            service.grades = {"result_0": 0.5, "result_1": 0.4}
+            os.makedirs(TEST_FILE_LOCATION, exist_ok=True)
+            checkpoint_path = os.path.join(TEST_FILE_LOCATION, "reconcile.json")
+            # Resume after the first submission, as if interrupted
+            ReconcileGradesCommand.save_checkpoint(checkpoint_path, {
+                "course": self.default_course.edx_id,
+                "assignment": None,
+                "last_id": submissions[0].id,
+                "checked": 1,
+                "matched": 1,
+                "drifted": 0,
+                "failed": 0,
+                "queued": 0,
+            })
+            out = StringIO()
+            ReconcileGradesCommand().execute(
+                stdout=out,
+                course=self.default_course.edx_id,
+                fix=True,
+                rate=0,
+                checkpoint=checkpoint_path,
+                batch_size=1
+            )
+        self.assertEqual(out.getvalue().splitlines(), [
+            "Resuming after submission {id}.".format(id=submissions[0].id),
+            "test_assignment reconcile_student_1: local 0.5, edX 0.4",
+            "test_assignment reconcile_student_2: local 0.5, edX none",
+            "Checked 3 grades: 1 match, 2 differ, 0 failed.",
+            "Queued 2 grades to send.",
+        ])
+        self.assertEqual(len(service.requests), 2)
+        self.assertFalse(os.path.exists(checkpoint_path))
+        self.assertEqual(
+            set(GradePassback.objects.values_list("result_id", flat=True)),
+            {"result_1", "result_2"}
+        )
+        with self.assertRaises(CommandError):
+            ReconcileGradesCommand.save_checkpoint(checkpoint_path, {"course": "other_course", "assignment": None})
+            ReconcileGradesCommand().execute(
+                stdout=StringIO(),
+                course=self.default_course.edx_id,
+                checkpoint=checkpoint_path
+            )
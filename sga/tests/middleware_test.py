@@ -1,14 +1,30 @@
 """
-Tests for the SGAMiddleware
+Tests for the SGAMiddleware and RequestMetricsMiddleware
 """
+import json
+from copy import deepcopy
+
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 from django_auth_lti.backends import LTIAuthBackend
 from mock import MagicMock
 
-from sga.backend.constants import STUDIO_USER_USERNAME
-from sga.middleware import SGAMiddleware
-from sga.tests.common import SGATestCase, DEFAULT_LTI_PARAMS
+from sga.backend.constants import Roles, STUDIO_USER_USERNAME
+from sga.management.benchmarks import DEFAULT_LTI_PARAMS
+from sga.middleware import EXEMPT_PATH, LAUNCH_PATH, PASSTHROUGH_PATH, path_counts, REJECTED_PATH, SGAMiddleware
+from sga.tests.common import SGATestCase
+
+
+def get_metered_templates():
+    """
+    Returns the TEMPLATES setting with the template backend that records rendering time, as it is when request
+    metrics are sampled
+    """
+    templates = deepcopy(settings.TEMPLATES)
+    templates[0]["BACKEND"] = "sga.backend.metrics.MeteredDjangoTemplates"
+    return templates
 
 
 class MiddlewareTest(SGATestCase):
@@ -23,6 +39,7 @@ class MiddlewareTest(SGATestCase):
         request = MagicMock()
         request.LTI = dict(DEFAULT_LTI_PARAMS)
         request.method = "POST"
+        request.path_info = "/"
         request.lti_initial_request = True
         request.lti_authentication_successful = True
         request.POST = {
@@ -56,6 +73,37 @@ class MiddlewareTest(SGATestCase):
         self.assertFalse(self.get_test_course().has_grader(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_admin(self.get_test_user()))
 
+    def test_middleware_fast_path(self):
+        """
+        Test that the middleware doesn't touch the session for requests that don't need LTI processing, and counts
+        the path each request takes
+        """
+        middleware = SGAMiddleware()
+        counts = dict(path_counts)
+        for path_info, initial_request in [
+                ("/static/css/sga.css", True),
+                (reverse("studio_message_page"), True),
+                (reverse("sga_index"), False),
+                (reverse("view_assignment", kwargs={"course_id": 1, "assignment_id": 1}), False),
+        ]:
+            request = self.get_test_request()
+            request.path_info = path_info
+            request.lti_initial_request = initial_request
+            request.session = MagicMock()
+            self.assertIsNone(middleware.process_request(request))
+            self.assertEqual(request.session.mock_calls, [])
+        request = self.get_test_request()
+        request.session = {"course_roles": {"0": "student"}}
+        middleware.process_request(request)
+        self.assertEqual(request.session["course_roles"]["0"], "student")
+        request = self.get_test_request()
+        request.lti_authentication_successful = False
+        middleware.process_request(request)
+        self.assertEqual(path_counts[EXEMPT_PATH] - counts.get(EXEMPT_PATH, 0), 2)
+        self.assertEqual(path_counts[PASSTHROUGH_PATH] - counts.get(PASSTHROUGH_PATH, 0), 2)
+        self.assertEqual(path_counts[LAUNCH_PATH] - counts.get(LAUNCH_PATH, 0), 1)
+        self.assertEqual(path_counts[REJECTED_PATH] - counts.get(REJECTED_PATH, 0), 1)
+
     def test_user_not_authenticated(self):
         """
         Test that the middleware does not allow an unauthenticated user through
@@ -149,3 +197,54 @@ class MiddlewareTest(SGATestCase):
         self.assertTrue(self.get_test_course().has_student(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_grader(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_admin(self.get_test_user()))
+
+
+@override_settings(
+    MIDDLEWARE_CLASSES=("sga.middleware.RequestMetricsMiddleware",) + tuple(settings.MIDDLEWARE_CLASSES),
+    TEMPLATES=get_metered_templates()
+)
+class RequestMetricsMiddlewareTest(SGATestCase):
+    """
+    Tests for the RequestMetricsMiddleware
+    """
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SERVER_TIMING=True)
+    def test_request_metrics(self):
+        """
+        Test that sampled requests are logged and get a Server-Timing header
+        """
+        self.log_in_as(Roles.admin)
+        url = reverse("view_student_list", kwargs={"course_id": self.get_test_course().id})
+        with self.assertLogs("sga.middleware", level="INFO") as logs:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        metrics = json.loads(logs.output[-1].split("Request metrics: ", 1)[1])
+        self.assertEqual(metrics["view"], "view_student_list")
+        self.assertEqual(metrics["status"], 200)
+        self.assertGreater(metrics["queries"], 0)
+        self.assertGreater(metrics["template_ms"], 0)
+        self.assertEqual((metrics["storage_calls"], metrics["lti_calls"]), (0, 0))
+        timings = [timing.split(";")[0] for timing in response["Server-Timing"].split(", ")]
+        self.assertEqual(timings, ["db", "storage", "lti", "template", "total"])
+        self.assertIn('desc="{queries} queries"'.format(queries=metrics["queries"]), response["Server-Timing"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SERVER_TIMING=False)
+    def test_request_metrics_without_server_timing(self):
+        """
+        Test that sampled requests are logged without a Server-Timing header if it is disabled
+        """
+        self.log_in_as(Roles.admin)
+        url = reverse("view_student_list", kwargs={"course_id": self.get_test_course().id})
+        with self.assertLogs("sga.middleware", level="INFO"):
+            response = self.client.get(url)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_request_metrics_not_sampled(self):
+        """
+        Test that requests that aren't sampled aren't measured
+        """
+        self.log_in_as(Roles.admin)
+        response = self.client.get(reverse("view_student_list", kwargs={"course_id": self.get_test_course().id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Server-Timing"))
@@ -4,7 +4,7 @@ Test end to end django models.
 from datetime import datetime
 from time import sleep
 
-from sga.models import Course, Submission
+from sga.models import Course, Grader, Student, Submission, SubmissionCounter
 from sga.tests.common import SGATestCase
 
 
@@ -49,6 +49,39 @@ class TestModels(SGATestCase):
         submission.update(graded=True, graded_by=grader.user)
         self.assertEqual(grader.not_graded_submissions_count(), 0)
 
+    def test_grader_with_stats(self):
+        """
+        Tests the .with_stats() method on the Grader QuerySet
+        """
+        grader = self.get_test_grader()
+        grader_2 = self.get_test_grader(username="test_grader_2")
+        student = self.get_test_student()
+        student.update(grader=grader)
+        student_2 = self.get_test_student(username="test_student_2")
+        student_2.update(grader=grader)
+        deleted_student = self.get_test_student(username="test_student_3")
+        deleted_student.update(grader=grader_2, deleted=True)
+        self.get_test_submission().update(submitted=True)
+        self.get_test_submission(student_username="test_student_2").update(
+            submitted=True,
+            graded=True,
+            graded_by=grader_2.user
+        )
+        graders = {g.id: g for g in Grader.objects.with_stats()}
+        self.assertEqual(len(graders), 2)
+        for grader_with_stats in graders.values():
+            self.assertEqual(grader_with_stats.number_of_students, grader_with_stats.get_number_of_students())
+            self.assertEqual(
+                grader_with_stats.available_student_slots,
+                grader_with_stats.available_student_slots_count()
+            )
+            self.assertEqual(grader_with_stats.graded_count, grader_with_stats.graded_submissions_count())
+            self.assertEqual(grader_with_stats.not_graded_count, grader_with_stats.not_graded_submissions_count())
+        self.assertEqual(graders[grader.id].number_of_students, 2)
+        self.assertEqual(graders[grader.id].not_graded_count, 1)
+        self.assertEqual(graders[grader_2.id].graded_count, 1)
+        self.assertEqual(graders[grader_2.id].available_student_slots, grader_2.max_students)
+
     def test_course_has_student(self):
         """
         Tests the .has_student() method on Course
@@ -109,6 +142,97 @@ class TestModels(SGATestCase):
         # Second submission is graded, so count should be back at 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 0)
 
+    def test_course_get_submission_counts_by_student(self):
+        """
+        Tests the .get_submission_counts_by_student() method on Course
+        """
+        course = self.get_test_course()
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        student.grader = grader
+        student.save()
+        student_2 = self.get_test_student(username="test_student_2")
+        self.assertEqual(course.get_submission_counts_by_student(), {})
+        submission = self.get_test_submission()
+        submission.update(submitted=True)
+        self.get_test_submission(student_username="test_student_2").update(submitted=True, graded=True)
+        Submission.objects.create(
+            student=student.user,
+            assignment=self.get_test_assignment(edx_id="test_assignment_2"),
+            submitted=True,
+            graded=True
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(course.get_submission_counts_by_student(), {
+                student.user.id: {"submitted": 2, "graded": 1, "not_graded": 1},
+                student_2.user.id: {"submitted": 1, "graded": 1, "not_graded": 0}
+            })
+        self.assertEqual(course.get_submission_counts_by_student(grader=grader), {
+            student.user.id: {"submitted": 2, "graded": 1, "not_graded": 1}
+        })
+        # Counts should agree with the per-student method
+        for stdnt in [student, student_2]:
+            self.assertEqual(
+                course.get_submission_counts_by_student()[stdnt.user.id]["not_graded"],
+                course.not_graded_submissions_count_by_student(stdnt)
+            )
+
+    def test_course_get_submission_counts_by_assignment(self):
+        """
+        Tests the .get_submission_counts_by_assignment() method on Course
+        """
+        course = self.get_test_course()
+        assignment = self.get_test_assignment()
+        assignment_2 = self.get_test_assignment(edx_id="test_assignment_2")
+        grader = self.get_test_grader()
+        grader_2 = self.get_test_grader(username="test_grader_2")
+        student = self.get_test_student()
+        student.grader = grader
+        student.save()
+        self.get_test_student(username="test_student_2")
+        # No submissions yet, so every student is counted as not submitted
+        self.assertEqual(course.get_submission_counts_by_assignment(), {
+            assignment.id: {"not_submitted": 2, "not_graded": 0, "graded": 0},
+            assignment_2.id: {"not_submitted": 2, "not_graded": 0, "graded": 0}
+        })
+        self.assertEqual(course.get_submission_counts_by_assignment(grader=grader), {
+            assignment.id: {"not_submitted": 1, "not_graded": 0, "graded": 0},
+            assignment_2.id: {"not_submitted": 1, "not_graded": 0, "graded": 0}
+        })
+        submission = self.get_test_submission()  # Uses get_test_assignment() and get_test_student()
+        submission.update(submitted=True)
+        submission_2 = self.get_test_submission(student_username="test_student_2")
+        submission_2.update(submitted=True, graded=True, graded_by=grader.user)
+        counts = course.get_submission_counts_by_assignment()
+        self.assertEqual(counts[assignment.id], {"not_submitted": 0, "not_graded": 1, "graded": 1})
+        self.assertEqual(counts[assignment_2.id], {"not_submitted": 2, "not_graded": 0, "graded": 0})
+        # Grader's graded count includes the submission of a student who is not assigned to the grader
+        counts = course.get_submission_counts_by_assignment(grader=grader)
+        self.assertEqual(counts[assignment.id], {"not_submitted": 0, "not_graded": 1, "graded": 1})
+        counts = course.get_submission_counts_by_assignment(grader=grader_2)
+        self.assertEqual(counts[assignment.id], {"not_submitted": 0, "not_graded": 0, "graded": 0})
+        # Counts should agree with the per-assignment methods
+        for assgnmnt in [assignment, assignment_2]:
+            self.assertEqual(
+                course.get_submission_counts_by_assignment()[assgnmnt.id],
+                {
+                    "not_submitted": assgnmnt.not_submitted_submissions_count(),
+                    "not_graded": assgnmnt.not_graded_submissions_count(),
+                    "graded": assgnmnt.graded_submissions_count()
+                }
+            )
+            self.assertEqual(
+                course.get_submission_counts_by_assignment(grader=grader)[assgnmnt.id],
+                {
+                    "not_submitted": assgnmnt.not_submitted_submissions_count_by_grader(grader=grader),
+                    "not_graded": assgnmnt.not_graded_submissions_count_by_grader(grader=grader),
+                    "graded": assgnmnt.graded_submissions_count_by_grader(
+                        grader=grader,
+                        limit_to_current_students=False
+                    )
+                }
+            )
+
     def test_assignment_graded_submissions_count(self):
         """
         Tests the .graded_submissions_count() method on Assignment
@@ -234,6 +358,34 @@ class TestModels(SGATestCase):
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader_user=grader.user), 0)
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader=grader_2), 0)
 
+    def test_assignment_get_submission_statuses(self):
+        """
+        Tests the .get_submission_statuses() method on Assignment
+        """
+        assignment = self.get_test_assignment()
+        student_user = self.get_test_student_user()
+        self.assertEqual(assignment.get_submission_statuses(), {})
+        submission = self.get_test_submission()  # Uses get_test_assignment() and get_test_student()
+        self.assertEqual(assignment.get_submission_statuses(), {student_user.id: (False, False)})
+        submission.update(submitted=True, graded=True)
+        self.assertEqual(assignment.get_submission_statuses(), {student_user.id: (True, True)})
+
+    def test_assignment_create_missing_submissions(self):
+        """
+        Tests the .create_missing_submissions() method on Assignment
+        """
+        assignment = self.get_test_assignment()
+        self.get_test_submission()  # Uses get_test_assignment() and get_test_student()
+        student_2 = self.get_test_student(username="test_student_2")
+        deleted_student = self.get_test_student(username="test_student_3")
+        deleted_student.update(deleted=True)
+        self.assertEqual(assignment.create_missing_submissions(), 1)
+        self.assertEqual(
+            set(assignment.submissions.values_list("student", flat=True)),
+            {self.get_test_student_user().id, student_2.user_id}
+        )
+        self.assertEqual(assignment.create_missing_submissions(), 0)
+
     def test_assignment_is_past_due_date(self):
         """
         Tests the .is_past_due_date() method on Assignment
@@ -255,3 +407,79 @@ class TestModels(SGATestCase):
         self.assertEqual(submission.grade_display(), "(Not Graded)")
         submission.update(grade=70)
         self.assertEqual(submission.grade_display(), "70/100 (70%)")
+
+    def assert_submission_counters(self, expected):
+        """
+        Asserts that SubmissionCounter holds the expected counts and that they match the Submissions
+        """
+        self.assertEqual(SubmissionCounter.objects.get_counts(), expected)
+        self.assertEqual(SubmissionCounter.objects.compute_counts(), expected)
+
+    def test_submission_counters(self):
+        """
+        Tests that SubmissionCounter is kept up to date when submissions and students change
+        """
+        assignment = self.get_test_assignment()
+        grader = self.get_test_grader()
+        grader_2 = self.get_test_grader(username="test_grader_2")
+        student = self.get_test_student()
+        student.update(grader=grader)
+        submission = self.get_test_submission()  # Uses get_test_assignment() and get_test_student()
+        self.assert_submission_counters({})
+        submission.update(submitted=True)
+        self.assert_submission_counters({(assignment.id, grader.id): (1, 0, 1)})
+        submission.update(graded=True, graded_by=grader.user)
+        self.assert_submission_counters({(assignment.id, grader.id): (1, 1, 0)})
+        # Saving without changing the state should not change the counters
+        submission.update(grade=80)
+        Submission.objects.get(pk=submission.pk).save()
+        self.assert_submission_counters({(assignment.id, grader.id): (1, 1, 0)})
+        submission.update(submitted=False, graded=False)
+        self.assert_submission_counters({})
+        submission.update(submitted=True)
+        # Reassigning the student moves their counts to the new grader
+        student.update(grader=grader_2)
+        self.assert_submission_counters({(assignment.id, grader_2.id): (1, 0, 1)})
+        # Deleted students are not counted
+        student.update(deleted=True)
+        self.assert_submission_counters({})
+        student.update(deleted=False)
+        self.assert_submission_counters({(assignment.id, grader_2.id): (1, 0, 1)})
+        # Deleting the grader moves the counts to students without a grader
+        grader_2.delete()
+        self.assert_submission_counters({(assignment.id, None): (1, 0, 1)})
+        self.assertEqual(assignment.not_graded_submissions_count(), 1)
+        student.delete()
+        self.assert_submission_counters({})
+        self.assertEqual(assignment.not_graded_submissions_count(), 0)
+
+    def test_submission_counters_stale_instances(self):
+        """
+        Tests that saving out-of-date copies of a submission or student (like concurrent requests do) doesn't
+        apply the same change to SubmissionCounter twice
+        """
+        assignment = self.get_test_assignment()
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        submission = self.get_test_submission()
+        first, second = Submission.objects.get(pk=submission.pk), Submission.objects.get(pk=submission.pk)
+        first.update(submitted=True)
+        second.update(submitted=True)
+        self.assert_submission_counters({(assignment.id, None): (1, 0, 1)})
+        first, second = Student.objects.get(pk=student.pk), Student.objects.get(pk=student.pk)
+        first.update(grader=grader)
+        second.update(grader=grader)
+        self.assert_submission_counters({(assignment.id, grader.id): (1, 0, 1)})
+
+    def test_submission_counters_rebuild(self):
+        """
+        Tests SubmissionCounter.objects.rebuild()
+        """
+        assignment = self.get_test_assignment()
+        submission = self.get_test_submission()
+        submission.update(submitted=True)
+        # Bypass Submission.save() so that the counters are out of date
+        Submission.objects.filter(pk=submission.pk).update(graded=True)
+        self.assertEqual(SubmissionCounter.objects.get_counts(), {(assignment.id, None): (1, 0, 1)})
+        SubmissionCounter.objects.rebuild()
+        self.assert_submission_counters({(assignment.id, None): (1, 1, 0)})
@@ -0,0 +1,179 @@
+"""
+Test that the hot queries in sga.models are answered from indexes
+"""
+import importlib
+import re
+
+from django.db import connection, transaction
+
+from sga.models import Grader, Student, Submission, SubmissionCounter
+from sga.tests.common import SGATestCase
+
+# Tables that must never be read with a full scan by the queries below
+INDEXED_TABLES = [Submission._meta.db_table, Student._meta.db_table, SubmissionCounter._meta.db_table]
+# The names of the indexes created for the queries below
+index_migration = importlib.import_module("sga.migrations.0009_submission_indexes")  # pylint: disable=invalid-name
+INDEX_NAMES = {name for name, _, _ in index_migration.COMPOSITE_INDEXES + index_migration.PARTIAL_INDEXES}
+
+
+def get_query_plan(queryset):
+    """
+    Returns the lines of the query plan of a queryset (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL). On
+    PostgreSQL sequential scans are disabled while planning, so that a sequential scan in the plan means there is
+    no usable index rather than that the seeded tables are small.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def get_full_scans(plan):
+    """
+    Returns the tables a query plan reads with a full table scan
+    """
+    if connection.vendor == "postgresql":
+        pattern = r"Seq Scan on (\w+)"
+    else:
+        # A SCAN over a covering index still reads the whole table; SEARCH uses an index to find rows
+        pattern = r"^SCAN (?:TABLE )?(\w+)"
+    return [match.group(1) for match in (re.search(pattern, line.strip()) for line in plan) if match]
+
+
+class QueryPlanTest(SGATestCase):
+    """
+    Captures the query plans of the key queries of sga.models against seeded tables and fails if one of them
+    reads a submission, student or counter table with a full scan, or stops using the index added for it
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.get_test_course()
+        self.assignment = self.get_test_assignment()
+        self.grader = self.get_test_grader()
+        for number in range(20):
+            student = self.get_test_student(username="plan_student_{number}".format(number=number))
+            student.update(grader=self.grader)
+            Submission.objects.create(
+                student=student.user,
+                assignment=self.assignment,
+                submitted=number % 2 == 0,
+                graded=number % 4 == 0,
+                graded_by=self.grader.user if number % 4 == 0 else None
+            )
+        self.student = Student.objects.get(user__username="plan_student_0")
+
+    def assert_no_full_scans(self, queryset):
+        """
+        Asserts that the plan of queryset reads none of INDEXED_TABLES with a full scan
+        """
+        plan = get_query_plan(queryset)
+        full_scans = [table for table in get_full_scans(plan) if table in INDEXED_TABLES]
+        self.assertEqual(full_scans, [], msg="Full scan in query plan:\n{plan}".format(plan="\n".join(plan)))
+
+    def assert_uses_index(self, queryset, *names):
+        """
+        Asserts that the plan of queryset reads one of the indexes named names (an index_together index, or one of
+        the partial indexes created on PostgreSQL)
+        """
+        self.assertLessEqual(set(names), INDEX_NAMES)
+        plan = get_query_plan(queryset)
+        self.assertTrue(
+            any(name in line for line in plan for name in names),
+            msg="None of {names} in query plan:\n{plan}".format(names=", ".join(names), plan="\n".join(plan))
+        )
+
+    def test_assignment_submission_queries(self):
+        """
+        Queries filtering the submissions of an assignment by status
+        """
+        self.assert_no_full_scans(Submission.objects.filter(assignment=self.assignment, submitted=True))
+        self.assert_no_full_scans(
+            Submission.objects.filter(assignment=self.assignment, submitted=True, graded=False)
+        )
+        self.assert_no_full_scans(
+            Submission.objects.filter(assignment=self.assignment, submitted=True, graded_at=None)
+        )
+        self.assert_uses_index(
+            Submission.objects.filter(assignment=self.assignment, submitted=True, graded=False),
+            "sga_submission_assignment_status",
+            "sga_submission_assignment_not_graded"
+        )
+
+    def test_student_submission_queries(self):
+        """
+        Queries filtering the submissions of a student in a course by status
+        """
+        self.assert_no_full_scans(Submission.objects.filter(
+            assignment__course=self.course,
+            student=self.student.user,
+            submitted=True,
+            graded=False
+        ))
+        self.assert_no_full_scans(Submission.objects.filter(
+            student_id=self.student.user_id,
+            assignment__course_id=self.course.id,
+            submitted=True
+        ).values_list("assignment", "submitted", "graded"))
+        self.assert_no_full_scans(
+            Student.objects.filter(course=self.course, deleted=False).with_stats().order_by("-not_graded_count")
+        )
+        self.assert_no_full_scans(
+            Student.objects.filter(course=self.course, deleted=False).with_submission_status(self.assignment)
+        )
+        self.assert_uses_index(
+            Submission.objects.filter(student=self.student.user, submitted=True, graded=False),
+            "sga_submission_student_status",
+            "sga_submission_student_not_graded"
+        )
+        self.assert_uses_index(
+            Student.objects.filter(course=self.course, deleted=False),
+            "sga_student_course_deleted_grader"
+        )
+
+    def test_grader_submission_queries(self):
+        """
+        Queries counting the submissions graded by a grader and the submissions of a grader's students
+        """
+        self.assert_no_full_scans(Submission.objects.filter(
+            graded_by=self.grader.user,
+            student__student__deleted=False,
+            assignment__course=self.course,
+            submitted=True,
+            graded=True
+        ))
+        self.assert_uses_index(
+            Submission.objects.filter(graded_by=self.grader.user, submitted=True, graded=True),
+            "sga_submission_graded_by_status",
+            "sga_submission_graded_by_graded"
+        )
+        self.assert_no_full_scans(Grader.objects.filter(course=self.course).with_stats())
+        self.assert_no_full_scans(Student.objects.filter(grader=self.grader, deleted=False))
+        self.assert_no_full_scans(
+            SubmissionCounter.objects.filter(grader=self.grader).values("assignment").order_by()
+        )
+
+    def test_course_count_queries(self):
+        """
+        Queries counting the submissions of a course by student and assignment
+        """
+        self.assert_no_full_scans(
+            Submission.objects.filter(assignment__course=self.course, submitted=True).values("student").order_by()
+        )
+        self.assert_no_full_scans(
+            SubmissionCounter.objects.filter(assignment__course=self.course).values("assignment").order_by()
+        )
+
+    def test_student_list_page_queries(self):
+        """
+        Queries of a page of the student list, with an offset and after a keyset cursor
+        """
+        students = Student.objects.filter(course=self.course, deleted=False).with_stats()
+        self.assert_no_full_scans(students.order_by("user__username", "pk")[20:30])
+        self.assert_no_full_scans(
+            students.filter(user__username__gt="plan_student_5").order_by("user__username", "pk")[:10]
+        )
@@ -1,17 +1,24 @@
 """
 Test end to end django views.
 """
+import os
+
 from django.core.urlresolvers import reverse
-from mock import patch, MagicMock
+from django.http import HttpResponse
+from django.test import override_settings
+from mock import patch
 
-from sga.backend.constants import Roles
+from sga.backend.archives import build_pending_archives
+from sga.backend.constants import Roles, ZipCompression
+from sga.backend.files import student_submission_file_path
 from sga.forms import (
     AssignGraderToStudentForm,
     GraderMaxStudentsForm,
     GraderAssignmentSubmissionForm,
     StudentAssignmentSubmissionForm,
     AssignStudentToGraderForm)
-from sga.tests.common import SGATestCase
+from sga.models import GradePassback, Submission, SubmissionArchive
+from sga.tests.common import SGATestCase, TEST_FILE_LOCATION
 
 
 class TestViews(SGATestCase):
@@ -176,6 +183,96 @@ class TestViews(SGATestCase):
         self.assertIsNotNone(submission.description)
         self.assertTrue(submission.submitted)
 
+    @override_settings(
+        DEFAULT_FILE_STORAGE="sga.backend.uploads.LocalDirectUploadStorage",
+        MEDIA_ROOT=TEST_FILE_LOCATION,
+        DIRECT_UPLOADS_ENABLED=True
+    )
+    def test_submit_student_assignment_direct_upload(self):
+        """
+        Verify successful student submission of a document uploaded directly to the storage
+        """
+        self.log_in_as_student()
+        submission = self.get_test_submission()
+        kwargs = {
+            "course_id": submission.assignment.course_id,
+            "assignment_id": submission.assignment_id
+        }
+        response = self.client.post(reverse("request_direct_upload", kwargs=kwargs), data={"filename": "file.pdf"})
+        self.assertEqual(response.status_code, 200)
+        upload = response.json()
+        self.assertEqual(upload["url"], reverse("local_direct_upload"))
+        document_name = student_submission_file_path(submission, "file.pdf")
+        self.assertEqual(upload["fields"]["key"], document_name)
+        response = self.client.post(upload["url"], data=dict(upload["fields"], file=self.get_test_file()))
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(os.path.exists(os.path.join(TEST_FILE_LOCATION, document_name)))
+        response = self.client.post(
+            reverse("view_submission_as_student", kwargs=kwargs),
+            data={"filename": "file.pdf", "description": "file description"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["direct_uploads"])
+        submission = self.get_test_submission()
+        self.assertTrue(submission.submitted)
+        self.assertEqual(submission.student_document.name, document_name)
+        self.assertEqual(submission.description, "file description")
+        # Submitted assignments can't be uploaded again
+        response = self.client.post(reverse("request_direct_upload", kwargs=kwargs), data={"filename": "file.pdf"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(
+        DEFAULT_FILE_STORAGE="sga.backend.uploads.LocalDirectUploadStorage",
+        MEDIA_ROOT=TEST_FILE_LOCATION,
+        DIRECT_UPLOADS_ENABLED=True
+    )
+    def test_direct_upload_rejected(self):
+        """
+        Verify that invalid, oversized, tampered and missing direct uploads are rejected
+        """
+        self.log_in_as_student()
+        submission = self.get_test_submission()
+        kwargs = {
+            "course_id": submission.assignment.course_id,
+            "assignment_id": submission.assignment_id
+        }
+        request_url = reverse("request_direct_upload", kwargs=kwargs)
+        submit_url = reverse("view_submission_as_student", kwargs=kwargs)
+        self.assertEqual(self.client.post(request_url, data={"filename": "file.exe"}).status_code, 400)
+        upload = self.client.post(request_url, data={"filename": "file.pdf"}).json()
+        document_name = upload["fields"]["key"]
+        # The policy's key and signature can't be changed
+        response = self.client.post(
+            upload["url"],
+            data=dict(upload["fields"], key="other.pdf", file=self.get_test_file())
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            upload["url"],
+            data=dict(upload["fields"], policy=upload["fields"]["policy"] + "x", file=self.get_test_file())
+        )
+        self.assertEqual(response.status_code, 403)
+        # Submitting before the document is uploaded
+        response = self.client.post(submit_url, data={"filename": "file.pdf", "description": "file description"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("student_document", response.context["submission_form"].errors)
+        self.assertFalse(self.get_test_submission().submitted)
+        # Files larger than the policy's limit aren't stored, and stored files are validated when submitted
+        with self.settings(MAX_FILE_SIZE_MB=0):
+            small_upload = self.client.post(request_url, data={"filename": "file.pdf"}).json()
+            response = self.client.post(
+                small_upload["url"],
+                data=dict(small_upload["fields"], file=self.get_test_file())
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(os.path.exists(os.path.join(TEST_FILE_LOCATION, document_name)))
+            response = self.client.post(upload["url"], data=dict(upload["fields"], file=self.get_test_file()))
+            self.assertEqual(response.status_code, 204)
+            response = self.client.post(submit_url, data={"filename": "file.pdf", "description": "file description"})
+            self.assertIn("student_document", response.context["submission_form"].errors)
+            self.assertFalse(os.path.exists(os.path.join(TEST_FILE_LOCATION, document_name)))
+        self.assertFalse(self.get_test_submission().submitted)
+
     def test_view_submission_as_staff(self):
         """
         Verify view submission page is as expected
@@ -208,13 +305,13 @@ class TestViews(SGATestCase):
                 ]
             )
 
-    @patch("sga.views.send_grade", MagicMock(return_value=None))
     def test_submit_grader_document(self):
         """
-        Verify successful grader submission via view_submission_as_staff
+        Verify successful grader submission via view_submission_as_staff, which queues the grade to be sent to edX
         """
         self.log_in_as_grader()
         submission = self.get_test_submission()
+        submission.update(result_id="result_id", edx_url="edx_url", consumer_key="key")
         student_user = self.get_test_student_user()
         self.assertIsNone(submission.grader_document.name)
         self.assertIsNone(submission.feedback)
@@ -242,6 +339,9 @@ class TestViews(SGATestCase):
         self.assertIsNotNone(submission.grader_document.name)
         self.assertIsNotNone(submission.feedback)
         self.assertTrue(submission.graded)
+        passback = GradePassback.objects.get(submission=submission)
+        self.assertEqual((passback.result_id, passback.score), ("result_id", 0.75))
+        self.assertEqual(passback.status, GradePassback.PENDING)
 
     def test_view_submission_as_staff_staff_only(self):
         """
@@ -276,9 +376,29 @@ class TestViews(SGATestCase):
                 url,
                 role,
                 template="sga/view_assignment.html",
-                context_keys=["student_users", "course", "assignment"]
+                context_keys=["course", "assignment"]
             )
 
+    def test_view_assignment_does_not_create_submissions(self):
+        """
+        Verify the assignment submission list shows submission statuses without creating Submission objects
+        """
+        assignment = self.get_test_assignment()
+        student_user = self.get_test_student_user()
+        self.get_test_student(username="test_student_2")
+        submission = self.get_test_submission()
+        submission.update(submitted=True)
+        kwargs = {
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        }
+        rows = self.get_list_data(reverse("submission_list_data", kwargs=kwargs), Roles.admin)["data"]
+        statuses = {row["username"]: (row["submitted"], row["graded"]) for row in rows}
+        self.assertEqual(statuses, {student_user.username: (True, False), "test_student_2": (False, False)})
+        self.assertEqual(Submission.objects.filter(assignment=assignment).count(), 1)
+        rows = self.get_list_data(reverse("submission_list_data", kwargs=kwargs), Roles.admin, filter="not_graded")
+        self.assertEqual([row["username"] for row in rows["data"]], [student_user.username])
+
     def test_view_assignment_staff_only(self):
         """
         Verify view assignment page is only accessible for staff
@@ -303,8 +423,67 @@ class TestViews(SGATestCase):
                 url,
                 role,
                 template="sga/view_student_list.html",
-                context_keys=["course", "students", "grader_user"]
+                context_keys=["course", "grader_user"]
+            )
+
+    def test_student_list_data(self):
+        """
+        Verify the student list data is paged, searched and filtered, and limited to a grader's students
+        """
+        course = self.get_test_course()
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        student.update(grader=grader)
+        self.get_test_submission().update(submitted=True)
+        for number in range(3):
+            self.get_test_student(username="other_student_{number}".format(number=number))
+        url = reverse("student_list_data", kwargs={"course_id": course.id})
+        data = self.get_list_data(url, Roles.admin, draw=3, length=2)
+        self.assertEqual(
+            (data["draw"], data["recordsTotal"], data["recordsFiltered"]),
+            (3, 4, 4)
+        )
+        self.assertEqual([row["username"] for row in data["data"]], ["other_student_0", "other_student_1"])
+        # The next page can be fetched after the cursor of the last row
+        data = self.get_list_data(url, Roles.admin, length=2, after=data["data"][-1]["cursor"])
+        self.assertEqual([row["username"] for row in data["data"]], ["other_student_2", student.user.username])
+        self.assertEqual(
+            data["data"][-1],
+            dict(
+                data["data"][-1],
+                grader=grader.user.username,
+                not_graded=1,
+                url=reverse("view_student", kwargs={"course_id": course.id, "student_user_id": student.user_id})
             )
+        )
+        data = self.get_list_data(url, Roles.admin, **{"search[value]": "_1"})
+        self.assertEqual(
+            (data["recordsTotal"], data["recordsFiltered"], data["data"][0]["username"]),
+            (4, 1, "other_student_1")
+        )
+        for list_filter, count in [("has_grader", 1), ("no_grader", 3), ("not_graded", 1)]:
+            self.assertEqual(self.get_list_data(url, Roles.admin, filter=list_filter)["recordsFiltered"], count)
+        # Sorted by not graded submissions, descending
+        data = self.get_list_data(url, Roles.admin, **{
+            "columns[0][data]": "not_graded",
+            "order[0][column]": "0",
+            "order[0][dir]": "desc"
+        })
+        self.assertEqual(data["data"][0]["username"], student.user.username)
+        # Graders only get their own students, admins can ask for a grader's students
+        self.assertEqual(self.get_list_data(url, Roles.grader)["recordsTotal"], 1)
+        data = self.get_list_data(url, Roles.admin, grader=grader.user_id)
+        self.assertEqual(data["recordsTotal"], 1)
+        self.assertIn("unassign_url", data["data"][0])
+
+    def get_list_data(self, url, role, **params):
+        """
+        Logs in as role and returns the data of a server-side list
+        """
+        self.log_in_as(role)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
 
     def test_view_student_list_staff_only(self):
         """
@@ -326,9 +505,25 @@ class TestViews(SGATestCase):
                 url,
                 role,
                 template="sga/view_assignment_list.html",
-                context_keys=["course", "assignments", "grader_user"]
+                context_keys=["course", "grader_user"]
             )
 
+    def test_assignment_list_data(self):
+        """
+        Verify the assignment list data has the submission counts of every assignment
+        """
+        course = self.get_test_course()
+        self.get_test_submission().update(submitted=True)
+        self.get_test_assignment(edx_id="other_assignment")
+        url = reverse("assignment_list_data", kwargs={"course_id": course.id})
+        data = self.get_list_data(url, Roles.admin, filter="not_graded")
+        self.assertEqual((data["recordsTotal"], data["recordsFiltered"]), (2, 1))
+        self.assertEqual(
+            {key: data["data"][0][key] for key in ["not_submitted", "not_graded", "graded"]},
+            {"not_submitted": 0, "not_graded": 1, "graded": 0}
+        )
+        self.assertEqual(self.get_list_data(url, Roles.grader)["recordsTotal"], 2)
+
     def test_view_assignment_list_staff_only(self):
         """
         Verify view assignment list page is only accessible for staff
@@ -347,8 +542,25 @@ class TestViews(SGATestCase):
             url,
             Roles.admin,
             template="sga/view_grader_list.html",
-            context_keys=["course", "graders"]
+            context_keys=["course"]
+        )
+
+    def test_grader_list_data(self):
+        """
+        Verify the grader list data has the stats of every grader
+        """
+        course = self.get_test_course()
+        grader = self.get_test_grader()
+        self.get_test_student().update(grader=grader)
+        self.get_test_grader(username="other_grader")
+        url = reverse("grader_list_data", kwargs={"course_id": course.id})
+        data = self.get_list_data(url, Roles.admin, filter="has_students")
+        self.assertEqual((data["recordsTotal"], data["recordsFiltered"]), (2, 1))
+        self.assertEqual(
+            (data["data"][0]["username"], data["data"][0]["number_of_students"]),
+            (grader.user.username, 1)
         )
+        self.do_test_forbidden_view(url, Roles.grader)
 
     def test_view_grader_list_admin_only(self):
         """
@@ -385,6 +597,27 @@ class TestViews(SGATestCase):
             ]
         )
 
+    def test_view_student_does_not_create_submissions(self):
+        """
+        Verify the student page shows the statuses of assignments without a Submission without creating one
+        """
+        self.log_in_as_admin()
+        student_user = self.get_test_student_user()
+        submission = self.get_test_submission()
+        submission.update(submitted=True)
+        assignment_2 = self.get_test_assignment(edx_id="test_assignment_2")
+        kwargs = {
+            "course_id": self.default_course.id,
+            "student_user_id": student_user.id
+        }
+        response = self.client.get(reverse("view_student", kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        statuses = {
+            assignment.id: assignment.submission.submitted for assignment in response.context["assignments"]
+        }
+        self.assertEqual(statuses, {submission.assignment_id: True, assignment_2.id: False})
+        self.assertEqual(Submission.objects.filter(student=student_user).count(), 1)
+
     def test_assign_grader(self):
         """
         Verify that AssignGraderToStudentForm correctly assigns a grader to a student
@@ -461,7 +694,6 @@ class TestViews(SGATestCase):
                     "graded_submissions",
                     "max_students_form",
                     "assign_student_form",
-                    "students",
                     "GRADER_TO_STUDENT_CONFIRM",
                     "UNASSIGN_STUDENT_CONFIRM"
                 ]
@@ -748,6 +980,42 @@ class TestViews(SGATestCase):
         for role in [Roles.grader, Roles.student]:
             self.do_test_forbidden_view(url, role, method="post")
 
+    def test_sync_grades(self):
+        """
+        Verify sync_assignment_grades and sync_course_grades queue the graded submissions' grades
+        """
+        self.log_in_as_admin()
+        assignment = self.get_test_assignment()
+        submission = self.get_test_submission()
+        submission.update(result_id="result_id", edx_url="edx_url", consumer_key="key", graded=True, grade=80)
+        kwargs = {
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        }
+        response = self.client.post(reverse("sync_assignment_grades", kwargs=kwargs), follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(GradePassback.objects.values_list("result_id", "score")), [("result_id", 0.8)])
+        submission.update(grade=90)
+        response = self.client.post(reverse("sync_course_grades", kwargs={"course_id": self.default_course.id}))
+        self.assertRedirects(response, reverse("view_assignment_list", kwargs={"course_id": self.default_course.id}))
+        self.assertEqual(list(GradePassback.objects.values_list("result_id", "score")), [("result_id", 0.9)])
+
+    def test_sync_grades_admin_only(self):
+        """
+        Verify sync_assignment_grades and sync_course_grades are only accessible for admins
+        """
+        assignment = self.get_test_assignment()
+        urls = [
+            reverse("sync_assignment_grades", kwargs={
+                "course_id": self.default_course.id,
+                "assignment_id": assignment.id
+            }),
+            reverse("sync_course_grades", kwargs={"course_id": self.default_course.id}),
+        ]
+        for url in urls:
+            for role in [Roles.grader, Roles.student]:
+                self.do_test_forbidden_view(url, role, method="post")
+
     def test_download_all_submissions(self):
         """
         Verify download_all_submissions returns a .zip file
@@ -763,6 +1031,48 @@ class TestViews(SGATestCase):
             response = self.client.get(reverse("download_all_submissions", kwargs=kwargs), follow=True)
             self.assertEqual(response.status_code, 200)
             self.assertTrue(response.get("Content-Disposition").startswith("attachment; filename="))
+        # Archives are only queued when the archive cache is enabled
+        self.assertFalse(SubmissionArchive.objects.exists())
+
+    def test_download_all_submissions_compression(self):
+        """
+        Verify download_all_submissions uses the compression mode given in the query string
+        """
+        self.log_in_as_admin()
+        assignment = self.get_test_assignment()
+        url = reverse("download_all_submissions", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        })
+        with patch("sga.views.serve_zip_file", return_value=HttpResponse()) as serve_zip_file:
+            for compression in ZipCompression.modes:
+                self.assertEqual(self.client.get(url, {"compression": compression}).status_code, 200)
+                self.assertEqual(serve_zip_file.call_args[1], {"compression": compression})
+            self.assertEqual(self.client.get(url, {"compression": "bzip2"}).status_code, 400)
+            self.assertEqual(serve_zip_file.call_count, len(ZipCompression.modes))
+
+    @override_settings(SUBMISSION_ARCHIVE_CACHE_ENABLED=True)
+    def test_download_all_submissions_cached_archive(self):
+        """
+        Verify download_all_submissions queues an archive of the submissions and serves it once it is built
+        """
+        self.log_in_as_admin()
+        assignment = self.get_test_assignment()
+        url = reverse("download_all_submissions", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        })
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        archive = SubmissionArchive.objects.get()
+        self.assertEqual(archive.status, SubmissionArchive.PENDING)
+        build_pending_archives()
+        with patch("sga.views.serve_zip_file") as serve_zip_file:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(serve_zip_file.called)
+        self.assertIsNotNone(SubmissionArchive.objects.get(pk=archive.pk).last_accessed)
+        response.close()
 
     def test_download_all_submissions_staff_only(self):
         """
@@ -6,6 +6,8 @@ from django.conf.urls import url
 from sga.views import (
     index,
     view_submission_as_student,
+    request_direct_upload,
+    local_direct_upload,
     view_student_list,
     view_assignment,
     view_submission_as_staff,
@@ -22,7 +24,13 @@ from sga.views import (
     unassign_student,
     staff_index,
     not_graded_block_error_page,
-    studio_message_page
+    studio_message_page,
+    sync_assignment_grades,
+    sync_course_grades,
+    student_list_data,
+    grader_list_data,
+    assignment_list_data,
+    submission_list_data
 )
 
 
@@ -34,8 +42,16 @@ urlpatterns = [
     url(r"^view-student-list/(?P<course_id>\d+)$", view_student_list, name="view_student_list"),
     url(r"^view-grader-list/(?P<course_id>\d+)$", view_grader_list, name="view_grader_list"),
     url(r"^view-assignment-list/(?P<course_id>\d+)$", view_assignment_list, name="view_assignment_list"),
+    url(r"^student-list-data/(?P<course_id>\d+)$", student_list_data, name="student_list_data"),
+    url(r"^grader-list-data/(?P<course_id>\d+)$", grader_list_data, name="grader_list_data"),
+    url(r"^assignment-list-data/(?P<course_id>\d+)$", assignment_list_data, name="assignment_list_data"),
+    url(r"^submission-list-data/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", submission_list_data,
+        name="submission_list_data"),
     url(r"^view-submission-as-student/(?P<course_id>\d+)/(?P<assignment_id>\d+)$",
         view_submission_as_student, name="view_submission_as_student"),
+    url(r"^request-direct-upload/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", request_direct_upload,
+        name="request_direct_upload"),
+    url(r"^local-direct-upload$", local_direct_upload, name="local_direct_upload"),
     url(r"^view-submission-as-staff/(?P<course_id>\d+)/(?P<assignment_id>\d+)/(?P<student_user_id>\d+)$",
         view_submission_as_staff, name="view_submission_as_staff"),
     url(r"^view-assignment/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", view_assignment, name="view_assignment"),
@@ -54,4 +70,7 @@ urlpatterns = [
         name="download_all_submissions"),
     url(r"^download-not-graded-submissions/(?P<course_id>\d+)/(?P<assignment_id>\d+)$",
         download_not_graded_submissions, name="download_not_graded_submissions"),
+    url(r"^sync-assignment-grades/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", sync_assignment_grades,
+        name="sync_assignment_grades"),
+    url(r"^sync-course-grades/(?P<course_id>\d+)$", sync_course_grades, name="sync_course_grades"),
 ]
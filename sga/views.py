@@ -3,12 +3,18 @@ View definitions
 """
 
 from datetime import datetime
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseForbidden
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from sga.backend.archives import get_archive, serve_archive
 from sga.backend.authentication import allowed_roles
 from sga.backend.constants import (
     Roles,
@@ -16,17 +22,35 @@ from sga.backend.constants import (
     STUDENT_TO_GRADER_CONFIRM,
     UNASSIGN_GRADER_CONFIRM,
     UNASSIGN_STUDENT_CONFIRM,
-    UNSUBMIT_CONFIRM)
-from sga.backend.files import serve_zip_file, get_submitted_submissions
-from sga.backend.send_grades import send_grade
+    UNSUBMIT_CONFIRM,
+    ZipCompression)
+from sga.backend.dashboards import (
+    ASSIGNMENT_LIST_COLUMNS,
+    ASSIGNMENT_LIST_FILTERS,
+    GRADER_LIST_COLUMNS,
+    GRADER_LIST_FILTERS,
+    STUDENT_LIST_COLUMNS,
+    STUDENT_LIST_FILTERS,
+    SUBMISSION_LIST_COLUMNS,
+    SUBMISSION_LIST_FILTERS,
+    get_assignment_list_page,
+    get_grader_list_page,
+    get_student_list_page,
+    get_submission_list_page
+)
+from sga.backend.datatables import DataTablesQuery
+from sga.backend.files import serve_zip_file, get_assignment_submissions, get_submitted_submissions
+from sga.backend.grade_passback import get_syncable_submissions
+from sga.backend.uploads import direct_uploads_enabled, get_direct_upload
 from sga.forms import (
     StudentAssignmentSubmissionForm,
+    StudentDirectUploadSubmissionForm,
     GraderAssignmentSubmissionForm,
     GraderMaxStudentsForm,
     AssignGraderToStudentForm,
     AssignStudentToGraderForm
 )
-from sga.models import Assignment, Submission, Course, Grader, Student
+from sga.models import Assignment, GradePassback, Submission, Grader, Student
 
 
 @csrf_exempt
@@ -67,14 +91,20 @@ def view_submission_as_student(request, course_id, assignment_id):
     """
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
     submission, _ = Submission.objects.get_or_create(student=request.user, assignment=assignment)
+    direct_uploads = direct_uploads_enabled()
     if request.method == "POST":
-        submission_form = StudentAssignmentSubmissionForm(request.POST, request.FILES, instance=submission)
+        if direct_uploads and "filename" in request.POST:
+            submission_form = StudentDirectUploadSubmissionForm(request.POST, instance=submission)
+        else:
+            submission_form = StudentAssignmentSubmissionForm(request.POST, request.FILES, instance=submission)
         if submission_form.is_valid():
             submission_form.save()
             submission.submitted = True
             submission.submitted_at = datetime.utcnow()
             submission.save()
             redirect("view_submission_as_student", course_id=course_id, assignment_id=assignment_id)
+    elif direct_uploads:
+        submission_form = StudentDirectUploadSubmissionForm(instance=submission)
     else:
         submission_form = StudentAssignmentSubmissionForm(instance=submission)
     return render(request, "sga/view_submission_as_student.html", context={
@@ -82,9 +112,44 @@ def view_submission_as_student(request, course_id, assignment_id):
         "submission_form": submission_form,
         "submission": submission,
         "assignment": assignment,
+        "direct_uploads": direct_uploads,
     })
 
 
+@allowed_roles([Roles.student])
+@require_http_methods(["POST"])
+def request_direct_upload(request, course_id, assignment_id):
+    """
+    Returns the presigned POST (as JSON) for uploading a student's document directly to the storage
+    """
+    if not direct_uploads_enabled():
+        raise Http404()
+    assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
+    if assignment.is_past_due_date(now=timezone.now()):
+        return HttpResponseBadRequest("Assignment is past due")
+    submission, _ = Submission.objects.get_or_create(student=request.user, assignment=assignment)
+    if submission.submitted:
+        return HttpResponseBadRequest("Assignment is already submitted")
+    try:
+        upload = get_direct_upload(submission, request.POST.get("filename", ""))
+    except ValidationError as error:
+        return HttpResponseBadRequest(" ".join(error.messages))
+    return JsonResponse(upload)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def local_direct_upload(request):
+    """
+    Receives a presigned POST for a storage that stands in for the storage bucket locally (see
+    sga.backend.uploads.LocalDirectUploadStorage)
+    """
+    receive_upload = getattr(default_storage, "receive_upload", None)
+    if receive_upload is None:
+        raise Http404()
+    return receive_upload(request)
+
+
 @allowed_roles([Roles.grader, Roles.admin])
 def view_submission_as_staff(request, course_id, assignment_id, student_user_id):
     """
@@ -113,14 +178,15 @@ def view_submission_as_staff(request, course_id, assignment_id, student_user_id)
     if request.method == "POST":
         submission_form = GraderAssignmentSubmissionForm(request.POST, request.FILES, instance=submission)
         if submission_form.is_valid():
-            # Update database object
-            submission_form.save()
-            submission.graded_at = datetime.utcnow()
-            submission.graded_by = request.user
-            submission.graded = True
-            submission.save()
-            # Send grade back to edX
-            send_grade(submission.consumer_key, submission.edx_url, submission.result_id, submission.edx_grade())
+            with transaction.atomic():
+                # Update database object
+                submission_form.save()
+                submission.graded_at = datetime.utcnow()
+                submission.graded_by = request.user
+                submission.graded = True
+                submission.save()
+                # Queue the grade to be sent back to edX (see the sendgrades command)
+                GradePassback.objects.enqueue(submission)
             redirect(
                 "view_submission_as_staff",
                 course_id=course_id,
@@ -147,75 +213,81 @@ def view_grader_list(request, course_id):
     """
     View grader list
     """
-    course = get_object_or_404(Course, id=course_id)
-    graders = course.grader_set.all()
-    # for grader_user in grader_users:
-    #     grader_user.not_graded_submissions = course.not_graded_submissions_by_user(grader_user)
     return render(request, "sga/view_grader_list.html", context={
-        "course": course,
-        "graders": graders
+        "course": request.course
     })
 
 
+@allowed_roles([Roles.admin])
+def grader_list_data(request, course_id):  # pylint: disable=unused-argument
+    """
+    Grader list page data (DataTables server-side processing)
+    """
+    query = DataTablesQuery(request.GET, GRADER_LIST_COLUMNS, filters=GRADER_LIST_FILTERS)
+    return JsonResponse(dict(get_grader_list_page(request.course, query), draw=query.draw))
+
+
 @allowed_roles([Roles.grader, Roles.admin])
 def view_student_list(request, course_id):
     """
     View student list
     """
-    course = get_object_or_404(Course, id=course_id)
-    if request.role == Roles.admin:
-        students = Student.objects.filter(course=course, deleted=False)
-        grader_user = None
-    else:
-        students = Student.objects.filter(course=course, grader__user=request.user, deleted=False)
-        grader_user = request.user
-    for student in students:
-        student.not_graded_submissions_count = course.not_graded_submissions_count_by_student(student)
+    grader_user = None if request.role == Roles.admin else request.user
     return render(request, "sga/view_student_list.html", context={
-        "course": course,
-        "students": students,
+        "course": request.course,
         "grader_user": grader_user
     })
 
 
 @allowed_roles([Roles.grader, Roles.admin])
-def view_assignment_list(request, course_id):
+def student_list_data(request, course_id):
     """
-    View assignment list
+    Student list page data (DataTables server-side processing). Graders get their own students; admins get every
+    student, or the students of the grader whose user id is given in the "grader" parameter.
     """
-    course = get_object_or_404(Course, id=course_id)
+    grader = None
     if request.role == Roles.grader:
-        grader_user = request.user
-    else:
-        grader_user = None
-    assignments = course.assignments.all()
-    for assgnmnt in assignments:
-        if grader_user:
-            assgnmnt.not_submitted_count = assgnmnt.not_submitted_submissions_count_by_grader(grader_user=grader_user)
-            assgnmnt.not_graded_count = assgnmnt.not_graded_submissions_count_by_grader(grader_user=grader_user)
-            # For graded count, we want to include all of the ones the Grader graded, even if the Student is no longer
-            # assigned to this Grader
-            assgnmnt.graded_count = assgnmnt.graded_submissions_count_by_grader(
-                grader_user=grader_user,
-                limit_to_current_students=False
-            )
-        else:
-            assgnmnt.not_submitted_count = assgnmnt.not_submitted_submissions_count()
-            assgnmnt.not_graded_count = assgnmnt.not_graded_submissions_count()
-            assgnmnt.graded_count = assgnmnt.graded_submissions_count()
+        grader = get_object_or_404(Grader, course_id=course_id, user=request.user)
+    elif "grader" in request.GET:
+        grader_user_id = request.GET["grader"]
+        if not grader_user_id.isdigit():
+            return HttpResponseBadRequest("Bad grader")
+        grader = get_object_or_404(Grader, course_id=course_id, user_id=grader_user_id)
+    query = DataTablesQuery(request.GET, STUDENT_LIST_COLUMNS, filters=STUDENT_LIST_FILTERS)
+    return JsonResponse(dict(get_student_list_page(request.course, query, grader=grader), draw=query.draw))
+
+
+@allowed_roles([Roles.grader, Roles.admin])
+def view_assignment_list(request, course_id):  # pylint: disable=unused-argument
+    """
+    View assignment list
+    """
     return render(request, "sga/view_assignment_list.html", context={
-        "course": course,
-        "assignments": assignments,
-        "grader_user": grader_user
+        "course": request.course,
+        "grader_user": request.user if request.role == Roles.grader else None
     })
 
 
+@allowed_roles([Roles.grader, Roles.admin])
+def assignment_list_data(request, course_id):
+    """
+    Assignment list page data (DataTables server-side processing)
+    """
+    grader = None
+    if request.role == Roles.grader:
+        grader = get_object_or_404(Grader, course_id=course_id, user=request.user)
+    # For graded count in the grader scope, we want to include all of the ones the Grader graded, even if the
+    # Student is no longer assigned to this Grader
+    query = DataTablesQuery(request.GET, ASSIGNMENT_LIST_COLUMNS, filters=ASSIGNMENT_LIST_FILTERS)
+    return JsonResponse(dict(get_assignment_list_page(request.course, query, grader=grader), draw=query.draw))
+
+
 @allowed_roles([Roles.student, Roles.grader, Roles.admin])
 def view_student(request, course_id, student_user_id):
     """
     View student
     """
-    course = get_object_or_404(Course, id=course_id)
+    course = request.course
     student = get_object_or_404(Student, course_id=course_id, user_id=student_user_id, deleted=False)
     if request.method == "POST" and request.role == Roles.admin:
         assign_grader_form = AssignGraderToStudentForm(request.POST, instance=student)
@@ -223,9 +295,16 @@ def view_student(request, course_id, student_user_id):
             assign_grader_form.save()
     else:
         assign_grader_form = AssignGraderToStudentForm(instance=student)
+    # Read-only: assignments without a Submission are shown as not submitted instead of creating one for each
+    submissions = {
+        submission.assignment_id: submission
+        for submission in Submission.objects.filter(student=student.user, assignment__course=course)
+    }
     assignments = course.assignments.all()
     for assignment in assignments:
-        assignment.submission, _ = assignment.submissions.get_or_create(student=student.user)
+        assignment.submission = submissions.get(assignment.id)
+        if assignment.submission is None:
+            assignment.submission = Submission(assignment=assignment, student=student.user)
     return render(request, "sga/view_student.html", context={
         "course": course,
         "student": student,
@@ -241,8 +320,9 @@ def view_grader(request, course_id, grader_user_id):
     """
     View grader
     """
-    course = get_object_or_404(Course, id=course_id)
-    grader = get_object_or_404(Grader, course_id=course_id, user_id=grader_user_id)
+    course = request.course
+    graders = Grader.objects.with_stats().select_related("user")
+    grader = get_object_or_404(graders, course_id=course_id, user_id=grader_user_id)
     # Disallow if current user is not admin or this grader
     if request.role == Roles.grader and grader.user != request.user:
         return HttpResponseForbidden()
@@ -258,11 +338,10 @@ def view_grader(request, course_id, grader_user_id):
             assign_student_form = AssignStudentToGraderForm(request.POST, instance=grader)
             if assign_student_form.is_valid():
                 assign_student_form.save(grader)
+        # Reload the grader since the forms may have changed its stats
+        grader = graders.get(pk=grader.pk)
     # Get other data for page
-    graded_submissions = grader.user.graded_submissions.all()
-    students = grader.students.filter(deleted=False)
-    for student in students:
-        student.not_graded_submissions_count = course.not_graded_submissions_count_by_student(student)
+    graded_submissions = grader.user.graded_submissions.select_related("assignment", "student")
     # Render page
     return render(request, "sga/view_grader.html", context={
         "course": course,
@@ -270,7 +349,6 @@ def view_grader(request, course_id, grader_user_id):
         "graded_submissions": graded_submissions,
         "max_students_form": max_students_form,
         "assign_student_form": assign_student_form,
-        "students": students,
         "GRADER_TO_STUDENT_CONFIRM": GRADER_TO_STUDENT_CONFIRM,
         "UNASSIGN_STUDENT_CONFIRM": UNASSIGN_STUDENT_CONFIRM
     })
@@ -284,34 +362,58 @@ def view_assignment(request, course_id, assignment_id):
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
     submitted_submissions = get_submitted_submissions(request, assignment)
     not_graded_submissions = submitted_submissions.exclude(graded=True)
-    if request.role == Roles.admin:
-        student_users = assignment.course.students.filter(student__deleted=False)
-    else:
-        grader = Grader.objects.get(user=request.user, course_id=course_id)
-        student_users = [student.user for student in grader.students.filter(deleted=False)]
-    for student_user in student_users:
-        submission, _ = Submission.objects.get_or_create(student=student_user, assignment=assignment)
-        student_user.submitted = "Yes" if submission.submitted else "No"
-        student_user.graded = "Yes" if submission.graded else "No"
     return render(request, "sga/view_assignment.html", context={
-        "student_users": student_users,
         "course": assignment.course,
         "assignment": assignment,
-        "has_not_graded_submissions": bool(not_graded_submissions.count()),
-        "has_submitted_submissions": bool(submitted_submissions.count())
+        "has_not_graded_submissions": not_graded_submissions.exists(),
+        "has_submitted_submissions": submitted_submissions.exists()
     })
 
 
+@allowed_roles([Roles.grader, Roles.admin])
+def submission_list_data(request, course_id, assignment_id):
+    """
+    Assignment submission list data (DataTables server-side processing): the status of the submission of every
+    student (or every student of the grader) for the assignment
+    """
+    assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
+    grader = None
+    if request.role == Roles.grader:
+        grader = get_object_or_404(Grader, course_id=course_id, user=request.user)
+    query = DataTablesQuery(request.GET, SUBMISSION_LIST_COLUMNS, filters=SUBMISSION_LIST_FILTERS)
+    return JsonResponse(dict(get_submission_list_page(assignment, query, grader=grader), draw=query.draw))
+
+
 @allowed_roles([Roles.grader, Roles.admin])
 def download_all_submissions(request, course_id, assignment_id, not_graded_only=False, zipname="All Submissions"):
     """
-    Generate and serve zip file with submission files
+    Generate and serve zip file with submission files. The "compression" query parameter
+    (one of ZipCompression.modes) overrides the default compression mode.
+    If a cached archive of the submissions has been built, it is served instead; otherwise one is queued
+    to be built.
     """
+    compression = request.GET.get("compression")
+    if compression and compression not in ZipCompression.modes:
+        return HttpResponseBadRequest("Unknown compression mode")
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
-    submissions = get_submitted_submissions(request, assignment, not_graded_only=not_graded_only)
-    course = Course.objects.get(id=course_id)
+    grader = None
+    if request.role == Roles.grader:
+        grader = Grader.objects.get(user=request.user, course=course_id)
+    submissions = get_assignment_submissions(assignment, grader=grader, not_graded_only=not_graded_only)
+    course = request.course
     full_zipname = "{course_edx_id} - {zipname}".format(course_edx_id=course.edx_id, zipname=zipname)
-    return serve_zip_file(submissions, full_zipname)
+    if settings.SUBMISSION_ARCHIVE_CACHE_ENABLED:
+        archive = get_archive(
+            assignment,
+            submissions,
+            grader=grader,
+            not_graded_only=not_graded_only,
+            compression=compression
+        )
+        if archive is not None:
+            return serve_archive(archive, full_zipname)
+    # Stream submissions from the database instead of caching every model instance
+    return serve_zip_file(submissions.iterator(), full_zipname, compression=compression)
 
 
 @allowed_roles([Roles.grader, Roles.admin])
@@ -400,3 +502,24 @@ def unassign_student(request, course_id, grader_user_id, student_user_id):  # py
     student = get_object_or_404(Student, user_id=student_user_id, grader=grader)
     student.update(grader=None)
     return redirect("view_grader", course_id=course_id, grader_user_id=grader_user_id)
+
+
+@allowed_roles([Roles.admin])
+@require_http_methods(["POST"])
+def sync_assignment_grades(request, course_id, assignment_id):  # pylint: disable=unused-argument
+    """
+    Queues every grade of an assignment to be sent to edX
+    """
+    assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
+    GradePassback.objects.enqueue_many(get_syncable_submissions(request.course, assignment=assignment))
+    return redirect("view_assignment", course_id=course_id, assignment_id=assignment_id)
+
+
+@allowed_roles([Roles.admin])
+@require_http_methods(["POST"])
+def sync_course_grades(request, course_id):
+    """
+    Queues every grade of a course to be sent to edX
+    """
+    GradePassback.objects.enqueue_many(get_syncable_submissions(request.course))
+    return redirect("view_assignment_list", course_id=course_id)
@@ -288,10 +288,105 @@ AWS_SECRET_ACCESS_KEY = get_var('AWS_SECRET_ACCESS_KEY', '')
 MEDIAFILES_LOCATION = get_var('MEDIAFILES_LOCATION', '')  # Set this to use base folder in bucket
 AWS_LOCATION = MEDIAFILES_LOCATION
 AWS_DEFAULT_ACL = "private"
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto.S3BotoStorage'
+DEFAULT_FILE_STORAGE = get_var('DEFAULT_FILE_STORAGE', 'storages.backends.s3boto.S3BotoStorage')
 
 # Development flag
 DEVELOPMENT = get_var('DEVELOPMENT', False)
 
 MAX_FILE_SIZE_MB = get_var("MAX_FILE_SIZE_MB", 5)
 VALID_FILE_UPLOAD_EXTENSIONS = get_var("VALID_FILE_UPLOAD_EXTENSIONS", [".pdf"])
+# Students' documents are uploaded by the browser straight to the storage with a presigned POST that expires after
+# DIRECT_UPLOAD_EXPIRES_SECONDS (see sga.backend.uploads). This needs a storage that supports it, like
+# sga.backend.s3.DirectUploadS3Boto3Storage (which requires boto3), and the bucket's CORS configuration must allow it.
+DIRECT_UPLOADS_ENABLED = get_var("DIRECT_UPLOADS_ENABLED", False)
+DIRECT_UPLOAD_EXPIRES_SECONDS = get_var("DIRECT_UPLOAD_EXPIRES_SECONDS", 600)
+
+# Django cache (local memory by default; set CACHE_BACKEND and CACHE_LOCATION to share it between processes, e.g.
+# "django.core.cache.backends.memcached.PyLibMCCache" and the memcached servers)
+CACHES = {
+    "default": {
+        "BACKEND": get_var("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": get_var("CACHE_LOCATION", ""),
+    }
+}
+
+# Dashboard pages (student, grader and assignment lists) are cached in the DASHBOARD_CACHE_ALIAS cache for at most
+# DASHBOARD_CACHE_TTL_SECONDS, and invalidated when their course changes (see sga.backend.dashboards). Changes
+# made by other processes are only seen after the TTL unless the cache is shared.
+DASHBOARD_CACHE_ALIAS = get_var("DASHBOARD_CACHE_ALIAS", "default")
+DASHBOARD_CACHE_TTL_SECONDS = get_var("DASHBOARD_CACHE_TTL_SECONDS", 60)
+# Maximum rows per page of the lists paged on the server (see sga.backend.datatables)
+DATATABLES_MAX_PAGE_LENGTH = get_var("DATATABLES_MAX_PAGE_LENGTH", 100)
+
+# Process-local cache of Course objects used by the allowed_roles decorator
+COURSE_CACHE_MAX_SIZE = get_var("COURSE_CACHE_MAX_SIZE", 1000)
+COURSE_CACHE_TTL_SECONDS = get_var("COURSE_CACHE_TTL_SECONDS", 300)
+
+# Bulk submission downloads: documents are fetched from storage by ZIP_PREFETCH_WORKERS threads, up to
+# ZIP_PREFETCH_DEPTH documents ahead, and spooled to disk past ZIP_SPOOL_MAX_SIZE bytes
+ZIP_PREFETCH_DEPTH = get_var("ZIP_PREFETCH_DEPTH", 8)
+ZIP_PREFETCH_WORKERS = get_var("ZIP_PREFETCH_WORKERS", 4)
+ZIP_CHUNK_SIZE = get_var("ZIP_CHUNK_SIZE", 64 * 1024)
+ZIP_SPOOL_MAX_SIZE = get_var("ZIP_SPOOL_MAX_SIZE", 1024 * 1024)
+# Files opened from S3 are spooled to disk past this size rather than held in memory
+AWS_S3_MAX_MEMORY_SIZE = get_var("AWS_S3_MAX_MEMORY_SIZE", ZIP_SPOOL_MAX_SIZE)
+
+# Compression for bulk submission downloads (one of sga.backend.constants.ZipCompression.modes). In "auto" mode,
+# files with ZIP_STORED_EXTENSIONS are stored as-is, as are files whose first ZIP_COMPRESSIBILITY_SAMPLE_SIZE bytes
+# (0 to disable sampling) deflate to more than ZIP_MIN_COMPRESSION_RATIO of their size; everything else is deflated.
+ZIP_COMPRESSION = get_var("ZIP_COMPRESSION", "auto")
+ZIP_STORED_EXTENSIONS = get_var("ZIP_STORED_EXTENSIONS", [
+    ".pdf", ".zip", ".gz", ".bz2", ".7z", ".rar", ".jpg", ".jpeg", ".png", ".gif", ".mp3", ".mp4",
+    ".docx", ".xlsx", ".pptx", ".odt",
+])
+ZIP_COMPRESSIBILITY_SAMPLE_SIZE = get_var("ZIP_COMPRESSIBILITY_SAMPLE_SIZE", 0)
+ZIP_MIN_COMPRESSION_RATIO = get_var("ZIP_MIN_COMPRESSION_RATIO", 0.9)
+
+# Cached zip files of submissions, built by the buildsubmissionarchives command and served to repeat downloads.
+# Archives are stored in SUBMISSION_ARCHIVE_STORAGE (a storage class path; the default storage if empty), and the
+# least recently used ones are deleted once their total size exceeds SUBMISSION_ARCHIVE_MAX_TOTAL_SIZE bytes.
+# Only enable the cache where the Procfile's worker process runs, since downloads queue archives for it to build.
+SUBMISSION_ARCHIVE_CACHE_ENABLED = get_var("SUBMISSION_ARCHIVE_CACHE_ENABLED", False)
+SUBMISSION_ARCHIVE_STORAGE = get_var("SUBMISSION_ARCHIVE_STORAGE", "")
+SUBMISSION_ARCHIVE_MAX_TOTAL_SIZE = get_var("SUBMISSION_ARCHIVE_MAX_TOTAL_SIZE", 5 * 1024 ** 3)
+# Seconds after which an archive that is still building is assumed abandoned and built again
+SUBMISSION_ARCHIVE_BUILD_TIMEOUT = get_var("SUBMISSION_ARCHIVE_BUILD_TIMEOUT", 3600)
+
+# Grade passback outbox, drained by the sendgrades command with GRADE_PASSBACK_CONCURRENCY threads. Failed sends
+# are retried after GRADE_PASSBACK_RETRY_DELAY seconds, doubling with every attempt up to
+# GRADE_PASSBACK_MAX_RETRY_DELAY, until GRADE_PASSBACK_MAX_ATTEMPTS attempts. Sends that haven't finished after
+# GRADE_PASSBACK_SEND_TIMEOUT seconds are assumed abandoned and retried.
+GRADE_PASSBACK_CONCURRENCY = get_var("GRADE_PASSBACK_CONCURRENCY", 4)
+GRADE_PASSBACK_RETRY_DELAY = get_var("GRADE_PASSBACK_RETRY_DELAY", 30)
+GRADE_PASSBACK_MAX_RETRY_DELAY = get_var("GRADE_PASSBACK_MAX_RETRY_DELAY", 6 * 3600)
+GRADE_PASSBACK_MAX_ATTEMPTS = get_var("GRADE_PASSBACK_MAX_ATTEMPTS", 10)
+GRADE_PASSBACK_SEND_TIMEOUT = get_var("GRADE_PASSBACK_SEND_TIMEOUT", 600)
+# Outcome service connections: seconds to wait for a connection and for each response read, and the number of
+# idle keep-alive connections kept open per outcome host
+GRADE_PASSBACK_CONNECT_TIMEOUT = get_var("GRADE_PASSBACK_CONNECT_TIMEOUT", 10)
+GRADE_PASSBACK_READ_TIMEOUT = get_var("GRADE_PASSBACK_READ_TIMEOUT", 30)
+GRADE_PASSBACK_MAX_IDLE_CONNECTIONS = get_var("GRADE_PASSBACK_MAX_IDLE_CONNECTIONS", 8)
+# Maximum readResult requests per second made by the reconcilegrades command
+GRADE_RECONCILE_RATE = get_var("GRADE_RECONCILE_RATE", 10)
+# Log how many requests took each path through SGAMiddleware every this many requests per process (0 to disable)
+SGA_MIDDLEWARE_STATS_LOG_INTERVAL = get_var("SGA_MIDDLEWARE_STATS_LOG_INTERVAL", 0)
+# Fraction of requests whose database queries, storage calls, outbound LTI calls and template rendering are
+# measured by RequestMetricsMiddleware and logged (0 to disable). Measured requests get a Server-Timing header
+# if REQUEST_METRICS_SERVER_TIMING is set.
+REQUEST_METRICS_SAMPLE_RATE = get_var("REQUEST_METRICS_SAMPLE_RATE", 0)
+REQUEST_METRICS_SERVER_TIMING = get_var("REQUEST_METRICS_SERVER_TIMING", True)
+# The storage that sga.backend.metrics.MeteredStorage records the calls to
+METERED_FILE_STORAGE = DEFAULT_FILE_STORAGE
+if REQUEST_METRICS_SAMPLE_RATE:
+    # Install the middleware, and the storage and template backends that record their work in request metrics
+    MIDDLEWARE_CLASSES = ('sga.middleware.RequestMetricsMiddleware',) + MIDDLEWARE_CLASSES
+    TEMPLATES[0]['BACKEND'] = 'sga.backend.metrics.MeteredDjangoTemplates'
+    DEFAULT_FILE_STORAGE = 'sga.backend.metrics.MeteredStorage'
+
+# Sessions are read from the SESSION_CACHE_ALIAS cache (for at most SESSION_CACHE_TTL_SECONDS) and only written
+# to the database when their data changes (see sga.backend.sessions). Set SESSION_ENGINE to
+# "django.contrib.sessions.backends.db" to read and write every session from the database, or to
+# "django.contrib.sessions.backends.signed_cookies" to keep sessions in signed cookies.
+SESSION_ENGINE = get_var("SESSION_ENGINE", "sga.backend.sessions")
+SESSION_CACHE_ALIAS = get_var("SESSION_CACHE_ALIAS", "default")
+SESSION_CACHE_TTL_SECONDS = get_var("SESSION_CACHE_TTL_SECONDS", 300)
@@ -139,6 +139,35 @@ class TestSettings(TestCase):
                 {'sslmode': 'require'}
             )
 
+    def test_request_metrics(self):
+        """Verify that the request metrics are only installed when requests are sampled"""
+        with mock.patch.dict('os.environ', {
+            'DEFAULT_FILE_STORAGE': 'django.core.files.storage.FileSystemStorage',
+        }, clear=True):
+            settings_vars = self.reload_settings()
+            self.assertNotIn('sga.middleware.RequestMetricsMiddleware', settings_vars['MIDDLEWARE_CLASSES'])
+            self.assertEqual(
+                settings_vars['TEMPLATES'][0]['BACKEND'],
+                'django.template.backends.django.DjangoTemplates'
+            )
+            self.assertEqual(
+                settings_vars['DEFAULT_FILE_STORAGE'],
+                'django.core.files.storage.FileSystemStorage'
+            )
+
+        with mock.patch.dict('os.environ', {
+            'DEFAULT_FILE_STORAGE': 'django.core.files.storage.FileSystemStorage',
+            'REQUEST_METRICS_SAMPLE_RATE': '0.1',
+        }, clear=True):
+            settings_vars = self.reload_settings()
+            self.assertEqual(settings_vars['MIDDLEWARE_CLASSES'][0], 'sga.middleware.RequestMetricsMiddleware')
+            self.assertEqual(settings_vars['TEMPLATES'][0]['BACKEND'], 'sga.backend.metrics.MeteredDjangoTemplates')
+            self.assertEqual(settings_vars['DEFAULT_FILE_STORAGE'], 'sga.backend.metrics.MeteredStorage')
+            self.assertEqual(
+                settings_vars['METERED_FILE_STORAGE'],
+                'django.core.files.storage.FileSystemStorage'
+            )
+
     @staticmethod
     def test_semantic_version():
         """